@@ -0,0 +1,43 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+"""
+.. module:: astm.aio
+   :synopsis: ASTM protocol implementation on top of asyncio.
+
+ASTM server and client which run within :mod:`asyncio` event loop next to
+any other asyncio driven services. Requires Python 3.5 or higher. Event loop
+of :mod:`uvloop` is used by :func:`new_event_loop` if it's installed.
+"""
+
+import sys
+
+if sys.version_info < (3, 5):
+    raise ImportError('astm.aio requires Python 3.5 or higher')
+
+import asyncio
+try:
+    import uvloop
+except ImportError:
+    uvloop = None
+
+from .protocol import ASTMProtocol
+from .server import RequestHandler, serve
+from .client import AsyncEmitter, Client, connect
+
+__all__ = ['ASTMProtocol', 'AsyncEmitter', 'Client', 'RequestHandler',
+           'connect', 'new_event_loop', 'serve']
+
+
+def new_event_loop():
+    """Returns new event loop: :mod:`uvloop` one if it's available or
+    default :mod:`asyncio` one otherwise."""
+    if uvloop is not None:
+        return uvloop.new_event_loop()
+    return asyncio.new_event_loop()
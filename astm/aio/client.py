@@ -0,0 +1,230 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+import asyncio
+import logging
+from ..client import DEFAULT_RECORDS_FLOW_MAP, Emitter
+from ..constants import ENQ, EOT
+from ..exceptions import NotAccepted
+from ..mapping import Record
+from .protocol import ASTMProtocol
+
+log = logging.getLogger(__name__)
+
+__all__ = ['AsyncEmitter', 'Client', 'connect']
+
+
+class AsyncEmitter(Emitter):
+    """ASTM records emitter for :class:`Client`. Acts in the same way as
+    :class:`astm.client.Emitter`, but its methods are coroutines and it
+    accepts both generator and asynchronous generator functions as
+    `emitter`::
+
+        async def emitter():
+            assert (yield HeaderRecord()), 'header was rejected'
+            async for patient in fetch_patients():
+                yield patient
+            yield TerminatorRecord()
+
+    When emitter is exhausted :exc:`StopAsyncIteration` is raised.
+    """
+    def __init__(self, emitter, flow_map, encoding,
+                 chunk_size=None, bulk_mode=False):
+        super(AsyncEmitter, self).__init__(emitter, flow_map, encoding,
+                                           chunk_size, bulk_mode)
+        self._is_async = hasattr(self._emitter, 'asend')
+
+    async def _get_record(self, value=None):
+        value = value if self._is_active else None
+        if self._is_async:
+            record = await self._emitter.asend(value)
+        else:
+            try:
+                record = self._emitter.send(value)
+            except StopIteration:
+                raise StopAsyncIteration
+        if not self._is_active:
+            self._is_active = True
+        if isinstance(record, Record):
+            record = record.to_astm()
+        try:
+            self.records_sm(record[0])
+        except Exception as err:
+            await self.throw(type(err), err.args)
+        return record
+
+    async def _send_record(self, record):
+        records = [record]
+        if self.bulk_mode:
+            while True:
+                record = await self._get_record(True)
+                records.append(record)
+                if record[0] == 'L':
+                    break
+        return self._make_message(records)
+
+    async def send(self, value=None):
+        """Passes `value` to the emitter and returns next data to send to
+        server. See :meth:`astm.client.Emitter.send` for details."""
+        if value:
+            data = self._pop_buffer()
+            if data is not None:
+                return data
+
+        record = await self._get_record(value)
+
+        return await self._send_record(record)
+
+    async def throw(self, exc_type, exc_val=None, exc_tb=None):
+        """Raises exception inside the emitter. If the emitter had catch an
+        exception and return any record value, it will be proceeded in
+        common way."""
+        if self._is_async:
+            record = await self._emitter.athrow(exc_type, exc_val, exc_tb)
+        else:
+            try:
+                record = self._emitter.throw(exc_type, exc_val, exc_tb)
+            except StopIteration:
+                raise StopAsyncIteration
+        if record is not None:
+            return await self._send_record(record)
+
+    async def close(self):
+        """Closes the emitter."""
+        if self._is_async:
+            await self._emitter.aclose()
+        else:
+            self._emitter.close()
+
+
+class Client(ASTMProtocol):
+    """ASTM client protocol for :mod:`asyncio` transports. Acts in the same
+    way as :class:`astm.client.Client` does, but the `emitter` is driven by
+    :class:`AsyncEmitter` and so may be asynchronous generator function.
+
+    Use :func:`connect` to establish connection to the server.
+    """
+
+    #: Wrapper of emitter to provide session context and system logic about
+    #: sending head and tail data.
+    emitter_wrapper = AsyncEmitter
+
+    def __init__(self, emitter, encoding=None, timeout=20,
+                 flow_map=DEFAULT_RECORDS_FLOW_MAP,
+                 chunk_size=None, bulk_mode=False):
+        super(Client, self).__init__(timeout=timeout)
+        self.emitter = self.emitter_wrapper(
+            emitter,
+            encoding=encoding or self.encoding,
+            flow_map=flow_map,
+            chunk_size=chunk_size,
+            bulk_mode=bulk_mode
+        )
+        self._closed = None
+        self._error = None
+
+    def connection_made(self, transport):
+        """Initiates ASTM communication session."""
+        super(Client, self).connection_made(transport)
+        self._closed = self._loop.create_future()
+        self._open_session()
+
+    def connection_lost(self, exc):
+        super(Client, self).connection_lost(exc)
+        self._loop.create_task(self.emitter.close())
+        if not self._closed.done():
+            if self._error is not None:
+                self._closed.set_exception(self._error)
+            else:
+                self._closed.set_result(None)
+
+    async def wait_closed(self):
+        """Waits until connection get closed. Raises an exception if the
+        emitter failed."""
+        await asyncio.shield(self._closed)
+
+    def _open_session(self):
+        self.push(ENQ)
+
+    def _close_session(self, close_connection=False):
+        self.push(EOT)
+        if close_connection:
+            self.close()
+
+    def on_enq(self):
+        """Raises :class:`NotAccepted` exception."""
+        raise NotAccepted('Client should not receive ENQ.')
+
+    def on_ack(self):
+        """Handles ACK response from server.
+
+        Provides callback value :const:`True` to the emitter and sends next
+        message to server.
+        """
+        self._loop.create_task(self._emit(True))
+
+    def on_nak(self):
+        """Handles NAK response from server.
+
+        If it was received on ENQ request, the client tries to repeat last
+        request. For others it send callback value :const:`False` to the
+        emitter."""
+        if self._last_sent_data == ENQ:
+            return self.push(ENQ)
+        self._loop.create_task(self._emit(False))
+
+    async def _emit(self, value):
+        try:
+            message = await self.emitter.send(value)
+        except StopAsyncIteration:
+            close = True
+        except Exception as err:
+            log.exception('Emitter failed')
+            self._error = err
+            close = True
+        else:
+            close = False
+        # connection may be closed while emitter was busy
+        if self.transport.is_closing():
+            return
+        if close:
+            self._close_session(True)
+            return
+        self.push(message)
+        if message == EOT:
+            self._open_session()
+
+    def on_eot(self):
+        """Raises :class:`NotAccepted` exception."""
+        raise NotAccepted('Client should not receive EOT.')
+
+    def on_message(self):
+        """Raises :class:`NotAccepted` exception."""
+        raise NotAccepted('Client should not receive ASTM message.')
+
+    def on_timeout(self):
+        """Sends final EOT message and closes connection."""
+        super(Client, self).on_timeout()
+        self._close_session(True)
+
+
+async def connect(emitter, host='localhost', port=15200, **kwargs):
+    """Connects to ASTM server within running event loop and starts sending
+    records produced by `emitter`. Keyword arguments are passed to
+    :class:`Client`::
+
+        client = await connect(emitter, 'analyzer.local', 15200)
+        await client.wait_closed()
+
+    :return: :class:`Client` instance.
+    """
+    loop = asyncio.get_event_loop()
+    transport, client = await loop.create_connection(
+        lambda: Client(emitter, **kwargs), host, port)
+    return client
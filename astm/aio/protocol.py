@@ -0,0 +1,96 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+import asyncio
+import logging
+from ..protocol import ASTMProtocolMixIn
+
+log = logging.getLogger(__name__)
+
+__all__ = ['ASTMProtocol']
+
+
+def _transport_loop(transport):
+    # transports expose their loop since Python 3.7, while before it's the
+    # running one: connection_made is called within loop's callback
+    get_loop = getattr(transport, 'get_loop', None)
+    if get_loop is not None:
+        return get_loop()
+    return asyncio.get_event_loop()
+
+
+class ASTMProtocol(ASTMProtocolMixIn, asyncio.Protocol):
+    """Common ASTM protocol routines for :mod:`asyncio` transports.
+
+    :param timeout: Number of seconds of inactivity after which
+                    :meth:`on_timeout` is called. If :const:`None` timeout
+                    control is disabled.
+    :type timeout: int
+    """
+
+    transport = None
+
+    def __init__(self, timeout=None):
+        self._parser = self.stream_parser()
+        self.timeout = timeout
+        self._timer = None
+        self._deadline = None
+
+    def connection_made(self, transport):
+        self.transport = transport
+        self._loop = _transport_loop(transport)
+        if self.timeout is not None:
+            self._deadline = self._loop.time() + self.timeout
+            self._timer = self._loop.call_at(self._deadline, self._check_timer)
+
+    def connection_lost(self, exc):
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def data_received(self, data):
+        self._reset_timer()
+        for token in self._parser.feed(data):
+            try:
+                self.dispatch(token)
+            except Exception:
+                self.handle_error()
+                return
+
+    def push(self, data):
+        """Sends data to the transport."""
+        self._last_sent_data = data
+        self._reset_timer()
+        self.transport.write(data)
+
+    def close(self):
+        """Closes the transport after all buffered data is sent."""
+        if self.transport is not None:
+            self.transport.close()
+
+    def handle_error(self):
+        """Logs the last exception and closes connection."""
+        log.exception('Uncaptured python exception, closing channel %r', self)
+        self.close()
+
+    def discard_input_buffers(self):
+        self._parser.clear()
+
+    def _reset_timer(self):
+        # timer isn't rescheduled there: it checks the deadline when fired
+        if self._timer is not None:
+            self._deadline = self._loop.time() + self.timeout
+
+    def _check_timer(self):
+        now = self._loop.time()
+        if now < self._deadline:
+            self._timer = self._loop.call_at(self._deadline, self._check_timer)
+            return
+        self._timer = None
+        self.on_timeout()
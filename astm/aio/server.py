@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+import asyncio
+from ..server import BaseRecordsDispatcher, RequestHandlerMixIn
+from .protocol import ASTMProtocol
+
+__all__ = ['RequestHandler', 'serve']
+
+
+class RequestHandler(RequestHandlerMixIn, ASTMProtocol):
+    """ASTM protocol request handler for :mod:`asyncio` transports. Acts in
+    the same way as :class:`astm.server.RequestHandler` does.
+
+    :param dispatcher: Request handler records dispatcher instance.
+    :type dispatcher: :class:`~astm.server.BaseRecordsDispatcher`
+
+    :param timeout: Number of seconds to wait for incoming data before
+                    connection closing.
+    :type timeout: int
+    """
+    def __init__(self, dispatcher, timeout=None):
+        super(RequestHandler, self).__init__(timeout=timeout)
+        self._chunks = []
+        self.client_info = {'host': None, 'port': None}
+        self.dispatcher = dispatcher
+
+    def connection_made(self, transport):
+        super(RequestHandler, self).connection_made(transport)
+        peername = transport.get_extra_info('peername')
+        if isinstance(peername, tuple):
+            self.client_info = {'host': peername[0], 'port': peername[1]}
+
+
+async def serve(host='localhost', port=15200, request=None, dispatcher=None,
+                timeout=None, encoding=None, **kwargs):
+    """Starts ASTM server within running event loop. Arguments have the same
+    meaning as for :class:`astm.server.Server`, while extra keyword arguments
+    are passed to :meth:`~asyncio.AbstractEventLoop.create_server`::
+
+        server = await serve('0.0.0.0', 15200, dispatcher=Dispatcher)
+        async with server:
+            await server.serve_forever()
+
+    :return: :class:`asyncio.AbstractServer` instance.
+    """
+    if request is None:
+        request = RequestHandler
+    if dispatcher is None:
+        dispatcher = BaseRecordsDispatcher
+    loop = asyncio.get_event_loop()
+    return await loop.create_server(
+        lambda: request(dispatcher(encoding), timeout=timeout),
+        host, port, **kwargs)
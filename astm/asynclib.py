@@ -31,7 +31,15 @@ from errno import (
     ENOTCONN, ESHUTDOWN, EINTR, EISCONN, EBADF, ECONNABORTED, EPIPE, EAGAIN,
     errorcode
 )
-from .compat import long, b, bytes, buffer
+from . import metrics
+from .compat import long, b, unicode
+try:
+    import selectors
+except ImportError: # Python < 3.4
+    selectors = None
+
+#: Gathered writes by :meth:`socket.socket.sendmsg` are available.
+HAS_SENDMSG = hasattr(socket.socket, 'sendmsg')
 
 class ExitNow(Exception):
     pass
@@ -46,6 +54,9 @@ _SOCKET_MAP = {}
 
 _SCHEDULED_TASKS = []
 
+# selector pollers by id of channels map they serve
+_POLLERS = {}
+
 log = logging.getLogger(__name__)
 
 
@@ -58,6 +69,22 @@ def _strerror(err):
         return "Unknown error %s" % err
 
 
+def _interest_changed(map, fd):
+    poller = _POLLERS.get(id(map))
+    if poller is not None:
+        poller._dirty.add(fd)
+
+
+def _join_head(buffers, size):
+    head = []
+    for buf in buffers:
+        if size <= 0:
+            break
+        head.append(memoryview(buf)[:size].tobytes())
+        size -= len(buf)
+    return b''.join(head)
+
+
 def read(obj):
     """Triggers ``handle_read_event`` for specified object."""
     try:
@@ -136,6 +163,11 @@ def poll(timeout=0.0, map=None):
             else:
                 return
 
+        started = None
+        if metrics.enabled:
+            metrics.LOOP_READY.observe(len(r) + len(w) + len(e))
+            started = metrics.timer()
+
         for fd in r:
             obj = map.get(fd)
             if obj is None:
@@ -154,11 +186,151 @@ def poll(timeout=0.0, map=None):
                 continue
             exception(obj)
 
+        if started is not None:
+            metrics.LOOP_TIME.observe(metrics.timer() - started)
+
+
+class SelectorPoller(object):
+    """Alternative to :func:`poll` function built on top of :mod:`selectors`
+    module, which uses the most efficient polling mechanism available for
+    the platform (e.g. :c:func:`epoll` on Linux) and has no
+    :c:macro:`FD_SETSIZE` limit.
+
+    Interest of the channels stays registered between the calls. Channels
+    are checked by :meth:`~Dispatcher.readable` and
+    :meth:`~Dispatcher.writable` once they are added to the map and then
+    only when they notify the poller by :meth:`~Dispatcher.update_interest`
+    call, so each call handles only changed channels. :class:`Dispatcher` and
+    :class:`AsyncChat` do that on their state changes, while subclasses which
+    make these predicates depend on own state should do it themselves.
+    Exceptional conditions are not monitored.
+
+    Instance is callable with the same arguments as :func:`poll` and could be
+    passed to :func:`loop` as `poller` argument::
+
+        loop(poller=SelectorPoller())
+
+    :param selector: :class:`selectors.BaseSelector` instance to use.
+                     :class:`selectors.DefaultSelector` by default.
+    """
+    def __init__(self, selector=None):
+        if selector is None:
+            if selectors is None:
+                raise RuntimeError('selectors module is not available')
+            selector = selectors.DefaultSelector()
+        self.selector = selector
+        self._map = None
+        self._registry = {}
+        # file descriptors of channels which interest may be changed
+        self._dirty = set()
+
+    def __call__(self, timeout=0.0, map=None):
+        if map is None:
+            map = _SOCKET_MAP
+        if map is not self._map:
+            self._detach()
+            self._map = map
+            _POLLERS[id(map)] = self
+            self.update(map)
+        elif self._dirty:
+            dirty, self._dirty = self._dirty, set()
+            for fd in dirty:
+                self._sync(fd, map.get(fd))
+        if not self._registry:
+            time.sleep(timeout)
+            return
+
+        try:
+            events = self.selector.select(timeout)
+        except select.error as err:
+            if err.args[0] != EINTR:
+                raise
+            else:
+                return
+
+        started = None
+        if metrics.enabled:
+            metrics.LOOP_READY.observe(len(events))
+            started = metrics.timer()
+
+        for key, mask in events:
+            obj = key.data
+            if mask & selectors.EVENT_READ:
+                if map.get(key.fd) is not obj:
+                    continue
+                read(obj)
+            if mask & selectors.EVENT_WRITE:
+                if map.get(key.fd) is not obj:
+                    continue
+                write(obj)
+
+        if started is not None:
+            metrics.LOOP_TIME.observe(metrics.timer() - started)
+
+    def update(self, map):
+        """Syncs registered interest with all channels of the `map`.
+        Returns number of registered channels."""
+        self._dirty.clear()
+        for fd in set(self._registry).union(map):
+            self._sync(fd, map.get(fd))
+        return len(self._registry)
+
+    def _sync(self, fd, obj):
+        mask = 0
+        if obj is not None:
+            if obj.readable():
+                mask |= selectors.EVENT_READ
+            # accepting sockets should not be writable
+            if obj.writable() and not obj.accepting:
+                mask |= selectors.EVENT_WRITE
+        entry = self._registry.get(fd)
+        if entry is not None:
+            if entry[0] is obj and entry[1] == mask:
+                return
+            self._unregister(fd)
+        if mask:
+            self.selector.register(fd, mask, obj)
+            self._registry[fd] = (obj, mask)
+
+    def clear(self):
+        """Unregisters all channels."""
+        for fd in list(self._registry):
+            self._unregister(fd)
+
+    def close(self):
+        """Unregisters all channels and closes the selector."""
+        self._detach()
+        self.selector.close()
+
+    def _detach(self):
+        self.clear()
+        self._dirty.clear()
+        if self._map is not None and _POLLERS.get(id(self._map)) is self:
+            del _POLLERS[id(self._map)]
+        self._map = None
+
+    def _unregister(self, fd):
+        del self._registry[fd]
+        try:
+            self.selector.unregister(fd)
+        except (KeyError, ValueError, socket.error):
+            pass
+
 
 def scheduler(tasks=None):
     if tasks is None:
         tasks = _SCHEDULED_TASKS
     now = time.time()
+    if not isinstance(tasks, list):
+        for call in tasks.expired(now):
+            if call.cancelled:
+                continue
+            try:
+                call.call()
+            finally:
+                if not call.cancelled:
+                    call.cancel()
+        return
     while tasks and now >= tasks[0].timeout:
         call = heapq.heappop(tasks)
         if call.repush:
@@ -172,7 +344,113 @@ def scheduler(tasks=None):
                 call.cancel()
 
 
-def loop(timeout=30.0, map=None, tasks=None, count=None):
+def set_default_tasks(tasks):
+    """Replaces default container of scheduled calls, which is used by
+    :class:`call_later`, :func:`scheduler`, :func:`loop` and
+    :func:`close_all` functions. It's a list based heap queue by default,
+    but it could be replaced, for instance, with :class:`TimingWheel`::
+
+        set_default_tasks(TimingWheel())
+
+    Should be called before any call get scheduled.
+    """
+    global _SCHEDULED_TASKS
+    if _SCHEDULED_TASKS:
+        raise RuntimeError('Unable to replace tasks container while there'
+                           ' are scheduled calls')
+    _SCHEDULED_TASKS = tasks
+
+
+class TimingWheel(object):
+    """Container of :class:`call_later` scheduled calls which may be used
+    instead of default heap queue. Calls are distributed by slots of hashed
+    timing wheel, so schedule, reset and cancel operations cost O(1)
+    regardless of the amount of scheduled calls, while the calls are fired
+    with `resolution` accuracy. This fits well for a lot of connection
+    timeouts which are often reset and rarely fired.
+
+    Calls which are scheduled for more than `resolution * size` seconds
+    ahead stays within their slots until the wheel turns to their time.
+
+    :param resolution: Seconds per wheel slot.
+    :type resolution: float
+
+    :param size: Number of wheel slots.
+    :type size: int
+    """
+    def __init__(self, resolution=0.05, size=1024):
+        self.resolution = resolution
+        self.size = size
+        self._slots = [{} for _ in range(size)]
+        self._where = {}
+        self._tick = self._tick_of(time.time())
+
+    def __len__(self):
+        return len(self._where)
+
+    def __iter__(self):
+        return iter(list(self._where))
+
+    def add(self, call):
+        """Schedules the call by its timeout."""
+        tick = max(self._tick_of(call.timeout), self._tick)
+        slot = tick % self.size
+        self._slots[slot][call] = None
+        self._where[call] = slot
+
+    def remove(self, call):
+        """Unschedules the call if it's scheduled."""
+        slot = self._where.pop(call, None)
+        if slot is not None:
+            del self._slots[slot][call]
+
+    def move(self, call):
+        """Reschedules the call after its timeout change.
+
+        It's optional to do when timeout was moved forward: such calls are
+        rescheduled lazily when wheel turns to their old slot.
+        """
+        self.remove(call)
+        self.add(call)
+
+    def expired(self, now):
+        """Unschedules and returns list of calls which timeout has come
+        sorted by timeout."""
+        tick = self._tick_of(now)
+        start = max(self._tick, tick - self.size + 1)
+        self._tick = tick
+        size = self.size
+        slots = self._slots
+        where = self._where
+        expired = []
+        for idx in range(start, tick + 1):
+            pos = idx % size
+            slot = slots[pos]
+            if not slot:
+                continue
+            for call in list(slot):
+                if call.timeout <= now:
+                    del slot[call]
+                    del where[call]
+                    expired.append(call)
+                elif self._tick_of(call.timeout) % size != pos:
+                    # timeout was reset since call was placed there
+                    self.move(call)
+        if len(expired) > 1:
+            expired.sort(key=lambda call: call.timeout)
+        return expired
+
+    def clear(self):
+        """Unschedules all calls."""
+        for slot in self._slots:
+            slot.clear()
+        self._where.clear()
+
+    def _tick_of(self, timestamp):
+        return int(timestamp / self.resolution)
+
+
+def loop(timeout=30.0, map=None, tasks=None, count=None, poller=None):
     """
     Enter a polling loop that terminates after count passes or all open
     channels have been closed. All arguments are optional. The *count*
@@ -189,25 +467,31 @@ def loop(timeout=30.0, map=None, tasks=None, count=None):
     :class:`asyncore.dispatcher`, :class:`asynchat.async_chat` and subclasses
     thereof) can freely be mixed in the map.
 
+    The *poller* parameter is a callable with the same signature as
+    :func:`poll` function which is used by default. See
+    :class:`SelectorPoller` as an alternative for large amount of channels.
+
     """
     if map is None:
         map = _SOCKET_MAP
     if tasks is None:
         tasks = _SCHEDULED_TASKS
+    if poller is None:
+        poller = poll
 
     if count is None:
         while map or tasks:
             if map:
-                poll(timeout, map)
+                poller(timeout, map)
             if tasks:
-                scheduler()
+                scheduler(tasks)
 
     else:
         while (map or tasks) and count > 0:
             if map:
-                poll(timeout, map)
+                poller(timeout, map)
             if tasks:
-                scheduler()
+                scheduler(tasks)
             count -= 1
 
 
@@ -240,7 +524,10 @@ class call_later:
         self.timeout = time.time() + self.__delay
         self.repush = False
         self.cancelled = False
-        heapq.heappush(self.__tasks, self)
+        if isinstance(self.__tasks, list):
+            heapq.heappush(self.__tasks, self)
+        else:
+            self.__tasks.add(self)
 
     def __lt__(self, other):
         return self.timeout <= other.timeout
@@ -263,7 +550,10 @@ class call_later:
             "%s is not greater than or equal to 0 seconds" % (seconds)
         self.__delay = seconds
         newtime = time.time() + self.__delay
-        if newtime > self.timeout:
+        if not isinstance(self.__tasks, list):
+            self.timeout = newtime
+            self.__tasks.move(self)
+        elif newtime > self.timeout:
             self.timeout = newtime
             self.repush = True
         else:
@@ -276,7 +566,9 @@ class call_later:
         assert not self.cancelled, "Already cancelled"
         self.cancelled = True
         del self.__target, self.__args, self.__kwargs
-        if self in self.__tasks:
+        if not isinstance(self.__tasks, list):
+            self.__tasks.remove(self)
+        elif self in self.__tasks:
             pos = self.__tasks.index(self)
             if pos == 0:
                 heapq.heappop(self.__tasks)
@@ -325,6 +617,9 @@ class Dispatcher(object):
     connected = False
     accepting = False
     addr = None
+    #: :class:`~astm.trace.WireTrace` of transferred data. Data isn't traced
+    #: if it's :const:`None`.
+    trace = None
 
     def __init__(self, sock=None, map=None):
         if map is None:
@@ -373,20 +668,28 @@ class Dispatcher(object):
     __str__ = __repr__
 
     def _add_channel(self, map=None):
-        log.debug('Adding channel %s' % self)
+        log.debug('Adding channel %s', self)
         if map is None:
             map = self._map
         map[self._fileno] = self
+        _interest_changed(map, self._fileno)
 
     def _del_channel(self, map=None):
         fd = self._fileno
         if map is None:
             map = self._map
         if fd in map:
-            log.debug('Closing channel %d:%s' % (fd, self))
+            log.debug('Closing channel %d:%s', fd, self)
             del map[fd]
+            _interest_changed(map, fd)
         self._fileno = None
 
+    def update_interest(self):
+        """Notifies :class:`SelectorPoller` that result of :meth:`readable`
+        or :meth:`writable` call may be changed."""
+        if self._fileno is not None:
+            _interest_changed(self._map, self._fileno)
+
     def create_socket(self, family, type):
         """
         This is identical to the creation of a normal socket, and will use
@@ -437,6 +740,7 @@ class Dispatcher(object):
         and should be at least 1; the maximum value is system-dependent
         (usually 5)."""
         self.accepting = True
+        self.update_interest()
         if os.name == 'nt' and num > 5:
             num = 5
         return self.socket.listen(num)
@@ -460,6 +764,7 @@ class Dispatcher(object):
         """
         self.connected = False
         self.addr = address
+        self.update_interest()
         err = self.socket.connect_ex(address)
         if err in (EINPROGRESS, EALREADY, EWOULDBLOCK)\
         or err == EINVAL and os.name in ('nt', 'ce'):
@@ -497,8 +802,26 @@ class Dispatcher(object):
     def send(self, data):
         """Send `data` to the remote end-point of the socket."""
         try:
-            log.debug('[%s:%d] <<< %r', self.addr[0], self.addr[1], data)
             result = self.socket.send(data)
+            if self.trace is not None:
+                self.trace.sent(data[:result])
+            return result
+        except socket.error as err:
+            if err.args[0] == EWOULDBLOCK:
+                return 0
+            elif err.args[0] in _DISCONNECTED:
+                self.handle_close()
+                return 0
+            else:
+                raise
+
+    def sendmsg(self, buffers):
+        """Send list of `buffers` to the remote end-point of the socket by
+        single :meth:`socket.socket.sendmsg` call."""
+        try:
+            result = self.socket.sendmsg(buffers)
+            if self.trace is not None and result:
+                self.trace.sent(_join_head(buffers, result))
             return result
         except socket.error as err:
             if err.args[0] == EWOULDBLOCK:
@@ -517,7 +840,8 @@ class Dispatcher(object):
         """
         try:
             data = self.socket.recv(buffer_size)
-            log.debug('[%s:%d] >>> %r', self.addr[0], self.addr[1], data)
+            if self.trace is not None:
+                self.trace.received(data)
             if not data:
                 # a closed connection is indicated by signaling
                 # a read condition, and having recv() return 0.
@@ -567,6 +891,7 @@ class Dispatcher(object):
             raise socket.error(err, _strerror(err))
         self.handle_connect()
         self.connected = True
+        self.update_interest()
 
     def handle_write_event(self):
         if self.accepting:
@@ -610,6 +935,8 @@ class Dispatcher(object):
 
         log.exception('Uncatched python exception, closing channel %s',
                       self_repr)
+        if self.trace is not None:
+            self.trace.log(self.addr)
 
         self.handle_close()
 
@@ -673,7 +1000,7 @@ def close_all(map=None, tasks=None, ignore_all=False):
                 raise
     map.clear()
 
-    for x in tasks:
+    for x in list(tasks):
         try:
             x.cancel()
         except _RERAISEABLE_EXC:
@@ -681,7 +1008,66 @@ def close_all(map=None, tasks=None, ignore_all=False):
         except Exception:
             if not ignore_all:
                 raise
-    del tasks[:]
+    if isinstance(tasks, list):
+        del tasks[:]
+    else:
+        tasks.clear()
+
+
+class Trigger(Dispatcher):
+    """Wakes up polling loop from other threads to run callbacks within
+    the loop thread::
+
+        trigger = Trigger()
+        future.add_done_callback(
+            lambda future: trigger.pull(handle_result, future))
+
+    Callbacks are called in order they were pulled. Exceptions raised by them
+    are logged.
+    """
+    def __init__(self, map=None):
+        reader, self._writer = socket.socketpair()
+        self._writer.setblocking(0)
+        self._callbacks = deque()
+        super(Trigger, self).__init__(reader, map)
+
+    def __repr__(self):
+        return '<%s.%s at %#x>' % (self.__class__.__module__,
+                                   self.__class__.__name__, id(self))
+
+    def pull(self, callback, *args):
+        """Schedules `callback` call with `args` within the loop thread.
+        Safe to be called from any thread."""
+        self._callbacks.append((callback, args))
+        try:
+            self._writer.send(b('x'))
+        except socket.error:
+            # buffer is full, so wake up is already pending
+            pass
+
+    def readable(self):
+        return True
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        try:
+            self.socket.recv(4096)
+        except socket.error:
+            pass
+        while self._callbacks:
+            callback, args = self._callbacks.popleft()
+            try:
+                callback(*args)
+            except _RERAISEABLE_EXC:
+                raise
+            except Exception:
+                log.exception('Trigger callback %r failed', callback)
+
+    def close(self):
+        super(Trigger, self).close()
+        self._writer.close()
 
 
 class AsyncChat(Dispatcher):
@@ -703,8 +1089,13 @@ class AsyncChat(Dispatcher):
 
     #: The asynchronous input buffer size.
     recv_buffer_size = 4096
-    #: The asynchronous output buffer size.
+    #: The asynchronous output buffer size. It's initial number of bytes
+    #: sent at once, which grows while socket accepts all the data.
     send_buffer_size = 4096
+    #: Upper limit of adaptive output buffer size.
+    max_send_buffer_size = 262144
+    #: Maximum number of outgoing queue items sent at once.
+    max_send_items = 64
 
     #: Encoding usage is not enabled by default, because that is a
     #: sign of an application bug that we don't want to pass silently.
@@ -722,6 +1113,9 @@ class AsyncChat(Dispatcher):
         self._input_buffer = b''
         self.inbox = deque()
         self.outbox = deque()
+        # sent bytes of the first outbox item
+        self._outbox_offset = 0
+        self._send_size = None
         super(AsyncChat, self).__init__(sock, map)
         self.collect_incoming_data = self.pull
         self.initiate_send = self.flush
@@ -861,12 +1255,9 @@ class AsyncChat(Dispatcher):
         This is all you need to do to have the channel write the data out to
         the network.
         """
-        sabs = self.send_buffer_size
-        if len(data) > sabs:
-            for i in range(0, len(data), sabs):
-                self.outbox.append(data[i:i+sabs])
-        else:
-            self.outbox.append(data)
+        if self.use_encoding and isinstance(data, unicode):
+            data = data.encode(self.encoding)
+        self.outbox.append(data)
         return self.flush()
 
     def push_with_producer(self, producer):
@@ -887,38 +1278,74 @@ class AsyncChat(Dispatcher):
     def close_when_done(self):
         """Automatically close this channel once the outgoing queue is empty."""
         self.outbox.append(None)
+        self.update_interest()
 
     def flush(self):
-        """Sends all data from outgoing queue."""
-        while self.outbox and self.connected:
-            self._send_chunky(self.outbox.popleft())
-
-    def _send_chunky(self, data):
-        """Sends data as chunks sized by ``send_buffer_size`` value.
-
-        Returns ``True`` on success, ``False`` on error and ``None`` on closing
-        event.
+        """Sends data from outgoing queue until it gets empty or socket stops
+        accepting data. In last case the rest is sent when socket becomes
+        writable.
+
+        Queued items are gathered and sent by single :meth:`~Dispatcher.sendmsg`
+        call if it's available. Number of bytes sent at once starts from
+        :attr:`send_buffer_size` and adapts to the amount of data socket
+        accepts, up to :attr:`max_send_buffer_size`. Partially sent item is
+        tracked by offset, so it's never copied.
         """
-        if self.use_encoding and not isinstance(data, bytes):
-            data = data.encode(self.encoding)
-        while True:
-            if data is None:
+        outbox = self.outbox
+        self.update_interest()
+        while outbox and self.connected:
+            if outbox[0] is None:
+                outbox.popleft()
                 self.handle_close()
                 return
-
-            obs = self.send_buffer_size
-            bdata = buffer(data, 0, obs)
-
+            buffers, total = self._gather_outbox()
             try:
-                num_sent = self.send(bdata)
+                if len(buffers) > 1 and HAS_SENDMSG:
+                    num_sent = self.sendmsg(buffers)
+                else:
+                    num_sent = self.send(buffers[0])
+                    total = len(buffers[0])
             except socket.error:
                 self.handle_error()
-                return False
-
-            if num_sent and num_sent < len(bdata) or obs < len(data):
-                data = data[num_sent:]
-            else:
-                return True
+                return
+            self._consume_outbox(num_sent)
+            size = self._send_size or self.send_buffer_size
+            if num_sent < total:
+                self._send_size = max(num_sent, self.send_buffer_size)
+                return
+            if total >= size:
+                self._send_size = min(size * 2, self.max_send_buffer_size)
+
+    def _gather_outbox(self):
+        size = self._send_size or self.send_buffer_size
+        offset = self._outbox_offset
+        buffers = []
+        total = 0
+        for item in self.outbox:
+            if item is None or len(buffers) == self.max_send_items:
+                break
+            view = memoryview(item)
+            if offset:
+                view, offset = view[offset:], 0
+            if total + len(view) > size:
+                if not buffers:
+                    buffers.append(view[:size])
+                    total = size
+                break
+            buffers.append(view)
+            total += len(view)
+        return buffers, total
+
+    def _consume_outbox(self, num_sent):
+        outbox = self.outbox
+        offset = self._outbox_offset + num_sent
+        while outbox and outbox[0] is not None:
+            size = len(outbox[0])
+            if offset < size:
+                break
+            offset -= size
+            outbox.popleft()
+        self._outbox_offset = offset
 
     def discard_buffers(self):
         """In emergencies this method will discard any data held in the input
@@ -932,6 +1359,8 @@ class AsyncChat(Dispatcher):
 
     def discard_output_buffers(self):
         self.outbox.clear()
+        self._outbox_offset = 0
+        self.update_interest()
 
 
 def find_prefix_at_end(haystack, needle):
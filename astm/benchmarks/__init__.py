@@ -0,0 +1,283 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+"""
+.. module:: astm.benchmarks
+   :synopsis: Codec and mapping micro-benchmarks.
+
+Times codec and mapping entry points on generated data of LabOnline sessions,
+bulk messages and chunked frames. Results are stored as JSON and could be
+compared with the baseline ones to catch performance regressions::
+
+    $ python -m astm.benchmarks run -o base.json
+    $ python -m astm.benchmarks run -o new.json -k codec.
+    $ python -m astm.benchmarks compare base.json new.json --threshold 0.1
+
+Comparison exits with non zero status if any benchmark became slower than
+the baseline by more than `threshold` fraction.
+
+Throughput and latency of the whole client-server exchange is measured by
+``loopback`` command. See :mod:`astm.benchmarks.loopback`.
+"""
+
+import argparse
+import json
+import platform
+import sys
+import time
+import timeit
+from astm import asynclib, metrics
+from astm.version import __version__
+from .loopback import run_loopback
+from .suite import BENCHMARKS, benchmark
+
+__all__ = ['BENCHMARKS', 'benchmark', 'run', 'time_func', 'save', 'load',
+           'compare', 'run_loopback', 'main']
+
+#: Minimal duration of single timing round in seconds.
+MIN_TIME = 0.05
+
+
+def time_func(func, repeat=5, min_time=MIN_TIME):
+    """Times `func` call. Number of calls per round is calibrated so each
+    round takes at least `min_time` seconds.
+
+    :param func: Callable without arguments.
+    :type func: callable
+
+    :param repeat: Number of timing rounds.
+    :type repeat: int
+
+    :param min_time: Minimal duration of timing round in seconds.
+    :type min_time: float
+
+    :return: Dict with best and median time of single call in seconds,
+             number of calls per round and number of rounds.
+    :rtype: dict
+    """
+    timer = timeit.Timer(func)
+    number = 1
+    while True:
+        elapsed = timer.timeit(number)
+        if elapsed >= min_time:
+            break
+        number *= 10 if elapsed < min_time / 10 else 2
+    timings = sorted(elapsed / number
+                     for elapsed in timer.repeat(repeat, number))
+    return {'best': timings[0],
+            'median': timings[len(timings) // 2],
+            'number': number,
+            'repeat': repeat}
+
+
+def run(names=None, repeat=5, min_time=MIN_TIME, callback=None):
+    """Runs registered benchmarks.
+
+    :param names: Substrings of benchmark names to run. All benchmarks are
+                  run if omitted.
+    :type names: list
+
+    :param callback: Function which is called with benchmark name and its
+                     result as soon as it completes.
+    :type callback: callable
+
+    Other arguments have the same meaning as for :func:`time_func`.
+
+    :return: Benchmark results with ``meta`` information about environment
+             and ``benchmarks`` timings by their names.
+    :rtype: dict
+    """
+    results = {}
+    for name, factory in BENCHMARKS:
+        if names and not any(item in name for item in names):
+            continue
+        result = results[name] = time_func(factory(), repeat, min_time)
+        if callback is not None:
+            callback(name, result)
+    return {
+        'meta': {
+            'python': platform.python_version(),
+            'implementation': platform.python_implementation(),
+            'platform': platform.platform(),
+            'astm': __version__,
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S')
+        },
+        'benchmarks': results
+    }
+
+
+def save(results, path):
+    """Writes benchmark results to JSON file."""
+    with open(path, 'w') as f:
+        json.dump(results, f, indent=2, sort_keys=True)
+
+
+def load(path):
+    """Reads benchmark results from JSON file."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def compare(base, current, threshold=0.1, key='best'):
+    """Compares benchmark results with the baseline ones. Only benchmarks
+    present in both results are compared.
+
+    :param base: Baseline results.
+    :type base: dict
+
+    :param current: Results to compare.
+    :type current: dict
+
+    :param threshold: Allowed slowdown fraction.
+    :type threshold: float
+
+    :param key: Timing to compare: ``best`` or ``median``.
+    :type key: str
+
+    :return: List of ``(name, base, current, ratio, regressed)`` tuples
+             sorted by benchmark name, where `ratio` is relative time change.
+    :rtype: list
+    """
+    base = base['benchmarks']
+    current = current['benchmarks']
+    report = []
+    for name in sorted(set(base) & set(current)):
+        old, new = base[name][key], current[name][key]
+        ratio = (new - old) / old if old else 0.0
+        report.append((name, old, new, ratio, ratio > threshold))
+    return report
+
+
+def _format_time(value):
+    for unit, scale in (('s', 1), ('ms', 1e3), ('us', 1e6)):
+        if value * scale >= 1:
+            return '%.2f %s' % (value * scale, unit)
+    return '%.2f ns' % (value * 1e9)
+
+
+def _print_result(name, result):
+    print('%-40s %12s %12s' % (name, _format_time(result['best']),
+                               _format_time(result['median'])))
+
+
+def _print_loopback(result):
+    params = result['params']
+    print('%(clients)d clients, %(sessions)d sessions, %(patients)d'
+          ' patients, %(results)d results, chunk size %(chunk_size)s,'
+          ' bulk mode %(bulk_mode)s' % params)
+    print('%d frames, %d records in %s: %.1f frames/s, %.1f records/s' % (
+        result['frames'], result['records'], _format_time(result['duration']),
+        result['frames_per_second'], result['records_per_second']))
+    for name in ('enq', 'ack'):
+        stats = result[name]
+        if not stats['count']:
+            continue
+        print('%s latency: p50 %s, p99 %s, p999 %s, max %s' % (
+            name.upper(), _format_time(stats['p50']),
+            _format_time(stats['p99']), _format_time(stats['p999']),
+            _format_time(stats['max'])))
+        for bound, count in stats['histogram']:
+            print('  <= %8d us %8d %s' % (
+                bound, count, '#' * (count * 50 // stats['count'])))
+
+
+def main(argv=None):
+    """Command line interface. Returns exit status."""
+    parser = argparse.ArgumentParser(prog='python -m astm.benchmarks',
+                                     description=__doc__.split('\n\n')[1])
+    commands = parser.add_subparsers(dest='command')
+    cmd = commands.add_parser('run', help='run benchmarks')
+    cmd.add_argument('-o', '--output', help='write results to JSON file')
+    cmd.add_argument('-k', dest='names', action='append',
+                     help='run benchmarks which names contain the substring')
+    cmd.add_argument('-r', '--repeat', type=int, default=5,
+                     help='number of timing rounds (default: %(default)s)')
+    cmd.add_argument('--min-time', type=float, default=MIN_TIME,
+                     help='minimal round duration in seconds'
+                          ' (default: %(default)s)')
+    cmd = commands.add_parser('compare', help='compare results')
+    cmd.add_argument('base', help='baseline results JSON file')
+    cmd.add_argument('current', help='results JSON file to compare')
+    cmd.add_argument('-t', '--threshold', type=float, default=0.1,
+                     help='allowed slowdown fraction (default: %(default)s)')
+    cmd.add_argument('--median', dest='key', action='store_const',
+                     const='median', default='best',
+                     help='compare median timings instead of best ones')
+    cmd = commands.add_parser('loopback',
+                              help='run client-server loopback benchmark')
+    cmd.add_argument('-o', '--output', help='write results to JSON file')
+    cmd.add_argument('-c', '--clients', type=int, default=4,
+                     help='number of concurrent clients'
+                          ' (default: %(default)s)')
+    cmd.add_argument('-s', '--sessions', type=int, default=10,
+                     help='number of sessions per client'
+                          ' (default: %(default)s)')
+    cmd.add_argument('--patients', type=int, default=1,
+                     help='number of patients per session'
+                          ' (default: %(default)s)')
+    cmd.add_argument('--results', type=int, default=10,
+                     help='number of results per patient'
+                          ' (default: %(default)s)')
+    cmd.add_argument('--chunk-size', type=int,
+                     help='split client messages into chunks')
+    cmd.add_argument('--bulk', action='store_true',
+                     help='send each session by single message')
+    cmd.add_argument('--selectors', action='store_true',
+                     help='use selectors based polling backend')
+    cmd.add_argument('--threads', type=int,
+                     help='run server dispatchers within thread pool')
+    cmd.add_argument('--metrics', action='store_true',
+                     help='collect and print protocol metrics')
+    args = parser.parse_args(argv)
+
+    if args.command == 'run':
+        results = run(args.names, args.repeat, args.min_time, _print_result)
+        if args.output:
+            save(results, args.output)
+        return 0
+    elif args.command == 'compare':
+        report = compare(load(args.base), load(args.current),
+                         args.threshold, args.key)
+        regressions = 0
+        for name, old, new, ratio, regressed in report:
+            regressions += regressed
+            print('%-40s %12s %12s %+7.1f%%%s' % (
+                name, _format_time(old), _format_time(new), ratio * 100,
+                '  REGRESSION' if regressed else ''))
+        return 1 if regressions else 0
+    elif args.command == 'loopback':
+        if args.metrics:
+            metrics.reset()
+            metrics.enable()
+        executor = None
+        if args.threads:
+            from concurrent.futures import ThreadPoolExecutor
+            executor = ThreadPoolExecutor(args.threads)
+        try:
+            result = run_loopback(
+                args.clients, args.sessions, args.patients, args.results,
+                args.chunk_size, args.bulk,
+                asynclib.SelectorPoller() if args.selectors else None,
+                executor)
+        finally:
+            metrics.disable()
+            if executor is not None:
+                executor.shutdown()
+        _print_loopback(result)
+        if args.metrics:
+            print(metrics.to_prometheus())
+        if args.output:
+            save(result, args.output)
+        return 0
+    parser.print_help()
+    return 2
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,124 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+"""Generators of realistic ASTM data for benchmarks. Data is made of records
+of Omnilab LabOnline sessions, so it could be wrapped by mappings of
+:mod:`astm.omnilab.server`. Generated data is the same on each call."""
+
+from astm import codec
+from astm.constants import ACK, CRLF, ENQ, EOT, ETX, RECORD_SEP, STX
+
+__all__ = ['HEADER', 'PATIENT', 'ORDER', 'RESULT', 'COMMENT', 'TERMINATOR',
+           'omnilab_records', 'omnilab_session', 'bulk_message',
+           'chunked_frames', 'transcript']
+
+HEADER = b'H|\\^&|||LabOnline^1.0.0|||||||P|E 1394-97|20091116104731'
+PATIENT = (b'P|%d|1212%04d|117118112||White^Nicky||19601218|M|||||||0'
+           b'||||||||||CHIR')
+ORDER = (b'O|1|2514%04d|^1003^3|^^^Na^Sodium|R||||||||||U'
+         b'|||CHIM|ARCH||251400||||F')
+RESULT = (b'R|%d|^^^%s^%s|%d.%03d|mmol/l|10-120|0|N|F||Val.Autom.^Smith '
+          b'|201009261006|201009261034^201009261033|Architect')
+COMMENT = b'C|1|I|TC^test comment|G'
+TERMINATOR = b'L|1|N'
+
+#: Assay codes and names used for results.
+ASSAYS = ((b'NA', b'Sodium'), (b'K', b'Potass'), (b'CL', b'Chloride'),
+          (b'GLU', b'Glucose'), (b'CREA', b'Creat'), (b'UREA', b'Urea'))
+
+
+def omnilab_records(patients=10, results=10):
+    """Returns records of LabOnline session: header, `patients` patients with
+    single order, `results` results and comment for each of them, and
+    terminator.
+
+    :return: List of raw records.
+    :rtype: list
+    """
+    records = [HEADER]
+    for pidx in range(1, patients + 1):
+        records.append(PATIENT % (pidx, pidx % 10000))
+        records.append(ORDER % (pidx % 10000))
+        for ridx in range(1, results + 1):
+            code, name = ASSAYS[ridx % len(ASSAYS)]
+            records.append(RESULT % (ridx, code, name,
+                                     ridx, pidx * ridx % 1000))
+        records.append(COMMENT)
+    records.append(TERMINATOR)
+    return records
+
+
+def omnilab_session(patients=10, results=10, seq=1):
+    """Returns LabOnline session records as single ASTM message.
+
+    :rtype: bytes
+    """
+    return _make_message(seq, omnilab_records(patients, results))
+
+
+def bulk_message(size=65536):
+    """Returns single ASTM message of at least `size` bytes, as instruments
+    send in bulk mode.
+
+    :rtype: bytes
+    """
+    patients = 1
+    while True:
+        message = omnilab_session(patients)
+        if len(message) >= size:
+            return message
+        patients *= 2
+
+
+def chunked_frames(message, size=247):
+    """Splits `message` into chunks of `size` bytes. Default size is the
+    largest frame size allowed by the standard.
+
+    :rtype: list
+    """
+    return list(codec.split(message, size))
+
+
+def transcript(sessions=10, patients=10, results=10, chunk_size=None):
+    """Returns data stream captured from the wire: `sessions` transfer phases
+    with a message per patient, each message chunked by `chunk_size` if
+    specified, with receiver ACKs within.
+
+    :rtype: bytes
+    """
+    data = []
+    for _ in range(sessions):
+        data.append(ENQ + ACK)
+        records = omnilab_records(patients, results)
+        # header, records of each patient and terminator are sent within
+        # separate messages
+        messages = [records[:1]]
+        messages.extend(_group(records[1:-1], results + 3))
+        messages.append(records[-1:])
+        seq = 1
+        for message in messages:
+            message = _make_message(seq, message)
+            chunks = [message]
+            if chunk_size:
+                chunks = codec.split(message, chunk_size)
+            for chunk in chunks:
+                data.append(chunk + ACK)
+                seq = (seq + 1) % 8
+        data.append(EOT)
+    return b''.join(data)
+
+
+def _group(records, size):
+    return [records[idx:idx + size] for idx in range(0, len(records), size)]
+
+
+def _make_message(seq, records):
+    data = b''.join([str(seq % 8).encode(), RECORD_SEP.join(records),
+                     RECORD_SEP, ETX])
+    return STX + data + codec.make_checksum(data) + CRLF
@@ -0,0 +1,223 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+"""End-to-end benchmark of :class:`~astm.server.Server` and
+:class:`~astm.client.Client` over localhost. Server and several concurrent
+clients are run within the same polling loop, each client sends number of
+LabOnline sessions and measures time between sent ENQ or message frame and
+received ACK::
+
+    $ python -m astm.benchmarks loopback --clients 8 --sessions 50 \\
+        --results 20 --chunk-size 247
+
+Since server and clients share the process, the results show the cost of
+the whole exchange rather than the server capacity alone."""
+
+import socket
+import threading
+from timeit import default_timer
+from astm import asynclib, codec
+from astm.client import Client
+from astm.constants import ENQ, EOT
+from astm.server import BaseRecordsDispatcher, Server
+from . import corpus
+
+__all__ = ['LatencyStats', 'run_loopback']
+
+
+class LatencyStats(object):
+    """Collects latency samples and reports their percentiles and histogram
+    with power of two microseconds buckets."""
+
+    def __init__(self):
+        self.samples = []
+
+    def __len__(self):
+        return len(self.samples)
+
+    def add(self, value):
+        """Adds latency sample in seconds."""
+        self.samples.append(value)
+
+    def percentile(self, q):
+        """Returns `q` percentile of collected samples by nearest rank
+        method, or :const:`None` if there are no samples.
+
+        :param q: Percentile in range ``(0, 100]``.
+        :type q: float
+        """
+        if not self.samples:
+            return None
+        samples = sorted(self.samples)
+        rank = int(len(samples) * q / 100.0 + 0.5)
+        return samples[min(max(rank, 1), len(samples)) - 1]
+
+    def histogram(self):
+        """Returns list of ``(upper_bound, count)`` tuples where upper bound
+        is in microseconds."""
+        counts = {}
+        for value in self.samples:
+            bound = 1
+            while bound < value * 1e6:
+                bound *= 2
+            counts[bound] = counts.get(bound, 0) + 1
+        return sorted(counts.items())
+
+    def summary(self):
+        """Returns dict with number of samples, their mean, min, max and
+        p50, p99 and p999 percentiles in seconds."""
+        samples = self.samples
+        if not samples:
+            return {'count': 0}
+        return {
+            'count': len(samples),
+            'mean': sum(samples) / len(samples),
+            'min': min(samples),
+            'max': max(samples),
+            'p50': self.percentile(50),
+            'p99': self.percentile(99),
+            'p999': self.percentile(99.9),
+            'histogram': self.histogram()
+        }
+
+
+class _Dispatcher(BaseRecordsDispatcher):
+
+    #: Number of dispatched records by all instances.
+    records = 0
+    # dispatchers may run within executor threads
+    _lock = threading.Lock()
+
+    def _default_handler(self, record):
+        with _Dispatcher._lock:
+            _Dispatcher.records += 1
+
+
+class _Client(Client):
+
+    def __init__(self, enq_stats, ack_stats, *args, **kwargs):
+        self.enq_stats = enq_stats
+        self.ack_stats = ack_stats
+        self.frames = 0
+        self._sent_at = None
+        self._sent_enq = False
+        super(_Client, self).__init__(*args, **kwargs)
+
+    def push(self, data):
+        if data != EOT:
+            self._sent_at = default_timer()
+            self._sent_enq = data == ENQ
+        return super(_Client, self).push(data)
+
+    def on_ack(self):
+        latency = default_timer() - self._sent_at
+        if self._sent_enq:
+            self.enq_stats.add(latency)
+        else:
+            self.ack_stats.add(latency)
+            self.frames += 1
+        return super(_Client, self).on_ack()
+
+
+def _make_emitter(sessions, patients, results):
+    records = [codec.decode_record(record, 'latin-1')
+               for record in corpus.omnilab_records(patients, results)]
+
+    def emitter():
+        for _ in range(sessions):
+            for record in records:
+                yield record
+    return emitter, len(records) * sessions
+
+
+def run_loopback(clients=4, sessions=10, patients=1, results=10,
+                 chunk_size=None, bulk_mode=False, poller=None,
+                 executor=None, host='127.0.0.1', timeout=60):
+    """Starts server and `clients` concurrent clients on localhost and runs
+    polling loop until all clients send their data.
+
+    :param clients: Number of concurrent clients.
+    :type clients: int
+
+    :param sessions: Number of sessions sent by each client.
+    :type sessions: int
+
+    :param patients: Number of patients per session.
+    :type patients: int
+
+    :param results: Number of results per patient.
+    :type results: int
+
+    :param chunk_size: Chunk size of client messages.
+    :type chunk_size: int
+
+    :param bulk_mode: Send each session by single message.
+    :type bulk_mode: bool
+
+    :param poller: Polling loop backend. See :func:`astm.asynclib.loop`.
+
+    :param executor: Server dispatchers executor. See
+                     :class:`~astm.server.Server`.
+
+    :param timeout: Maximum benchmark duration in seconds.
+    :type timeout: float
+
+    :return: Dict with benchmark parameters, duration, throughput of frames
+             and records per second and ``enq`` and ``ack`` latency
+             summaries. See :meth:`LatencyStats.summary`.
+    :rtype: dict
+    """
+    emitter, records = _make_emitter(sessions, patients, results)
+    _Dispatcher.records = 0
+    channels = set(asynclib._SOCKET_MAP)
+    server = Server(host, 0, dispatcher=_Dispatcher, executor=executor,
+                    backlog=max(clients, 5))
+    enq_stats, ack_stats = LatencyStats(), LatencyStats()
+    started = default_timer()
+    deadline = started + timeout
+    pool = []
+    try:
+        for _ in range(clients):
+            pool.append(_Client(enq_stats, ack_stats, emitter, host,
+                                server.address[1], timeout=timeout,
+                                chunk_size=chunk_size, bulk_mode=bulk_mode))
+        # request handlers are done when all records are dispatched, clients
+        # could be closed before that if server is behind
+        while (_Dispatcher.records < records * clients
+               or any(client.connected for client in pool)):
+            if default_timer() > deadline:
+                raise socket.timeout('Loopback benchmark is timed out')
+            asynclib.loop(0.1, count=1, poller=poller)
+        duration = default_timer() - started
+    finally:
+        server.close()
+        if server.dispatch_pool is not None:
+            server.dispatch_pool.close()
+        # drop request handlers and clients which are still alive
+        for fileno, channel in list(asynclib._SOCKET_MAP.items()):
+            if fileno not in channels:
+                channel.handle_close()
+    frames = sum(client.frames for client in pool)
+    return {
+        'params': {
+            'clients': clients,
+            'sessions': sessions,
+            'patients': patients,
+            'results': results,
+            'chunk_size': chunk_size,
+            'bulk_mode': bulk_mode
+        },
+        'duration': duration,
+        'frames': frames,
+        'records': _Dispatcher.records,
+        'frames_per_second': frames / duration,
+        'records_per_second': _Dispatcher.records / duration,
+        'enq': enq_stats.summary(),
+        'ack': ack_stats.summary()
+    }
@@ -0,0 +1,179 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+"""Benchmarks of codec and mapping entry points. Each benchmark is a factory
+registered by :func:`benchmark` decorator: it prepares data once and returns
+callable without arguments which is timed by the runner."""
+
+from io import BytesIO
+from astm import codec
+from astm.omnilab import server as omnilab
+from . import corpus
+
+__all__ = ['BENCHMARKS', 'benchmark']
+
+#: Registered benchmarks as list of ``(name, factory)`` tuples in order of
+#: their definition.
+BENCHMARKS = []
+
+ENCODING = 'latin-1'
+
+#: Single result record used by per record benchmarks.
+RESULT = corpus.RESULT % (1, b'NA', b'Sodium', 7, 273)
+
+
+def benchmark(name):
+    """Registers benchmark factory under specified `name`."""
+    def decorator(func):
+        BENCHMARKS.append((name, func))
+        return func
+    return decorator
+
+
+class _RecordsDispatcher(omnilab.RecordsDispatcher):
+
+    def _default_handler(self, record):
+        pass
+
+
+def _session_records():
+    message = corpus.omnilab_session()
+    return codec.decode_message(message, ENCODING)[1]
+
+
+def _decode_message(engine):
+    def factory():
+        message = corpus.omnilab_session()
+        return lambda: codec.decode_message(message, ENCODING, engine)
+    return factory
+
+
+for _engine in sorted(codec.DECODE_ENGINES):
+    benchmark('codec.decode_message.%s' % _engine)(_decode_message(_engine))
+
+
+@benchmark('codec.decode_message.bulk')
+def decode_bulk_message():
+    message = corpus.bulk_message()
+    return lambda: codec.decode_message(message, ENCODING, 'fast')
+
+
+@benchmark('codec.decode_message.interned')
+def decode_interned_message():
+    message = corpus.bulk_message()
+    cache = codec.InternCache()
+
+    def decode():
+        previous = codec.set_intern_cache(cache)
+        try:
+            return codec.decode_message(message, ENCODING, 'fast')
+        finally:
+            codec.set_intern_cache(previous)
+    return decode
+
+
+@benchmark('codec.decode_record')
+def decode_record():
+    return lambda: codec.decode_record(RESULT, ENCODING)
+
+
+@benchmark('codec.encode_message')
+def encode_message():
+    records = _session_records()
+    return lambda: codec.encode_message(1, records, ENCODING)
+
+
+@benchmark('codec.encode.chunked')
+def encode_chunked():
+    records = _session_records()
+    return lambda: codec.encode(records, ENCODING, size=247)
+
+
+@benchmark('codec.encode_into')
+def encode_into():
+    records = _session_records()
+    buf = bytearray(len(codec.encode_message(1, records, ENCODING)) * 2)
+    return lambda: codec.encode_into(buf, records, ENCODING, size=247)
+
+
+@benchmark('codec.split')
+def split():
+    message = corpus.bulk_message()
+    return lambda: list(codec.split(message, 247))
+
+
+@benchmark('codec.join')
+def join():
+    chunks = corpus.chunked_frames(corpus.bulk_message())
+    return lambda: codec.join(chunks)
+
+
+@benchmark('codec.make_checksum')
+def make_checksum():
+    message = corpus.bulk_message()
+    return lambda: codec.make_checksum(message)
+
+
+@benchmark('codec.FrameParser.feed')
+def frame_parser():
+    data = corpus.transcript(chunk_size=247)
+    pieces = [data[idx:idx + 1024] for idx in range(0, len(data), 1024)]
+
+    def run():
+        parser = codec.FrameParser()
+        for piece in pieces:
+            for token in parser.feed(piece):
+                pass
+    return run
+
+
+@benchmark('codec.iter_decode_stream')
+def iter_decode_stream():
+    data = corpus.transcript(chunk_size=247)
+    return lambda: list(codec.iter_decode_stream(BytesIO(data), ENCODING))
+
+
+@benchmark('mapping.Record.from_bytes')
+def record_from_bytes():
+    return lambda: omnilab.Result.from_bytes(RESULT, ENCODING)
+
+
+@benchmark('mapping.Record.wrap')
+def record_wrap():
+    record = codec.decode_record(RESULT, ENCODING)
+    return lambda: omnilab.Result(*record)
+
+
+@benchmark('mapping.Record.from_lazy')
+def record_from_lazy():
+
+    def run():
+        obj = omnilab.Result.from_lazy(
+            codec.decode_record(RESULT, ENCODING, 'lazy'))
+        return obj.value
+    return run
+
+
+@benchmark('mapping.Record.to_astm')
+def record_to_astm():
+    obj = omnilab.Result.from_bytes(RESULT, ENCODING)
+    return obj.to_astm
+
+
+@benchmark('mapping.Record.to_bytes')
+def record_to_bytes():
+    obj = omnilab.Result.from_bytes(RESULT, ENCODING)
+    return lambda: obj.to_bytes(ENCODING)
+
+
+@benchmark('mapping.RecordsDispatcher')
+def records_dispatcher():
+    message = corpus.omnilab_session()
+    dispatcher = _RecordsDispatcher(ENCODING)
+    return lambda: dispatcher(message)
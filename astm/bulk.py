@@ -0,0 +1,261 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+"""Parallel decoding of captured ASTM data streams. File is split into shards
+at messages boundaries and each shard is processed by own worker process::
+
+    from astm import bulk
+
+    for seq, records in bulk.iter_decode_file('/var/log/astm/2013-03.bin'):
+        handle(records)
+
+Records could be also handled by records dispatcher within workers. Since
+wrapped records are processed in place, there is no need to transfer them
+between processes::
+
+    from astm.omnilab.server import RecordsDispatcher
+
+    class Dispatcher(RecordsDispatcher):
+
+        def on_result(self, record):
+            store(record.test.assay_code, record.value)
+
+    bulk.dispatch_file('/var/log/astm/2013-03.bin', Dispatcher)
+"""
+
+import multiprocessing
+import os
+from collections import deque
+from .codec import iter_decode_stream, iter_stream_messages
+from .constants import CRLF, ENCODING, EOT, ETX, NAK
+
+__all__ = ['split_file', 'decode_shard', 'dispatch_shard',
+           'iter_decode_file', 'dispatch_file']
+
+#: Number of bytes read at once on looking for shard boundary.
+SCAN_SIZE = 65536
+#: Approximate size of file shard in bytes, unless number of shards is set.
+SHARD_SIZE = 4 * 1024 * 1024
+
+
+def split_file(path, count):
+    """Splits file into `count` shards of nearly equal size. Shards are
+    bounded by end of non-chunked message which isn't rejected by NAK or by
+    EOT, so each shard could be decoded independently. Shards with no such boundary are merged with the
+    next ones, so there could be fewer shards than requested.
+
+    :param path: File path.
+    :type path: str
+
+    :param count: Number of shards.
+    :type count: int
+
+    :return: List of shards as ``(start, stop)`` offsets tuples.
+    :rtype: list
+    """
+    size = os.path.getsize(path)
+    shards = []
+    start = 0
+    with open(path, 'rb') as f:
+        for idx in range(1, count):
+            offset = max(size * idx // count, start)
+            stop = _find_boundary(f, offset, size)
+            if stop >= size:
+                break
+            if stop > start:
+                shards.append((start, stop))
+                start = stop
+    if start < size or not shards:
+        shards.append((start, size))
+    return shards
+
+
+def _find_boundary(f, offset, size):
+    pos = offset
+    while pos < size:
+        # few bytes before are read to catch boundary on the window edge
+        base = max(pos - 4, 0)
+        f.seek(base)
+        data = f.read(SCAN_SIZE + pos - base)
+        if not data:
+            break
+        start = pos - base
+        found = []
+        eot = data.find(EOT, start)
+        if eot != -1:
+            found.append(eot + 1)
+        crlf = data.find(CRLF, max(start - 1, 0))
+        # message ends with <ETX><CS><CS><CR><LF>, chunks end with <ETB>;
+        # message followed by NAK is retransmitted, so it isn't a boundary
+        while crlf != -1 and (crlf < 3 or data[crlf - 3:crlf - 2] != ETX
+                              or data[crlf + 2:crlf + 3] in (NAK, b'')):
+            crlf = data.find(CRLF, crlf + 1)
+        if crlf != -1:
+            found.append(crlf + 2)
+        if found:
+            return base + min(found)
+        pos = base + len(data)
+    return size
+
+
+class _FileRange(object):
+    """Read-only file object limited by the range of bytes."""
+
+    def __init__(self, path, start, stop):
+        self._file = open(path, 'rb')
+        self._file.seek(start)
+        self._left = stop - start
+
+    def read(self, size=-1):
+        if size < 0 or size > self._left:
+            size = self._left
+        data = self._file.read(size)
+        self._left -= len(data)
+        return data
+
+    def close(self):
+        self._file.close()
+
+
+def decode_shard(path, start, stop, encoding=ENCODING, engine='default',
+                 skip_invalid=False):
+    """Decodes messages within file shard.
+
+    :return: List of ``(seq, records)`` tuples. See
+             :func:`~astm.codec.iter_decode_stream`.
+    :rtype: list
+    """
+    source = _FileRange(path, start, stop)
+    try:
+        return list(iter_decode_stream(source, encoding, engine,
+                                       skip_invalid=skip_invalid))
+    finally:
+        source.close()
+
+
+def dispatch_shard(path, start, stop, dispatcher, encoding=None,
+                   skip_invalid=False):
+    """Passes messages within file shard to new `dispatcher` instance.
+
+    :return: Number of dispatched messages.
+    :rtype: int
+    """
+    dispatcher = dispatcher(encoding)
+    source = _FileRange(path, start, stop)
+    count = 0
+    try:
+        for seq, message in iter_stream_messages(
+                source, skip_invalid=skip_invalid):
+            dispatcher(message)
+            count += 1
+    finally:
+        source.close()
+    return count
+
+
+def _decode_shard_task(args):
+    return decode_shard(*args)
+
+
+def _dispatch_shard_task(args):
+    return dispatch_shard(*args)
+
+
+def _map_shards(func, path, args, processes, shards):
+    if processes is None:
+        processes = multiprocessing.cpu_count()
+    if shards is None:
+        # shards of fixed size limit size of each decoded result
+        shards = max(os.path.getsize(path) // SHARD_SIZE, processes)
+    tasks = [(path, start, stop) + args
+             for start, stop in split_file(path, shards)]
+    if processes == 1:
+        for task in tasks:
+            yield func(task)
+        return
+    pool = multiprocessing.Pool(processes)
+    try:
+        # few tasks per process keep workers busy, while results of others
+        # are not piled up in memory when they are consumed slowly
+        pending = deque()
+        for task in tasks:
+            if len(pending) >= processes * 2:
+                yield pending.popleft().get()
+            pending.append(pool.apply_async(func, (task,)))
+        while pending:
+            yield pending.popleft().get()
+        pool.close()
+    finally:
+        pool.terminate()
+        pool.join()
+
+
+def iter_decode_file(path, encoding=ENCODING, engine='default',
+                     processes=None, shards=None, skip_invalid=False):
+    """Decodes captured ASTM data stream by several worker processes.
+    Messages are yielded in the same order as they are stored in file.
+
+    :param path: File path.
+    :type path: str
+
+    :param encoding: Data encoding.
+    :type encoding: str
+
+    :param engine: Records decoder engine. See
+                   :func:`~astm.codec.decode_record`.
+    :type engine: str
+
+    :param processes: Number of worker processes. Equals to number of CPUs
+                      if omitted. Single process decodes file without
+                      workers.
+    :type processes: int
+
+    :param shards: Number of file shards. If omitted file is split by shards
+                   of :data:`SHARD_SIZE` bytes, but not fewer than number of
+                   processes.
+    :type shards: int
+
+    :param skip_invalid: Skip invalid messages instead of raising
+                         :exc:`ValueError`.
+    :type skip_invalid: bool
+
+    :yield: Tuple of frame sequence number and list of records.
+    """
+    for result in _map_shards(_decode_shard_task, path,
+                              (encoding, engine, skip_invalid),
+                              processes, shards):
+        for item in result:
+            yield item
+
+
+def dispatch_file(path, dispatcher, encoding=None,
+                  processes=None, shards=None, skip_invalid=False):
+    """Passes messages of captured ASTM data stream to the records
+    `dispatcher` within several worker processes. Each shard is handled by
+    new dispatcher instance, so dispatcher state isn't shared between
+    shards.
+
+    :param path: File path.
+    :type path: str
+
+    :param dispatcher: Records dispatcher class, for instance
+                       :class:`astm.omnilab.server.RecordsDispatcher`.
+    :type dispatcher: :class:`~astm.server.BaseRecordsDispatcher`
+
+    :param encoding: Dispatcher encoding.
+    :type encoding: str
+
+    Other arguments have the same meaning as for :func:`iter_decode_file`.
+
+    :return: Number of dispatched messages.
+    :rtype: int
+    """
+    return sum(_map_shards(_dispatch_shard_task, path,
+                           (dispatcher, encoding, skip_invalid),
+                           processes, shards))
@@ -0,0 +1,89 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+from threading import Lock
+
+__all__ = ['LRUCache']
+
+PREV, NEXT, KEY, VALUE = 0, 1, 2, 3
+
+
+class LRUCache(object):
+    """Bounded key-value cache which discards least recently used items
+    when :attr:`maxsize` is exceeded.
+
+    >>> cache = LRUCache(2)
+    >>> cache['a'] = 1
+    >>> cache['b'] = 2
+    >>> cache.get('a')
+    1
+    >>> cache['c'] = 3
+    >>> 'b' in cache
+    False
+
+    :param maxsize: Maximum number of items to keep.
+    :type maxsize: int
+    """
+    def __init__(self, maxsize=1024):
+        #: Maximum number of items to keep. Changes take effect on next item
+        #: insertion.
+        self.maxsize = maxsize
+        self._lock = Lock()
+        self._links = {}
+        self._root = root = []
+        root[:] = [root, root, None, None]
+
+    def __contains__(self, key):
+        return key in self._links
+
+    def __len__(self):
+        return len(self._links)
+
+    def get(self, key, default=None):
+        """Returns cached value for `key` marking it as recently used or
+        `default` if there is no such one."""
+        with self._lock:
+            link = self._links.get(key)
+            if link is None:
+                return default
+            self._move_to_end(link)
+            return link[VALUE]
+
+    def __setitem__(self, key, value):
+        with self._lock:
+            link = self._links.get(key)
+            if link is not None:
+                link[VALUE] = value
+                self._move_to_end(link)
+                return
+            root = self._root
+            last = root[PREV]
+            link = [last, root, key, value]
+            last[NEXT] = root[PREV] = self._links[key] = link
+            while len(self._links) > max(self.maxsize, 0):
+                oldest = root[NEXT]
+                root[NEXT] = oldest[NEXT]
+                oldest[NEXT][PREV] = root
+                del self._links[oldest[KEY]]
+
+    def clear(self):
+        """Discards all cached items."""
+        with self._lock:
+            self._links.clear()
+            root = self._root
+            root[:] = [root, root, None, None]
+
+    def _move_to_end(self, link):
+        link[PREV][NEXT] = link[NEXT]
+        link[NEXT][PREV] = link[PREV]
+        root = self._root
+        last = root[PREV]
+        last[NEXT] = root[PREV] = link
+        link[PREV] = last
+        link[NEXT] = root
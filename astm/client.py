@@ -9,8 +9,9 @@
 
 import logging
 import socket
+from . import metrics
 from .asynclib import loop
-from .codec import encode
+from .codec import encode_message, split
 from .constants import ENQ, EOT
 from .exceptions import NotAccepted
 from .mapping import Record
@@ -112,6 +113,8 @@ class Emitter(object):
         # last sent sequence number
         self.last_seq = 0
         self.buffer = []
+        # pending chunks of the last message
+        self._chunks = iter([])
         self.chunk_size = chunk_size
         self.bulk_mode = bulk_mode
 
@@ -128,29 +131,53 @@ class Emitter(object):
         return record
 
     def _send_record(self, record):
+        records = [record]
         if self.bulk_mode:
-            records = [record]
             while True:
                 record = self._get_record(True)
                 records.append(record)
                 if record[0] == 'L':
                     break
-            chunks = encode(records, self.encoding, self.chunk_size)
+        if not metrics.enabled:
+            return self._make_message(records)
+        started = metrics.timer()
+        data = self._make_message(records)
+        metrics.CLIENT_ENCODE_TIME.observe(metrics.timer() - started)
+        metrics.CLIENT_RECORDS.inc(len(records))
+        return data
+
+    def _make_message(self, records):
+        if self.bulk_mode:
+            data = encode_message(1, records, self.encoding)
         else:
             self.last_seq += 1
-            chunks = encode([record], self.encoding,
-                            self.chunk_size, self.last_seq)
-
-        self.buffer.extend(chunks)
-        data = self.buffer.pop(0)
-        self.last_seq += len(self.buffer)
-
-        if record[0] == 'L':
-            self.last_seq = 0
+            data = encode_message(self.last_seq, records, self.encoding)
+
+        if self.chunk_size is not None and len(data) > self.chunk_size:
+            if metrics.enabled:
+                step = self.chunk_size - 7
+                metrics.CLIENT_CHUNKS.observe((len(data) - 8) // step + 1)
+            # chunks are produced on demand, so only current one is kept
+            self._chunks = split(data, self.chunk_size)
+            data = next(self._chunks)
+        elif metrics.enabled:
+            metrics.CLIENT_CHUNKS.observe(1)
+
+        if records[-1][0] == 'L':
             self.buffer.append(EOT)
 
         return data
 
+    def _pop_buffer(self):
+        for chunk in self._chunks:
+            self.last_seq += 1
+            return chunk
+        if self.buffer:
+            data = self.buffer.pop(0)
+            if data == EOT:
+                self.last_seq = 0
+            return data
+
     def send(self, value=None):
         """Passes `value` to the emitter. Semantically acts in same way as
         :meth:`send` for generators.
@@ -166,8 +193,10 @@ class Emitter(object):
         :return: Next record data to send to server.
         :rtype: bytes
         """
-        if self.buffer and value:
-            return self.buffer.pop(0)
+        if value:
+            data = self._pop_buffer()
+            if data is not None:
+                return data
 
         record = self._get_record(value)
 
@@ -223,6 +252,10 @@ class Client(ASTMProtocol):
                       time and server may reject data by timeout reason.
     :type bulk_mode: bool
 
+    :param trace_size: Number of last transferred bytes to keep within
+                       :class:`~astm.trace.WireTrace` to log them on error.
+    :type trace_size: int
+
     Base `emitter` is a generator that yield ASTM records one by one preserving
     their order::
 
@@ -254,8 +287,8 @@ class Client(ASTMProtocol):
 
     def __init__(self, emitter, host='localhost', port=15200,
                  encoding=None, timeout=20, flow_map=DEFAULT_RECORDS_FLOW_MAP,
-                 chunk_size=None, bulk_mode=False):
-        super(Client, self).__init__(timeout=timeout)
+                 chunk_size=None, bulk_mode=False, trace_size=None):
+        super(Client, self).__init__(timeout=timeout, trace_size=trace_size)
         self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
         self.connect((host, port))
         self.emitter = self.emitter_wrapper(
@@ -265,7 +298,6 @@ class Client(ASTMProtocol):
             chunk_size=chunk_size,
             bulk_mode=bulk_mode
         )
-        self.terminator = 1
 
     def handle_connect(self):
         """Initiates ASTM communication session."""
@@ -7,19 +7,62 @@
 # you should have received as part of this distribution.
 #
 
+import logging
+import re
 from collections import Iterable
+from .cache import LRUCache
 from .compat import unicode
 from .constants import (
-    STX, ETX, ETB, CR, LF, CRLF,
+    STX, ETX, ETB, CR, LF, CRLF, ENQ, ACK, NAK, EOT,
     FIELD_SEP, COMPONENT_SEP, RECORD_SEP, REPEAT_SEP, ENCODING
 )
 try:
-    from itertools import izip_longest
-except ImportError:  # Python 3
-    from itertools import zip_longest as izip_longest
-
-
-def decode(data, encoding=ENCODING):
+    from zlib import adler32
+except ImportError:
+    adler32 = None
+    _adler32_blocks = None
+else:
+    try:
+        adler32(memoryview(b''))
+    except TypeError:
+        # Python 2 adler32 supports only old buffer interface which
+        # memoryview doesn't provide, but buffer objects do.
+        def _adler32_blocks(data, size):
+            if isinstance(data, memoryview):
+                data = data.tobytes()
+            return [buffer(data, idx, 256) for idx in range(0, size, 256)]
+    else:
+        def _adler32_blocks(data, size):
+            view = memoryview(data)
+            return [view[idx:idx + 256] for idx in range(0, size, 256)]
+try:
+    import mmap
+except ImportError:
+    mmap = None
+
+log = logging.getLogger(__name__)
+
+#: Splits record by any of field, repeat or component separators keeping
+#: separators in the result.
+RE_SEPARATORS = re.compile(b'(' + b'|'.join(map(re.escape, [
+    FIELD_SEP, REPEAT_SEP, COMPONENT_SEP
+])) + b')')
+#: Matches first byte of message or control token.
+RE_TOKEN_START = re.compile(b'[' + re.escape(STX + ENQ + ACK + NAK + EOT)
+                            + b']')
+#: Checksum values as hex digit pairs indexed by their integer value.
+CHECKSUM_TABLE = tuple(('%02X' % value).encode() for value in range(256))
+#: Frame heads: STX followed by frame number, indexed by the number.
+SEQUENCE_TABLE = tuple(STX + str(value).encode() for value in range(8))
+#: Frame tails: ETX or ETB, checksum and CRLF, indexed by the checksum of
+#: frame data preceding the ETX or ETB.
+ETX_TAILS = tuple(ETX + CHECKSUM_TABLE[(value + ord(ETX)) & 0xFF] + CRLF
+                  for value in range(256))
+ETB_TAILS = tuple(ETB + CHECKSUM_TABLE[(value + ord(ETB)) & 0xFF] + CRLF
+                  for value in range(256))
+
+
+def decode(data, encoding=ENCODING, engine='default'):
     """Common ASTM decoding function that tries to guess which kind of data it
     handles.
 
@@ -41,22 +84,25 @@ def decode(data, encoding=ENCODING):
     :param encoding: Data encoding.
     :type encoding: str
 
+    :param engine: Records decoder engine. See :func:`decode_record`.
+    :type engine: str
+
     :return: List of ASTM records with unicode data.
     :rtype: list
     """
     if not isinstance(data, bytes):
         raise TypeError('bytes expected, got %r' % data)
     if data.startswith(STX):  # may be decode message \x02...\x03CS\r\n
-        seq, records, cs = decode_message(data, encoding)
+        seq, records, cs = decode_message(data, encoding, engine)
         return records
     byte = data[:1].decode()
     if  byte.isdigit():
-        seq, records = decode_frame(data, encoding)
+        seq, records = decode_frame(data, encoding, engine)
         return records
-    return [decode_record(data, encoding)]
+    return [decode_record(data, encoding, engine)]
 
 
-def decode_message(message, encoding):
+def decode_message(message, encoding, engine='default'):
     """Decodes complete ASTM message that is sent or received due
     communication routines. It should contains checksum that would be
     additionally verified.
@@ -67,6 +113,9 @@ def decode_message(message, encoding):
     :param encoding: Data encoding.
     :type encoding: str
 
+    :param engine: Records decoder engine. See :func:`decode_record`.
+    :type engine: str
+
     :returns: Tuple of three elements:
 
         * :class:`int` frame sequence number.
@@ -87,11 +136,11 @@ def decode_message(message, encoding):
     frame, cs = frame_cs[:-2], frame_cs[-2:]
     ccs = make_checksum(frame)
     assert cs == ccs, 'Checksum failure: expected %r, calculated %r' % (cs, ccs)
-    seq, records = decode_frame(frame, encoding)
+    seq, records = decode_frame(frame, encoding, engine)
     return seq, records, cs.decode()
 
 
-def decode_frame(frame, encoding):
+def decode_frame(frame, encoding, engine='default'):
     """Decodes ASTM frame: list of records followed by sequence number."""
     if not isinstance(frame, bytes):
         raise TypeError('bytes expected, got %r' % frame)
@@ -107,26 +156,282 @@ def decode_frame(frame, encoding):
         raise ValueError('Malformed ASTM frame. Expected leading seq number %r'
                          '' % frame)
     seq, records = int(seq), frame[1:]
-    return seq, [decode_record(record, encoding)
+    return seq, [decode_record(record, encoding, engine)
                  for record in records.split(RECORD_SEP)]
 
 
-def decode_record(record, encoding):
-    """Decodes ASTM record message."""
+def decode_record(record, encoding, engine='default'):
+    """Decodes ASTM record message.
+
+    :param record: ASTM record.
+    :type record: bytes
+
+    :param encoding: Data encoding.
+    :type encoding: str
+
+    :param engine: Decoder engine name. The ``default`` one splits record by
+                   each separator in turn, while ``fast`` one scans it only
+                   once tracking separators state. Both produces the same
+                   result. The ``lazy`` one returns :class:`LazyRecord`
+                   which decodes fields on first access.
+    :type engine: str
+
+    :return: List of fields with unicode data.
+    :rtype: list
+    """
+    try:
+        decoder = DECODE_ENGINES[engine]
+    except KeyError:
+        raise ValueError('Unknown decoder engine %r' % engine)
+    return decoder(record, encoding)
+
+
+def _decode_record_default(record, encoding):
+    return [_decode_field(item, encoding)
+            for item in record.split(FIELD_SEP)]
+
+
+def _decode_field(item, encoding):
+    if REPEAT_SEP in item:
+        item = decode_repeated_component(item, encoding)
+    elif COMPONENT_SEP in item:
+        item = decode_component(item, encoding)
+    elif _intern_cache is not None:
+        return _intern_cache.decode(item, encoding) if item else None
+    else:
+        item = item.decode(encoding)
+    return [None, item][bool(item)]
+
+
+def _decode_record_fast(record, encoding):
     fields = []
-    for item in record.split(FIELD_SEP):
-        if REPEAT_SEP in item:
-            item = decode_repeated_component(item, encoding)
-        elif COMPONENT_SEP in item:
-            item = decode_component(item, encoding)
+    repeats = components = None
+    tokens = iter(RE_SEPARATORS.split(record))
+    intern = _intern_cache
+    if intern is not None:
+        values, max_length = intern.values(encoding), intern.max_length
+    for item in tokens:
+        if not item:
+            item = None
+        elif intern is not None and len(item) <= max_length:
+            value = values.get(item)
+            item = intern.add(values, item, encoding) if value is None \
+                else value
         else:
             item = item.decode(encoding)
-        fields.append([None, item][bool(item)])
+        sep = next(tokens, FIELD_SEP)
+        if sep == COMPONENT_SEP:
+            if components is None:
+                components = []
+            components.append(item)
+            continue
+        if components is not None:
+            components.append(item)
+            item, components = components, None
+        elif repeats is not None or sep == REPEAT_SEP:
+            item = [item]
+        if sep == REPEAT_SEP:
+            if repeats is None:
+                repeats = []
+            repeats.append(item)
+            continue
+        if repeats is not None:
+            repeats.append(item)
+            item, repeats = repeats, None
+        fields.append(item)
     return fields
 
 
+class LazyRecord(object):
+    """Read-only list-like view of ASTM record that decodes fields on demand.
+    Record is scanned once for field separators on creation, while each
+    field is decoded on first access and cached. Decoded values are the same
+    as :func:`decode_record` returns::
+
+        >>> record = LazyRecord(b'R|1|^^^GLU|5.2|mmol/L', 'ascii')
+        >>> record[3]
+        '5.2'
+        >>> record == decode_record(record.raw, 'ascii')
+        True
+
+    :param record: ASTM record.
+    :type record: bytes
+
+    :param encoding: Data encoding.
+    :type encoding: str
+    """
+    __slots__ = ('raw', 'encoding', '_offsets', '_fields')
+
+    def __init__(self, record, encoding=ENCODING):
+        if not isinstance(record, bytes):
+            raise TypeError('bytes expected, got %r' % record)
+        #: Raw record data.
+        self.raw = record
+        self.encoding = encoding
+        offsets = [0]
+        find = record.find
+        pos = find(FIELD_SEP)
+        while pos != -1:
+            pos += 1
+            offsets.append(pos)
+            pos = find(FIELD_SEP, pos)
+        offsets.append(len(record) + 1)
+        self._offsets = offsets
+        self._fields = [_UNDECODED] * (len(offsets) - 1)
+
+    def __len__(self):
+        return len(self._fields)
+
+    def __getitem__(self, index):
+        if isinstance(index, slice):
+            return [self[idx] for idx in range(*index.indices(len(self)))]
+        value = self._fields[index]
+        if value is _UNDECODED:
+            if index < 0:
+                index += len(self._fields)
+            start, stop = self._offsets[index], self._offsets[index + 1] - 1
+            value = _decode_field(self.raw[start:stop], self.encoding)
+            self._fields[index] = value
+        return value
+
+    def __iter__(self):
+        for idx in range(len(self._fields)):
+            yield self[idx]
+
+    def __eq__(self, other):
+        if isinstance(other, LazyRecord):
+            other = list(other)
+        return list(self) == other
+
+    def __ne__(self, other):
+        return not (self == other)
+
+    __hash__ = None
+
+    def __reduce__(self):
+        return type(self), (self.raw, self.encoding)
+
+    def __repr__(self):
+        return 'LazyRecord(%r)' % self.raw
+
+    def to_list(self):
+        """Returns list of decoded fields."""
+        return list(self)
+
+
+_UNDECODED = object()
+
+#: Available :func:`decode_record` engines.
+DECODE_ENGINES = {
+    'default': _decode_record_default,
+    'fast': _decode_record_fast,
+    'lazy': LazyRecord
+}
+
+
+class InternCache(object):
+    """Bounded cache of decoded short values keyed by their raw bytes.
+    Decoders return the same string object for repeated values, such as
+    record types, test codes, units and flags, instead of allocating new one
+    for each record. Once installed by :func:`set_intern_cache`, it's used
+    by all decoder engines::
+
+        set_intern_cache(InternCache(4096))
+
+    :param size: Maximum number of cached values per encoding.
+    :type size: int
+
+    :param policy: Eviction policy: ``clear`` drops all cached values once
+                   the cache is full, which keeps lookups as cheap as
+                   :class:`dict` ones; ``lru`` discards least recently used
+                   value using :class:`~astm.cache.LRUCache`, which keeps hot
+                   values within the cache at the cost of slower lookups.
+    :type policy: str
+
+    :param max_length: Values longer than this number of bytes are decoded
+                       without caching.
+    :type max_length: int
+    """
+    policies = ('clear', 'lru')
+
+    def __init__(self, size=4096, policy='clear', max_length=16):
+        if policy not in self.policies:
+            raise ValueError('Unknown eviction policy %r' % policy)
+        self.size = size
+        self.policy = policy
+        self.max_length = max_length
+        self._values = {}
+
+    def __len__(self):
+        return sum(len(values) for values in self._values.values())
+
+    def values(self, encoding):
+        """Returns mapping of cached values for the `encoding`."""
+        values = self._values.get(encoding)
+        if values is None:
+            if self.policy == 'lru':
+                values = LRUCache(self.size)
+            else:
+                values = {}
+            values = self._values.setdefault(encoding, values)
+        return values
+
+    def add(self, values, item, encoding):
+        """Decodes `item` and puts it into `values` mapping returned by
+        :meth:`values` for the same `encoding`."""
+        value = item.decode(encoding)
+        if self.policy == 'clear' and len(values) >= self.size:
+            values.clear()
+        values[item] = value
+        return value
+
+    def decode(self, item, encoding):
+        """Returns decoded `item`, cached one if possible.
+
+        :param item: Raw value.
+        :type item: bytes
+
+        :param encoding: Data encoding.
+        :type encoding: str
+        """
+        if len(item) > self.max_length:
+            return item.decode(encoding)
+        values = self.values(encoding)
+        value = values.get(item)
+        if value is None:
+            value = self.add(values, item, encoding)
+        return value
+
+    def clear(self):
+        """Drops all cached values."""
+        self._values.clear()
+
+
+_intern_cache = None
+
+
+def set_intern_cache(cache):
+    """Installs :class:`InternCache` to be used by records decoders.
+    :const:`None` value disables caching, which is the default.
+
+    :return: Previously installed cache.
+    """
+    global _intern_cache
+    previous, _intern_cache = _intern_cache, cache
+    return previous
+
+
+def get_intern_cache():
+    """Returns installed :class:`InternCache` or :const:`None`."""
+    return _intern_cache
+
+
 def decode_component(field, encoding):
     """Decodes ASTM field component."""
+    if _intern_cache is not None:
+        decode = _intern_cache.decode
+        return [decode(item, encoding) if item else None
+                for item in field.split(COMPONENT_SEP)]
     return [[None, item.decode(encoding)][bool(item)]
             for item in field.split(COMPONENT_SEP)]
 
@@ -209,6 +514,65 @@ def encode_message(seq, records, encoding):
     return b''.join([STX, data, make_checksum(data), CR, LF])
 
 
+def encode_into(buf, records, encoding=ENCODING, seq=1, size=None):
+    """Encodes records into ASTM message and appends it to `buf`. The result
+    is the same as :func:`encode` produces, but it's written to caller's
+    buffer instead of new bytes objects: records are joined once and the
+    frames are written around them, while their checksums are computed over
+    the written data as it goes. So the same buffer could be reused for
+    many messages and frames could be sent from it without copying::
+
+        buf = bytearray()
+        for start, stop in encode_into(buf, records, size=247):
+            sock.sendall(memoryview(buf)[start:stop])
+
+    :param buf: Output buffer.
+    :type buf: bytearray
+
+    :param records: List of ASTM records.
+    :type records: list
+
+    :param encoding: Data encoding.
+    :type encoding: str
+
+    :param seq: Frame start sequence number.
+    :type seq: int
+
+    :param size: Chunk size in bytes. If message is greater it's written as
+                 several chunks, each one as separate frame.
+    :type size: int
+
+    :return: List of written frames as ``(start, stop)`` offsets in `buf`.
+    :rtype: list
+    """
+    assert size is None or size > 7
+    encoded = [encode_record(record, encoding) for record in records]
+    # trailing empty item puts CR after the last record
+    encoded.append(b'')
+    data = RECORD_SEP.join(encoded) if records else CR
+    length = len(data)
+    if size is None or length + 7 <= size:
+        start = len(buf)
+        head = SEQUENCE_TABLE[seq % 8]
+        buf += head
+        buf += data
+        buf += ETX_TAILS[(ord(head[1:2]) + sum_bytes(data)) & 0xFF]
+        return [(start, len(buf))]
+    step = size - 7
+    view = memoryview(data)
+    frames = []
+    for idx, offset in enumerate(range(0, length, step)):
+        chunk = view[offset:offset + step]
+        head = SEQUENCE_TABLE[(seq + idx) % 8]
+        tails = ETB_TAILS if offset + step < length else ETX_TAILS
+        start = len(buf)
+        buf += head
+        buf += chunk
+        buf += tails[(ord(head[1:2]) + sum_bytes(chunk)) & 0xFF]
+        frames.append((start, len(buf)))
+    return frames
+
+
 def encode_record(record, encoding):
     """Encodes single ASTM record.
 
@@ -273,46 +637,99 @@ def make_checksum(message):
     :returns: Checksum value that is actually byte sized integer in hex base
     :rtype: bytes
     """
-    if not isinstance(message[0], int):
-        message = map(ord, message)
-    return hex(sum(message) & 0xFF)[2:].upper().zfill(2).encode()
+    if isinstance(message, unicode):
+        value = sum(map(ord, message))
+    else:
+        value = sum_bytes(message)
+    return CHECKSUM_TABLE[value & 0xFF]
+
+
+def verify_checksum(message):
+    """Verifies checksum of complete ASTM message. Message frame is accessed
+    through :class:`memoryview` so no data copy happens.
+
+    :param message: ASTM message.
+    :type message: bytes, bytearray or memoryview
+
+    :returns: :const:`True` if checksum is valid.
+    :rtype: bool
+    """
+    view = memoryview(message)
+    cs = view[-4:-2].tobytes()
+    return CHECKSUM_TABLE[sum_bytes(view[1:-4]) & 0xFF] == cs
+
+
+def sum_bytes(data):
+    """Returns sum of all `data` bytes.
+
+    The sum is calculated by :func:`zlib.adler32` for blocks of 256 bytes: for
+    such small block adler32's first part is the exact sum of his bytes plus
+    one. This avoids iterating over each byte within Python code.
+
+    :param data: Data to sum.
+    :type data: bytes, bytearray or memoryview
+
+    :rtype: int
+    """
+    if adler32 is None:
+        return sum(bytearray(data))
+    size = len(data)
+    blocks = _adler32_blocks(data, size)
+    return (sum([adler32(block) & 0xFFFF for block in blocks])
+            - len(blocks))
 
 
 def make_chunks(s, n):
-    iter_bytes = (s[i:i + 1] for i in range(len(s)))
-    return [b''.join(item)
-            for item in izip_longest(*[iter_bytes] * n, fillvalue=b'')]
+    return [s[i:i + n] for i in range(0, len(s), n)]
 
 
-def split(msg, size):
+def split(msg, size, buffer=None):
     """Split `msg` into chunks with specified `size`.
 
-    Chunk `size` value couldn't be less then 7 since each chunk goes with at
+    Chunk `size` value should be greater than 7 since each chunk goes with at
     least 7 special characters: STX, frame number, ETX or ETB, checksum and
     message terminator.
 
+    Chunks data is sliced directly from `msg`. If `buffer` is specified each
+    chunk is written into it and :class:`memoryview` of written data is yielded
+    instead of new bytes object, so the same memory is reused for all chunks.
+    In this case yielded chunk remains valid only till the next one.
+
     :param msg: ASTM message.
     :type msg: bytes
 
     :param size: Chunk size in bytes.
     :type size: int
 
-    :yield: `bytes`
+    :param buffer: Output buffer with at least `size` bytes length.
+    :type buffer: bytearray or memoryview
+
+    :yield: `bytes` or `memoryview` if `buffer` is specified.
     """
-    stx, frame, msg, tail = msg[:1], msg[1:2], msg[2:-6], msg[-6:]
-    assert stx == STX
-    assert frame.isdigit()
-    assert tail.endswith(CRLF)
-    assert size is not None and size >= 7
-    frame = int(frame)
-    chunks = make_chunks(msg, size - 7)
-    chunks, last = chunks[:-1], chunks[-1]
-    idx = 0
-    for idx, chunk in enumerate(chunks):
-        item = b''.join([str((idx + frame) % 8).encode(), chunk, ETB])
-        yield b''.join([STX, item, make_checksum(item), CRLF])
-    item = b''.join([str((idx + frame + 1) % 8).encode(), last, CR, ETX])
-    yield b''.join([STX, item, make_checksum(item), CRLF])
+    assert msg[:1] == STX
+    assert msg[1:2].isdigit()
+    assert msg[-2:] == CRLF
+    assert size is not None and size > 7
+    frame = int(msg[1:2])
+    step = size - 7
+    # data to split includes trailing CR of the last record
+    start, stop = 2, len(msg) - 5
+    if buffer is not None:
+        out = memoryview(buffer)
+        msg = memoryview(msg)
+    for idx, offset in enumerate(range(start, stop, step)):
+        chunk = msg[offset:min(offset + step, stop)]
+        seq = str((idx + frame) % 8).encode()
+        tail = ETB if offset + step < stop else ETX
+        cs = CHECKSUM_TABLE[(ord(seq) + sum_bytes(chunk) + ord(tail)) & 0xFF]
+        if buffer is None:
+            yield b''.join([STX, seq, chunk, tail, cs, CRLF])
+            continue
+        end = len(chunk) + 2
+        out[:2] = STX + seq
+        out[2:end] = chunk
+        out[end:end + 5] = tail + cs + CRLF
+        yield out[:end + 5]
 
 
 def join(chunks):
@@ -333,3 +750,245 @@ def is_chunked_message(message):
     if ETB not in message:
         return False
     return message.index(ETB) == length - 5
+
+
+class FrameParser(object):
+    """Incremental parser of ASTM data stream.
+
+    Received data chunks of any size are :meth:`fed <feed>` to the parser which
+    accumulates them within internal buffer. Iteration over the parser yields
+    complete tokens in order of their arrival:
+
+    * control characters: ENQ, ACK, NAK and EOT;
+    * ASTM messages started with STX and ended with CRLF. Message that was
+      interrupted by EOT is yielded as is, without trailing CRLF;
+    * any other data as is till the next known token start.
+
+    Each byte of incoming data is scanned only once, so fragmented input
+    doesn't lead to quadratic processing time::
+
+        parser = FrameParser()
+        for chunk in chunks:
+            for token in parser.feed(chunk):
+                handle(token)
+    """
+
+    #: Single byte control tokens.
+    control_tokens = frozenset([ENQ, ACK, NAK, EOT])
+
+    def __init__(self):
+        self._buffer = bytearray()
+        # position of the next token start
+        self._pos = 0
+        # position within message which has been already scanned for his end
+        self._scanned = 0
+
+    def __iter__(self):
+        return self
+
+    def __len__(self):
+        return len(self._buffer) - self._pos
+
+    def next(self):
+        """Returns next complete token."""
+        token = self._pop_token()
+        if token is None:
+            raise StopIteration
+        return token
+
+    __next__ = next
+
+    def feed(self, data):
+        """Puts received `data` to the parser buffer.
+
+        :param data: Received data chunk.
+        :type data: bytes
+
+        :return: The parser itself to iterate over complete tokens.
+        """
+        if self._pos:
+            del self._buffer[:self._pos]
+            self._scanned -= self._pos
+            self._pos = 0
+        self._buffer.extend(data)
+        return self
+
+    def clear(self):
+        """Discards all buffered data."""
+        del self._buffer[:]
+        self._pos = self._scanned = 0
+
+    def _pop_token(self):
+        buf, pos = self._buffer, self._pos
+        size = len(buf)
+        if pos >= size:
+            return None
+        head = bytes(buf[pos:pos + 1])
+        if head == STX:
+            start = max(self._scanned, pos + 1)
+            end = buf.find(CRLF, start)
+            eot = buf.find(EOT, start, size if end == -1 else end)
+            if eot != -1:
+                end = eot
+            elif end != -1:
+                end += len(CRLF)
+            else:
+                # CRLF may be split between received chunks
+                self._scanned = max(size - 1, pos + 1)
+                return None
+        elif head in self.control_tokens:
+            end = pos + 1
+        else:
+            match = RE_TOKEN_START.search(buf, pos + 1)
+            end = size if match is None else match.start()
+        self._pos = self._scanned = end
+        return bytes(buf[pos:end])
+
+
+def iter_decode_stream(source, encoding=ENCODING, engine='default',
+                       chunk_size=65536, skip_invalid=False):
+    """Decodes messages of ASTM data stream stored in file, like captured
+    communication transcript, without loading it into memory. Messages are
+    read by :func:`iter_stream_messages`::
+
+        for seq, records in iter_decode_stream('/var/log/astm/capture.bin'):
+            handle(records)
+
+    :param source: File path or binary file object.
+    :type source: str or file
+
+    :param encoding: Data encoding.
+    :type encoding: str
+
+    :param engine: Records decoder engine. See :func:`decode_record`.
+    :type engine: str
+
+    :param chunk_size: Number of bytes processed at once.
+    :type chunk_size: int
+
+    :param skip_invalid: Skip messages with wrong checksum or malformed frame
+                         instead of raising :exc:`ValueError`. Useful for
+                         transcripts with retransmitted messages.
+    :type skip_invalid: bool
+
+    :yield: Tuple of frame sequence number of the message first chunk and
+            list of records.
+    """
+    for seq, message in iter_stream_messages(source, chunk_size,
+                                             skip_invalid):
+        try:
+            records = decode_frame(message[1:-4], encoding, engine)[1]
+        except ValueError:
+            if skip_invalid:
+                log.warning('Malformed message, skipping %r', message)
+                continue
+            raise
+        yield seq, records
+
+
+def iter_stream_messages(source, chunk_size=65536, skip_invalid=False):
+    """Reads complete ASTM messages from data stream stored in file.
+
+    File is read through :mod:`mmap` if possible or by chunks otherwise and
+    passed to :class:`FrameParser`. Checksum of each message is verified,
+    chunked messages are merged as :func:`join` does. Chunks that were
+    interrupted by EOT are dropped.
+
+    Frame is accepted by following ACK, frame or EOT. Frame rejected by NAK
+    is replaced by its retransmission with the same frame number and is
+    dropped otherwise, so retransmitted frames don't get yielded twice.
+    Other control tokens and data between messages are skipped.
+
+    :param source: File path or binary file object.
+    :type source: str or file
+
+    :param chunk_size: Number of bytes processed at once.
+    :type chunk_size: int
+
+    :param skip_invalid: Skip messages with wrong checksum or frame number
+                         instead of raising :exc:`ValueError`.
+    :type skip_invalid: bool
+
+    :yield: Tuple of frame sequence number of the message first chunk and
+            the message.
+    """
+    if hasattr(source, 'read'):
+        fileobj, close = source, False
+    else:
+        fileobj, close = open(source, 'rb'), True
+    parser = FrameParser()
+    chunks = []
+    # frame is held until it's accepted, since frame rejected by NAK is
+    # retransmitted with the same frame number
+    frame, rejected = None, False
+    try:
+        for data in _iter_file_chunks(fileobj, chunk_size):
+            for token in parser.feed(data):
+                is_frame = token.startswith(STX) and token.endswith(CRLF)
+                if is_frame:
+                    if (not verify_checksum(token)
+                            or not token[1:2].isdigit()):
+                        if skip_invalid:
+                            log.warning('Invalid message, skipping %r', token)
+                            continue
+                        raise ValueError('Invalid message: %r' % token)
+                    if rejected and token[1:2] == frame[1:2]:
+                        frame, rejected = token, False
+                        continue
+                elif token == NAK:
+                    rejected = frame is not None
+                    continue
+                elif token not in (ACK, EOT) and not token.startswith(STX):
+                    continue
+                if frame is not None and not rejected:
+                    item = _accept_frame(frame, chunks)
+                    if item is not None:
+                        yield item
+                frame, rejected = None, False
+                if is_frame:
+                    frame = token
+                elif token != ACK:  # EOT or frame interrupted by it
+                    del chunks[:]
+        if frame is not None and not rejected:
+            item = _accept_frame(frame, chunks)
+            if item is not None:
+                yield item
+    finally:
+        if close:
+            fileobj.close()
+
+
+def _accept_frame(frame, chunks):
+    # returns sequence number and the message once its last frame comes
+    if is_chunked_message(frame):
+        chunks.append(frame)
+        return None
+    seq = int((chunks[0] if chunks else frame)[1:2])
+    if chunks:
+        chunks.append(frame)
+        frame = join(chunks)
+        del chunks[:]
+    return seq, frame
+
+
+def _iter_file_chunks(fileobj, chunk_size):
+    view = None
+    if mmap is not None:
+        try:
+            view = mmap.mmap(fileobj.fileno(), 0, access=mmap.ACCESS_READ)
+        except (AttributeError, EnvironmentError, ValueError):
+            # not a regular file or it's empty
+            pass
+    if view is None:
+        while True:
+            data = fileobj.read(chunk_size)
+            if not data:
+                return
+            yield data
+    try:
+        if hasattr(view, 'madvise'):
+            view.madvise(mmap.MADV_SEQUENTIAL)
+        for offset in range(fileobj.tell(), len(view), chunk_size):
+            yield view[offset:offset + chunk_size]
+    finally:
+        view.close()
@@ -0,0 +1,205 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+import logging
+import os
+from zlib import crc32
+from .asynclib import call_later
+
+log = logging.getLogger(__name__)
+
+__all__ = ['Journal']
+
+#: Size of entry header: hex encoded data length and checksum.
+HEADER_SIZE = 18
+
+
+class Journal(object):
+    """Append-only journal of received messages which makes them durable
+    before they get ACKed by :class:`~astm.server.RequestHandler`.
+
+    Messages are written to the file as they come, before they are
+    dispatched, while :func:`os.fsync` call is done once per `commit_window`
+    seconds for all messages appended within this time frame by all
+    connections (group commit). Callbacks passed to :meth:`append` and
+    :meth:`sync` are called after that, so the sender receives ACK only when
+    the message is stored on disk.
+
+    Stored messages could be passed to the dispatcher again by :meth:`replay`
+    after restart, so dispatchers should tolerate messages they have already
+    handled. The application should call :meth:`checkpoint` once all
+    dispatched and replayed messages are persisted by their handlers,
+    otherwise they are replayed again. Journal couldn't be shared by
+    processes, since checkpoint of one would drop messages of the others.
+
+    Each entry is stored as ``LLLLLLLL CCCCCCCC\\n<message>\\n`` where `L` and
+    `C` are hex encoded length and CRC32 checksum of the message. Partially
+    written entries at the end of the journal are dropped on opening.
+
+    :param path: Journal file path.
+    :type path: str
+
+    :param commit_window: Seconds to wait for other messages before commit.
+                          Zero value forces commit on each message.
+    :type commit_window: float
+
+    :param max_batch: Number of pending messages that forces commit without
+                      waiting for window end.
+    :type max_batch: int
+    """
+    def __init__(self, path, commit_window=0.005, max_batch=256):
+        self.path = path
+        self.commit_window = commit_window
+        self.max_batch = max_batch
+        self._pending = []
+        self._timer = None
+        # number of messages appended since last commit
+        self._batch = 0
+        self._dirty = False
+        # unbuffered, so each entry is written by single append call
+        self._file = open(path, 'a+b', 0)
+        self._recover()
+
+    def __iter__(self):
+        """Iterates over stored messages."""
+        for offset, message in self._entries():
+            yield message
+
+    def __len__(self):
+        return sum(1 for _ in self._entries())
+
+    def _entries(self):
+        self._file.seek(0)
+        offset = 0
+        try:
+            while True:
+                header = self._file.read(HEADER_SIZE)
+                if len(header) < HEADER_SIZE:
+                    break
+                try:
+                    size, checksum = [int(item, 16)
+                                      for item in header.split()]
+                except ValueError:
+                    break
+                data = self._file.read(size + 1)
+                if (len(data) != size + 1 or data[-1:] != b'\n'
+                        or crc32(data[:-1]) & 0xFFFFFFFF != checksum):
+                    break
+                offset += HEADER_SIZE + size + 1
+                yield offset, data[:-1]
+        finally:
+            self._file.seek(0, os.SEEK_END)
+
+    def _recover(self):
+        valid_size = 0
+        for valid_size, message in self._entries():
+            pass
+        size = self._file.tell()
+        if size != valid_size:
+            log.warning('Dropping %d bytes of broken journal tail of %s',
+                        size - valid_size, self.path)
+            self._file.truncate(valid_size)
+            self._file.seek(0, os.SEEK_END)
+
+    def append(self, message, callback=None):
+        """Appends the message to the journal. The `callback` is called with
+        single boolean argument after commit: :const:`True` if message was
+        stored successfully and :const:`False` otherwise.
+
+        :param message: ASTM message.
+        :type message: bytes
+
+        :param callback: Commit callback.
+        :type callback: callable
+
+        :return: :const:`True` if message was written to the file.
+        :rtype: bool
+        """
+        header = '%08X %08X\n' % (len(message), crc32(message) & 0xFFFFFFFF)
+        try:
+            self._file.write(header.encode('ascii') + message + b'\n')
+        except (IOError, OSError):
+            log.exception('Unable to write message to journal %s', self.path)
+            if callback is not None:
+                callback(False)
+            return False
+        self._dirty = True
+        self._batch += 1
+        self._pending.append(callback)
+        self._schedule()
+        return True
+
+    def sync(self, callback):
+        """Calls `callback` once all appended messages are committed. It
+        receives the same argument as :meth:`append` callback does.
+
+        :param callback: Commit callback.
+        :type callback: callable
+        """
+        if not self._dirty:
+            callback(True)
+            return
+        self._pending.append(callback)
+        self._schedule()
+
+    def _schedule(self):
+        if not self.commit_window or self._batch >= self.max_batch:
+            self.commit()
+        elif self._timer is None:
+            self._timer = call_later(self.commit_window, self.commit)
+
+    def commit(self):
+        """Flushes appended messages to disk and calls their callbacks."""
+        if self._timer is not None:
+            if not self._timer.cancelled:
+                self._timer.cancel()
+            self._timer = None
+        pending, self._pending = self._pending, []
+        self._batch = 0
+        if not self._dirty:
+            ok = True
+        else:
+            try:
+                self._file.flush()
+                os.fsync(self._file.fileno())
+            except (IOError, OSError):
+                log.exception('Unable to commit journal %s', self.path)
+                ok = False
+            else:
+                ok, self._dirty = True, False
+        for callback in pending:
+            if callback is not None:
+                callback(ok)
+
+    def replay(self, dispatcher):
+        """Passes stored messages to the `dispatcher`.
+
+        :param dispatcher: Records dispatcher.
+        :type dispatcher: :class:`~astm.server.BaseRecordsDispatcher`
+
+        :return: Number of replayed messages.
+        :rtype: int
+        """
+        count = 0
+        for message in self:
+            dispatcher(message)
+            count += 1
+        return count
+
+    def checkpoint(self):
+        """Commits pending messages and clears the journal."""
+        self.commit()
+        self._file.truncate(0)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+
+    def close(self):
+        """Commits pending messages and closes the journal file."""
+        self.commit()
+        self._file.close()
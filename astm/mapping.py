@@ -7,6 +7,7 @@
 # you should have received as part of this distribution.
 #
 
+import copy
 import datetime
 import decimal
 import inspect
@@ -19,6 +20,18 @@ try:
 except ImportError: # Python 3
     from itertools import zip_longest as izip_longest
     from .compat import basestring, unicode, long
+from .cache import LRUCache
+from .codec import decode_record, encode_component
+from .constants import COMPONENT_SEP, ENCODING, FIELD_SEP, REPEAT_SEP
+
+
+#: Cache of parsed date and time values shared by all date and time fields.
+#: Parsed values are immutable, so they are safe to share between records.
+datetime_cache = LRUCache(1024)
+
+DATE_FORMAT = '%Y%m%d'
+TIME_FORMAT = '%H%M%S'
+DATETIME_FORMAT = '%Y%m%d%H%M%S'
 
 
 def make_string(value):
@@ -30,31 +43,137 @@ def make_string(value):
         return unicode(value)
 
 
+def parse_datetime(value, format=DATETIME_FORMAT):
+    """Parses string `value` into :class:`datetime.datetime` object.
+
+    Values of fixed width ASTM formats are parsed by hand, while any others
+    are passed to :meth:`~datetime.datetime.strptime`. Results are cached
+    within :data:`datetime_cache`.
+    """
+    key = (format, value)
+    result = datetime_cache.get(key)
+    if result is None:
+        size = len(value)
+        if format == DATETIME_FORMAT and size == 14 and value.isdigit():
+            result = datetime.datetime(int(value[:4]), int(value[4:6]),
+                                       int(value[6:8]), int(value[8:10]),
+                                       int(value[10:12]), int(value[12:]))
+        elif format == DATE_FORMAT and size == 8 and value.isdigit():
+            result = datetime.datetime(int(value[:4]), int(value[4:6]),
+                                       int(value[6:]))
+        else:
+            result = datetime.datetime.strptime(value, format)
+        datetime_cache[key] = result
+    return result
+
+
+def parse_time(value, format=TIME_FORMAT):
+    """Parses string `value` into :class:`datetime.time` object. Fraction of
+    seconds is ignored. Results are cached within :data:`datetime_cache`.
+    """
+    key = (format, value)
+    result = datetime_cache.get(key)
+    if result is None:
+        timestr = value.split('.', 1)[0] # strip out microseconds
+        if format == TIME_FORMAT and len(timestr) == 6 and timestr.isdigit():
+            result = datetime.time(int(timestr[:2]), int(timestr[2:4]),
+                                   int(timestr[4:]))
+        else:
+            result = datetime.time(*time.strptime(timestr, format)[3:6])
+        datetime_cache[key] = result
+    return result
+
+
+def format_datetime(value, format):
+    """Formats date or time `value` by `format` string. Fixed width ASTM
+    formats are handled without :meth:`~datetime.datetime.strftime` call.
+    """
+    if format == DATETIME_FORMAT:
+        if isinstance(value, datetime.datetime) and value.year >= 1000:
+            return '%04d%02d%02d%02d%02d%02d' % (
+                value.year, value.month, value.day,
+                value.hour, value.minute, value.second)
+    elif format == DATE_FORMAT:
+        if value.year >= 1000:
+            return '%04d%02d%02d' % (value.year, value.month, value.day)
+    elif format == TIME_FORMAT:
+        return '%02d%02d%02d' % (value.hour, value.minute, value.second)
+    return value.strftime(format)
+
+
 class Field(object):
-    """Base mapping field class."""
-    def __init__(self, name=None, default=None, required=False, length=None):
+    """Base mapping field class.
+
+    :param memoize: Keeps value, returned by :meth:`_get_value`, within
+                    mapping instance after first access until field would be
+                    changed. Makes sense for fields with expensive value
+                    conversion that are read many times.
+    :type memoize: bool
+    """
+    #: Default memoization flag for field instances.
+    memoize = False
+    #: Index of field value within :class:`CompactStorage` or :const:`None`
+    #: for dict storage. Assigned by mapping class the field belongs to.
+    slot = None
+    _bound = False
+
+    def __init__(self, name=None, default=None, required=False, length=None,
+                 memoize=None):
         self.name = name
         self.default = default
         self.required = required
         self.length = length
+        if memoize is not None:
+            self.memoize = memoize
 
     def __get__(self, instance, owner):
         if instance is None:
             return self
-        value = instance._data.get(self.name)
+        if self.memoize:
+            return self._get_memoized(instance)
+        if self.slot is None:
+            value = instance._data.get(self.name)
+        else:
+            value = instance._data[self.slot]
         if value is not None:
             value = self._get_value(value)
         elif self.default is not None:
-            default = self.default
-            if hasattr(default, '__call__'):
-                default = default()
-            value = default
+            value = self._get_default()
         return value
 
     def __set__(self, instance, value):
         if value is not None:
             value = self._set_value(value)
-        instance._data[self.name] = value
+        if self.slot is None:
+            instance._data[self.name] = value
+        else:
+            instance._data[self.slot] = value
+        if self.memoize:
+            instance._forget(self.name)
+
+    def _get_memoized(self, instance):
+        try:
+            cache = instance._cache
+        except AttributeError:
+            cache = instance._cache = {}
+        try:
+            return cache[self.name]
+        except KeyError:
+            pass
+        if self.slot is None:
+            value = instance._data.get(self.name)
+        else:
+            value = instance._data[self.slot]
+        if value is None:
+            return self._get_default()
+        value = cache[self.name] = self._get_value(value)
+        return value
+
+    def _get_default(self):
+        default = self.default
+        if hasattr(default, '__call__'):
+            default = default()
+        return default
 
     def _get_value(self, value):
         return value
@@ -67,9 +186,54 @@ class Field(object):
         return value
 
 
+class CompactStorage(list):
+    """Storage of field values for :attr:`compact <Mapping.compact>`
+    mappings. Values are stored in order of mapping fields and accessed by
+    field :attr:`~Field.slot` index."""
+    __slots__ = ()
+
+
+class LazyStorage(dict):
+    """Storage of field values for mappings created from
+    :class:`~astm.codec.LazyRecord` by :meth:`Record.from_lazy`. Field value
+    is decoded from the record and validated only on first access."""
+    __slots__ = ('record', 'fields')
+
+    def __init__(self, record, fields):
+        super(LazyStorage, self).__init__()
+        #: Source :class:`~astm.codec.LazyRecord` instance.
+        self.record = record
+        #: Field name to index and setter mapping.
+        self.fields = fields
+
+    def __missing__(self, key):
+        index, (set_value, default, is_callable) = self.fields[key]
+        value = self.record[index] if index < len(self.record) else None
+        if value is None:
+            value = default() if is_callable else default
+        if value is not None:
+            value = set_value(value)
+        self[key] = value
+        return value
+
+    def __len__(self):
+        return len(self.fields)
+
+    def __reduce__(self):
+        return dict, (dict((key, self[key]) for key in self.fields),)
+
+    def get(self, key, default=None):
+        if key not in self.fields:
+            return default
+        return self[key]
+
+
 class MetaMapping(type):
 
     def __new__(mcs, name, bases, d):
+        if d.get('compact', any(getattr(base, 'compact', False)
+                                for base in bases)):
+            d.setdefault('__slots__', ())
         fields = []
         names = []
         def merge_fields(items):
@@ -90,18 +254,46 @@ class MetaMapping(type):
         else:
             merge_fields(d['_fields'])
             d['_fields'] = fields
-        return super(MetaMapping, mcs).__new__(mcs, name, bases, d)
-
-
-_MappingProxy = MetaMapping('_MappingProxy', (object,), {}) # Python 3 workaround
+        cls = super(MetaMapping, mcs).__new__(mcs, name, bases, d)
+        _bind_fields(cls)
+        return cls
+
+
+def _bind_fields(cls):
+    """Assigns storage slots to `cls` fields. Field that is already bound to
+    another slot is copied, so each mapping class has own descriptors."""
+    compact = getattr(cls, 'compact', False)
+    fields = cls._fields
+    for idx, (name, field) in enumerate(fields):
+        slot = idx if compact else None
+        if not field._bound:
+            field.slot = slot
+            field._bound = True
+        elif field.slot != slot:
+            field = copy.copy(field)
+            field.slot = slot
+            setattr(cls, name, field)
+            fields[idx] = (name, field)
+
+
+_MappingProxy = MetaMapping('_MappingProxy', (object,),
+                            {'__slots__': ()}) # Python 3 workaround
 
 class Mapping(_MappingProxy):
+    __slots__ = ('_data', '_cache')
+
+    #: Compact mode flag. Instances of compact mappings have no `__dict__` and
+    #: keep field values within :class:`CompactStorage` list instead of dict,
+    #: that noticeable reduces memory usage by large amount of records.
+    #: Compact mode is inherited by subclasses, but it has full effect only if
+    #: all base mappings either compact or define their `__slots__`.
+    compact = False
 
     def __init__(self, *args, **kwargs):
         fieldnames = map(itemgetter(0), self._fields)
         values = dict(izip_longest(fieldnames, args))
         values.update(kwargs)
-        self._data = {}
+        self._data = self._make_storage()
         for attrname, field in self._fields:
             attrval = values.pop(attrname, None)
             if attrval is None:
@@ -121,8 +313,41 @@ class Mapping(_MappingProxy):
             setattr(newcls, field.name, field)
             fields.append((field.name, field))
         newcls._fields = fields
+        _bind_fields(newcls)
         return newcls
 
+    def __getstate__(self):
+        return dict(zip(self.keys(), self._raw_values()))
+
+    def __setstate__(self, state):
+        self._data = self._make_storage([state.get(key)
+                                         for key in self.keys()])
+
+    def _raw_values(self):
+        """Returns stored field values in fields order."""
+        data = self._data
+        if isinstance(data, CompactStorage):
+            return data
+        return [data[key] for key, field in self._fields]
+
+    def _forget(self, name):
+        """Drops memoized value of field `name`, if any."""
+        cache = getattr(self, '_cache', None)
+        if cache:
+            cache.pop(name, None)
+
+    @classmethod
+    def _make_storage(cls, values=None):
+        """Returns new storage for field values, optionally filled by `values`
+        listed in fields order."""
+        if not cls.compact:
+            if values is None:
+                return {}
+            return dict(zip([key for key, field in cls._fields], values))
+        if values is None:
+            values = [None] * len(cls._fields)
+        return CompactStorage(values)
+
     def __getitem__(self, key):
         return self.values()[key]
 
@@ -130,7 +355,12 @@ class Mapping(_MappingProxy):
         setattr(self, self._fields[key][0], value)
 
     def __delitem__(self, key):
-        self._data[self._fields[key][0]] = None
+        name = self._fields[key][0]
+        if isinstance(self._data, CompactStorage):
+            self._data[key] = None
+        else:
+            self._data[name] = None
+        self._forget(name)
 
     def __iter__(self):
         return iter(self.values())
@@ -168,8 +398,7 @@ class Mapping(_MappingProxy):
 
     def to_astm(self):
         def values(obj):
-            for key, field in obj._fields:
-                value = obj._data[key]
+            for (key, field), value in zip(obj._fields, obj._raw_values()):
                 if isinstance(value, Mapping):
                     yield list(values(value))
                 elif isinstance(value, list):
@@ -186,13 +415,77 @@ class Mapping(_MappingProxy):
                     yield value
         return list(values(self))
 
+    @classmethod
+    def _compiled(cls):
+        """Returns decoder and encoder functions compiled for the mapping
+        fields. Both are cached on the mapping class, so it shouldn't change
+        his fields after first usage."""
+        compiled = cls.__dict__.get('_compiled_codec')
+        if compiled is None:
+            compiled = compile_decoder(cls), compile_encoder(cls)
+            cls._compiled_codec = compiled
+        return compiled
+
 
 class Record(Mapping):
     """ASTM record mapping class."""
+    __slots__ = ()
+
+    @classmethod
+    def from_bytes(cls, data, encoding=ENCODING):
+        """Decodes raw ASTM record directly into mapping instance using
+        decoder compiled for the record fields.
+
+        :param data: ASTM record.
+        :type data: bytes
+
+        :param encoding: Data encoding.
+        :type encoding: str
+        """
+        return cls._compiled()[0](decode_record(data, encoding, 'fast'))
+
+    @classmethod
+    def from_lazy(cls, record):
+        """Wraps :class:`~astm.codec.LazyRecord` without decoding all its
+        fields: each field is decoded and validated on first access, so
+        invalid value raises an error only when the field is read.
+
+        For :attr:`compact <Mapping.compact>` records all fields are decoded
+        at once since compact storage has no room for undecoded values.
+
+        :param record: Lazy record.
+        :type record: :class:`~astm.codec.LazyRecord`
+        """
+        if cls.compact:
+            return cls._compiled()[0](list(record))
+        fields = cls.__dict__.get('_lazy_fields')
+        if fields is None:
+            fields = dict((name, (index, setter)) for index, (name, setter)
+                          in enumerate(_field_setters(cls)))
+            cls._lazy_fields = fields
+        if len(record) > len(fields):
+            raise ValueError('Unexpected values found: %r'
+                             '' % record[len(fields):])
+        obj = object.__new__(cls)
+        obj._data = LazyStorage(record, fields)
+        return obj
+
+    def to_bytes(self, encoding=ENCODING):
+        """Encodes record directly to ASTM record bytes using encoder compiled
+        for the record fields. Produces the same result as
+        :func:`~astm.codec.encode_record` for :meth:`to_astm` output.
+
+        :param encoding: Data encoding.
+        :type encoding: str
+
+        :rtype: bytes
+        """
+        return self._compiled()[1](self, encoding)
 
 
 class Component(Mapping):
     """ASTM component mapping class."""
+    __slots__ = ()
 
 
 class TextField(Field):
@@ -261,26 +554,25 @@ class DecimalField(Field):
 
 class DateField(Field):
     """Mapping field for storing date/time values."""
-    format = '%Y%m%d'
+    format = DATE_FORMAT
     def _get_value(self, value):
-        return datetime.datetime.strptime(value, self.format)
+        return parse_datetime(value, self.format)
 
     def _set_value(self, value):
         if isinstance(value, basestring):
             value = self._get_value(value)
         if not isinstance(value, (datetime.datetime, datetime.date)):
             raise TypeError('Datetime value expected, got %r' % value)
-        return value.strftime(self.format)
+        return format_datetime(value, self.format)
 
 
 class TimeField(Field):
     """Mapping field for storing times."""
-    format = '%H%M%S'
+    format = TIME_FORMAT
     def _get_value(self, value):
         if isinstance(value, basestring):
             try:
-                value = value.split('.', 1)[0] # strip out microseconds
-                value = datetime.time(*time.strptime(value, self.format)[3:6])
+                value = parse_time(value, self.format)
             except ValueError:
                 raise ValueError('Value %r does not match format %s'
                                  '' % (value, self.format))
@@ -293,21 +585,21 @@ class TimeField(Field):
             raise TypeError('Datetime value expected, got %r' % value)
         if isinstance(value, datetime.datetime):
             value = value.time()
-        return value.replace(microsecond=0).strftime(self.format)
+        return format_datetime(value.replace(microsecond=0), self.format)
 
 
 class DateTimeField(Field):
     """Mapping field for storing date/time values."""
-    format = '%Y%m%d%H%M%S'
+    format = DATETIME_FORMAT
     def _get_value(self, value):
-        return datetime.datetime.strptime(value, self.format)
+        return parse_datetime(value, self.format)
 
     def _set_value(self, value):
         if isinstance(value, basestring):
             value = self._get_value(value)
         if not isinstance(value, (datetime.datetime, datetime.date)):
             raise TypeError('Datetime value expected, got %r' % value)
-        return value.strftime(self.format)
+        return format_datetime(value, self.format)
 
 
 class SetField(Field):
@@ -521,3 +813,123 @@ class NotUsedField(Field):
         warnings.warn('Field %r is not used, any assignments are omitted'
                       '' % self.name, UserWarning)
         return None
+
+
+def compile_decoder(mapping):
+    """Compiles function that creates `mapping` instance from the list of
+    decoded field values. It does the same work as mapping constructor does,
+    but without fields descriptors and intermediate dict overhead."""
+    fields = [setter for name, setter in _field_setters(mapping)]
+    size = len(fields)
+
+    def decode(values):
+        if len(values) > size:
+            raise ValueError('Unexpected values found: %r' % values[size:])
+        data = []
+        for (set_value, default, is_callable), value in izip_longest(
+                fields, values):
+            if value is None:
+                value = default() if is_callable else default
+            if value is not None:
+                value = set_value(value)
+            data.append(value)
+        obj = object.__new__(mapping)
+        obj._data = mapping._make_storage(data)
+        return obj
+    return decode
+
+
+def _field_setters(mapping):
+    setters = []
+    for name, field in mapping._fields:
+        if isinstance(field, ComponentField):
+            set_value = _component_setter(field)
+        elif isinstance(field, RepeatedComponentField):
+            set_value = _repeated_component_setter(field)
+        else:
+            set_value = field._set_value
+        default = field.default
+        setters.append((name, (set_value, default,
+                               hasattr(default, '__call__'))))
+    return setters
+
+
+def _component_setter(field):
+    def set_value(value):
+        if isinstance(value, list):
+            return field.mapping._compiled()[0](value)
+        return field._set_value(value)
+    return set_value
+
+
+def _repeated_component_setter(field):
+    set_item = _component_setter(field.field)
+    def set_value(value):
+        return [set_item(item) for item in value]
+    return set_value
+
+
+def compile_encoder(mapping):
+    """Compiles function that encodes `mapping` instance into ASTM bytes.
+
+    For :class:`Record` mappings it produces the record, for others - the
+    field component. The result is the same as :func:`~astm.codec.encode_record`
+    produces for :meth:`Mapping.to_astm` output, but values are encoded
+    directly from the mapping data without building intermediate lists.
+    """
+    is_component = not issubclass(mapping, Record)
+    encoders = []
+    for name, field in mapping._fields:
+        if isinstance(field, ComponentField):
+            encoder = _encode_component
+        elif isinstance(field, RepeatedComponentField):
+            encoder = _encode_repeated_component
+        else:
+            encoder = _encode_value
+        if is_component and encoder is not _encode_value:
+            # nested components are encoded in a very special way
+            return _encode_value
+        encoders.append((name, field.required, encoder))
+    sep = COMPONENT_SEP if is_component else FIELD_SEP
+
+    def encode(obj, encoding):
+        items = []
+        for (name, required, encoder), value in zip(encoders,
+                                                    obj._raw_values()):
+            if value is not None:
+                items.append(encoder(value, encoding))
+            elif required:
+                raise ValueError('Field %r value should not be None' % name)
+            else:
+                items.append(b'')
+        if is_component:
+            return sep.join(items).rstrip(sep)
+        return sep.join(items)
+    return encode
+
+
+def _encode_value(value, encoding):
+    if isinstance(value, unicode):
+        return value.encode(encoding)
+    elif isinstance(value, bytes):
+        return value
+    elif isinstance(value, Mapping):
+        return encode_component(value.to_astm(), encoding)
+    elif isinstance(value, list):
+        return encode_component([item.to_astm()
+                                 if isinstance(item, Mapping) else item
+                                 for item in value], encoding)
+    return unicode(value).encode(encoding)
+
+
+def _encode_component(value, encoding):
+    if isinstance(value, Mapping):
+        return value._compiled()[1](value, encoding)
+    return _encode_value(value, encoding)
+
+
+def _encode_repeated_component(value, encoding):
+    if not all(isinstance(item, Mapping) for item in value):
+        return _encode_value(value, encoding)
+    return REPEAT_SEP.join(item._compiled()[1](item, encoding)
+                           for item in value)
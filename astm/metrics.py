@@ -0,0 +1,299 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+"""
+.. module:: astm.metrics
+   :synopsis: Counters and histograms of the protocol hot paths.
+
+Protocol, server, client and polling loop report their activity to the
+metrics of this module once they are :func:`enabled <enable>`::
+
+    from astm import metrics
+
+    metrics.enable()
+    server.serve_forever()
+    ...
+    print(metrics.to_prometheus())
+
+Metrics are disabled by default and instrumented code only checks the
+:data:`enabled` flag then. Each process has own metrics, so workers started
+by :meth:`~astm.server.Server.serve_workers` report them separately.
+"""
+
+from bisect import bisect_left
+from threading import Lock
+from timeit import default_timer as timer
+
+__all__ = ['Counter', 'Histogram', 'Registry', 'REGISTRY',
+           'enable', 'disable', 'reset', 'snapshot', 'to_prometheus']
+
+#: Flag that enables metrics collection. Use :func:`enable` and
+#: :func:`disable` to change it.
+enabled = False
+
+#: Default histogram buckets for durations in seconds, measured by
+#: :func:`timer`.
+TIME_BUCKETS = (0.00001, 0.000025, 0.00005, 0.0001, 0.00025, 0.0005,
+                0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0)
+
+#: Default histogram buckets for small counts.
+COUNT_BUCKETS = (0, 1, 2, 4, 8, 16, 32, 64, 128, 256)
+
+
+class Counter(object):
+    """Monotonically increasing counter, optionally split by values of
+    single `label`.
+
+    :param name: Metric name.
+    :type name: str
+
+    :param documentation: Metric description.
+    :type documentation: str
+
+    :param label: Label name.
+    :type label: str
+    """
+    type = 'counter'
+
+    def __init__(self, name, documentation, label=None):
+        self.name = name
+        self.documentation = documentation
+        self.label = label
+        self._values = {}
+        self._lock = Lock()
+
+    def inc(self, amount=1, label=None):
+        """Increases counter by `amount` for the `label` value."""
+        with self._lock:
+            self._values[label] = self._values.get(label, 0) + amount
+
+    def value(self, label=None):
+        """Returns counter value for the `label` value."""
+        return self._values.get(label, 0)
+
+    def reset(self):
+        """Drops counter values."""
+        with self._lock:
+            self._values.clear()
+
+    def snapshot(self):
+        """Returns counter value or dict of values by labels if counter
+        has one."""
+        with self._lock:
+            if self.label is None:
+                return self._values.get(None, 0)
+            return dict(self._values)
+
+    def samples(self):
+        """Yields ``(name, labels, value)`` tuples of Prometheus samples."""
+        values = self.snapshot()
+        if self.label is None:
+            yield self.name, None, values
+            return
+        for label in sorted(values, key=str):
+            yield self.name, ((self.label, label),), values[label]
+
+
+class Histogram(object):
+    """Counts observed values within buckets and tracks their sum.
+
+    :param name: Metric name.
+    :type name: str
+
+    :param documentation: Metric description.
+    :type documentation: str
+
+    :param buckets: Sorted upper bounds of buckets. Values greater than
+                    the last one get into implicit ``+Inf`` bucket.
+    :type buckets: tuple
+    """
+    type = 'histogram'
+
+    def __init__(self, name, documentation, buckets=TIME_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(buckets)
+        self._counts = [0] * (len(self.buckets) + 1)
+        self._sum = 0
+        self._lock = Lock()
+
+    def observe(self, value):
+        """Puts the `value` into the histogram."""
+        idx = bisect_left(self.buckets, value)
+        with self._lock:
+            self._counts[idx] += 1
+            self._sum += value
+
+    def reset(self):
+        """Drops observed values."""
+        with self._lock:
+            self._counts = [0] * (len(self.buckets) + 1)
+            self._sum = 0
+
+    def snapshot(self):
+        """Returns dict with ``count`` and ``sum`` of observed values and
+        ``buckets`` list of ``(upper_bound, cumulative_count)`` tuples,
+        where the last upper bound is ``inf``."""
+        with self._lock:
+            counts = list(self._counts)
+            total = self._sum
+        buckets = []
+        cumulative = 0
+        for bound, count in zip(self.buckets + (float('inf'),), counts):
+            cumulative += count
+            buckets.append((bound, cumulative))
+        return {'count': cumulative, 'sum': total, 'buckets': buckets}
+
+    def samples(self):
+        """Yields ``(name, labels, value)`` tuples of Prometheus samples."""
+        data = self.snapshot()
+        for bound, count in data['buckets']:
+            yield self.name + '_bucket', (('le', _format_value(bound)),), count
+        yield self.name + '_sum', None, data['sum']
+        yield self.name + '_count', None, data['count']
+
+
+class Registry(object):
+    """Collection of metrics by their names."""
+
+    def __init__(self):
+        self._metrics = {}
+        self._lock = Lock()
+
+    def __contains__(self, name):
+        return name in self._metrics
+
+    def __getitem__(self, name):
+        return self._metrics[name]
+
+    def __iter__(self):
+        return iter([self._metrics[name] for name in sorted(self._metrics)])
+
+    def register(self, metric):
+        """Adds the `metric` to the registry. Returns already registered one
+        with the same name and type instead if there is such."""
+        with self._lock:
+            current = self._metrics.get(metric.name)
+            if current is None:
+                self._metrics[metric.name] = metric
+                return metric
+        if current.type != metric.type:
+            raise ValueError('Metric %r is already registered as %s'
+                             '' % (metric.name, current.type))
+        return current
+
+    def counter(self, name, documentation, label=None):
+        """Registers and returns new :class:`Counter`."""
+        return self.register(Counter(name, documentation, label))
+
+    def histogram(self, name, documentation, buckets=TIME_BUCKETS):
+        """Registers and returns new :class:`Histogram`."""
+        return self.register(Histogram(name, documentation, buckets))
+
+    def reset(self):
+        """Resets all registered metrics."""
+        for metric in self:
+            metric.reset()
+
+    def snapshot(self):
+        """Returns dict of metrics snapshots by their names. See
+        :meth:`Counter.snapshot` and :meth:`Histogram.snapshot`."""
+        return dict((metric.name, metric.snapshot()) for metric in self)
+
+    def to_prometheus(self):
+        """Returns metrics in Prometheus text exposition format.
+
+        :rtype: str
+        """
+        lines = []
+        for metric in self:
+            lines.append('# HELP %s %s' % (metric.name, metric.documentation))
+            lines.append('# TYPE %s %s' % (metric.name, metric.type))
+            for name, labels, value in metric.samples():
+                if labels:
+                    name += '{%s}' % ','.join(
+                        '%s="%s"' % (key, _escape(val)) for key, val in labels)
+                lines.append('%s %s' % (name, _format_value(value)))
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return ('%s' % value).replace('\\', '\\\\').replace('"', '\\"') \
+                         .replace('\n', '\\n')
+
+
+def _format_value(value):
+    if value == float('inf'):
+        return '+Inf'
+    return repr(value) if isinstance(value, float) else str(value)
+
+
+#: Default metrics registry.
+REGISTRY = Registry()
+
+#: Received tokens by type: ENQ, ACK, NAK, EOT, message or unknown data.
+PROTOCOL_TOKENS = REGISTRY.counter(
+    'astm_protocol_tokens_total', 'Received protocol tokens.', 'token')
+#: Message chunks received by server.
+SERVER_CHUNKS = REGISTRY.counter(
+    'astm_server_chunks_total', 'Received message chunks.')
+#: Complete messages received by server, chunked ones are counted once.
+SERVER_MESSAGES = REGISTRY.counter(
+    'astm_server_messages_total', 'Received complete messages.')
+#: Time of message decoding by records dispatcher.
+SERVER_DECODE_TIME = REGISTRY.histogram(
+    'astm_server_decode_seconds', 'Message decoding time.')
+#: Time of message dispatching including its decoding.
+SERVER_DISPATCH_TIME = REGISTRY.histogram(
+    'astm_server_dispatch_seconds', 'Message dispatching time.')
+#: Records sent by client.
+CLIENT_RECORDS = REGISTRY.counter(
+    'astm_client_records_total', 'Sent records.')
+#: Time of message encoding by client.
+CLIENT_ENCODE_TIME = REGISTRY.histogram(
+    'astm_client_encode_seconds', 'Message encoding time.')
+#: Number of chunks per message sent by client.
+CLIENT_CHUNKS = REGISTRY.histogram(
+    'astm_client_message_chunks', 'Chunks per sent message.', COUNT_BUCKETS)
+#: Time of polling loop iteration spent on I/O handlers, excluding waiting
+#: for events.
+LOOP_TIME = REGISTRY.histogram(
+    'astm_loop_iteration_seconds', 'Polling loop iteration time.')
+#: Number of channels with I/O events per polling loop iteration.
+LOOP_READY = REGISTRY.histogram(
+    'astm_loop_ready_fds', 'Ready file descriptors per polling loop'
+    ' iteration.', COUNT_BUCKETS)
+
+
+def enable():
+    """Enables metrics collection."""
+    global enabled
+    enabled = True
+
+
+def disable():
+    """Disables metrics collection. Collected values are kept."""
+    global enabled
+    enabled = False
+
+
+def reset():
+    """Resets metrics of default registry."""
+    REGISTRY.reset()
+
+
+def snapshot():
+    """Returns snapshot of default registry metrics. See
+    :meth:`Registry.snapshot`."""
+    return REGISTRY.snapshot()
+
+
+def to_prometheus():
+    """Returns default registry metrics in Prometheus text format."""
+    return REGISTRY.to_prometheus()
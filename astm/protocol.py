@@ -8,17 +8,26 @@
 #
 
 import logging
+import socket
+from . import metrics
 from .asynclib import AsyncChat, call_later
+from .codec import FrameParser
 from .records import HeaderRecord, TerminatorRecord
+from .trace import WireTrace
 from .constants import STX,  ENQ, ACK, NAK, EOT, ENCODING
 
 log = logging.getLogger(__name__)
 
-__all__ = ['ASTMProtocol']
+__all__ = ['ASTMProtocol', 'ASTMProtocolMixIn']
 
+#: Token labels of :data:`~astm.metrics.PROTOCOL_TOKENS` metric.
+TOKEN_LABELS = {ENQ: 'enq', ACK: 'ack', NAK: 'nak', EOT: 'eot'}
 
-class ASTMProtocol(AsyncChat):
-    """Common ASTM protocol routines."""
+
+class ASTMProtocolMixIn(object):
+    """Transport independent ASTM protocol routines: dispatching of received
+    tokens to the handlers. Shared by :class:`ASTMProtocol` and
+    :class:`astm.aio.protocol.ASTMProtocol`."""
 
     #: ASTM header record class.
     astm_header = HeaderRecord
@@ -26,29 +35,21 @@ class ASTMProtocol(AsyncChat):
     astm_terminator = TerminatorRecord
     #: Flag about chunked transfer.
     is_chunked_transfer = None
-    #: IO timer
-    timer = None
+    #: Incremental parser of incoming data stream.
+    stream_parser = FrameParser
 
     encoding = ENCODING
-    strip_terminator = False
     _last_recv_data = None
     _last_sent_data = None
 
-    def __init__(self, sock=None, map=None, timeout=None):
-        super(ASTMProtocol, self).__init__(sock, map)
-        if timeout is not None:
-            self.timer = call_later(timeout, self.on_timeout)
-
-    def found_terminator(self):
-        while self.inbox:
-            data = self.inbox.popleft()
-            if not data:
-                continue
-            self.dispatch(data)
-
     def dispatch(self, data):
         """Dispatcher of received data."""
         self._last_recv_data = data
+        if metrics.enabled:
+            label = TOKEN_LABELS.get(data)
+            if label is None:
+                label = 'message' if data.startswith(STX) else 'unknown'
+            metrics.PROTOCOL_TOKENS.inc(1, label)
         if data == ENQ:
             handler = self.on_enq
         elif data == ACK:
@@ -70,12 +71,6 @@ class ASTMProtocol(AsyncChat):
     def default_handler(self, data):
         raise ValueError('Unable to dispatch data: %r', data)
 
-    def push(self, data):
-        self._last_sent_data = data
-        if self.timer is not None and not self.timer.cancelled:
-            self.timer.reset()
-        return super(ASTMProtocol, self).push(data)
-
     def on_enq(self):
         """Calls on <ENQ> message receiving."""
 
@@ -96,10 +91,51 @@ class ASTMProtocol(AsyncChat):
         response data."""
         log.warning('Communication timeout')
 
+
+class ASTMProtocol(ASTMProtocolMixIn, AsyncChat):
+    """Common ASTM protocol routines."""
+
+    #: IO timer
+    timer = None
+
+    strip_terminator = False
+
+    def __init__(self, sock=None, map=None, timeout=None, trace_size=None):
+        self._parser = self.stream_parser()
+        if trace_size:
+            self.trace = WireTrace(trace_size)
+        super(ASTMProtocol, self).__init__(sock, map)
+        if timeout is not None:
+            self.timer = call_later(timeout, self.on_timeout)
+
+    def found_terminator(self):
+        while self.inbox:
+            data = self.inbox.popleft()
+            if not data:
+                continue
+            self.dispatch(data)
+
+    def push(self, data):
+        self._last_sent_data = data
+        if self.timer is not None and not self.timer.cancelled:
+            self.timer.reset()
+        return super(ASTMProtocol, self).push(data)
+
     def handle_read(self):
         if self.timer is not None and not self.timer.cancelled:
             self.timer.reset()
-        super(ASTMProtocol, self).handle_read()
+        try:
+            data = self.recv(self.recv_buffer_size)
+        except socket.error:
+            self.handle_error()
+            return
+        for token in self._parser.feed(data):
+            self.pull(token)
+            self.found_terminator()
+
+    def discard_input_buffers(self):
+        self._parser.clear()
+        return super(ASTMProtocol, self).discard_input_buffers()
 
     def handle_close(self):
         if self.timer is not None and not self.timer.cancelled:
@@ -8,16 +8,24 @@
 #
 
 import logging
+import os
+import signal
 import socket
-from .asynclib import Dispatcher, loop
-from .codec import decode_message, is_chunked_message, join
-from .constants import ACK, CRLF, EOT, NAK, ENCODING
+import time
+from collections import deque
+from . import metrics
+from .asynclib import Dispatcher, Trigger, call_later, close_all, loop
+from .codec import LazyRecord, decode_message, is_chunked_message, join
+from .constants import ACK, NAK, ENCODING
 from .exceptions import InvalidState, NotAccepted
+from .mapping import Component, Mapping
 from .protocol import ASTMProtocol
 
 log = logging.getLogger(__name__)
 
-__all__ = ['BaseRecordsDispatcher', 'RequestHandler', 'Server']
+__all__ = ['BaseRecordsDispatcher', 'BatchRecordsDispatcher', 'DispatchPool',
+           'RequestHandler', 'RequestHandlerMixIn', 'Server', 'Session',
+           'SessionNode', 'SessionRecordsDispatcher']
 
 
 class BaseRecordsDispatcher(object):
@@ -57,6 +65,11 @@ class BaseRecordsDispatcher(object):
 
     #: Encoding of received messages.
     encoding = ENCODING
+    #: Records decoder engine. See :func:`~astm.codec.decode_record`. With
+    #: ``lazy`` engine records are decoded on fields access and wrappers
+    #: which provide :meth:`~astm.mapping.Record.from_lazy` method decode
+    #: only fields that are read by handlers.
+    engine = 'default'
 
     def __init__(self, encoding=None):
         self.encoding = encoding or self.encoding
@@ -71,20 +84,42 @@ class BaseRecordsDispatcher(object):
             'L': self.on_terminator
         }
         self.wrappers = {}
+        # types of records passed to default handler
+        self._unprocessed = set()
 
     def __call__(self, message):
-        seq, records, cs = decode_message(message, self.encoding)
-        for record in records:
+        for record in self._decode(message):
             self.dispatch.get(record[0], self.on_unknown)(self.wrap(record))
 
+    def _decode(self, message):
+        if metrics.enabled:
+            started = metrics.timer()
+            seq, records, cs = decode_message(message, self.encoding,
+                                              self.engine)
+            metrics.SERVER_DECODE_TIME.observe(metrics.timer() - started)
+        else:
+            seq, records, cs = decode_message(message, self.encoding,
+                                              self.engine)
+        return records
+
     def wrap(self, record):
         rtype = record[0]
         if rtype in self.wrappers:
-            return self.wrappers[rtype](*record)
+            wrapper = self.wrappers[rtype]
+            if isinstance(record, LazyRecord) and hasattr(wrapper,
+                                                          'from_lazy'):
+                return wrapper.from_lazy(record)
+            return wrapper(*record)
         return record
 
     def _default_handler(self, record):
-        log.warn('Record remains unprocessed: %s', record)
+        rtype = record[0]
+        if rtype not in self._unprocessed:
+            # warn once per type, since unprocessed records likely follow
+            self._unprocessed.add(rtype)
+            log.warning('Records of type %r remain unprocessed', rtype)
+        if log.isEnabledFor(logging.DEBUG):
+            log.debug('Record remains unprocessed: %s', record)
 
     def on_header(self, record):
         """Header record handler."""
@@ -123,31 +158,428 @@ class BaseRecordsDispatcher(object):
         self._default_handler(record)
 
 
-class RequestHandler(ASTMProtocol):
-    """ASTM protocol request handler.
+class BatchRecordsDispatcher(BaseRecordsDispatcher):
+    """Records dispatcher which accumulates records of each type and passes
+    them to the `sink` by batches, so they could be stored by bulk inserts
+    instead of row at a time::
 
-    :param sock: Socket object.
+        class Dispatcher(BatchRecordsDispatcher):
 
-    :param dispatcher: Request handler records dispatcher instance.
-    :type dispatcher: :class:`BaseRecordsDispatcher`
+            batch_size = 500
 
-    :param timeout: Number of seconds to wait for incoming data before
-                    connection closing.
-    :type timeout: int
+            def sink(self, records):
+                rtype = records[0][0]
+                db.executemany(INSERT_QUERIES[rtype], records)
+
+    Batch is flushed when it reaches `batch_size` records, when
+    `flush_interval` seconds are passed since the first record was
+    buffered and when the terminator record is received. On flush batches
+    are passed to the sink in order their types were first received, so
+    headers come before patients, patients before orders and so on. Full
+    batch is passed to the sink after batches of types received before it.
+
+    Records are buffered by :meth:`_default_handler`, so record handlers
+    could still be overridden to process some records one by one. Batches
+    are flushed on terminator record even if :meth:`on_terminator` is
+    overridden.
+
+    Time based flush is scheduled by :class:`~astm.asynclib.call_later`
+    and so requires running polling loop.
+
+    If the sink fails, the batch is kept buffered and flush is retried later,
+    since its records are already ACKed. So the sink may receive same records
+    twice if it fails after storing some of them.
+
+    When dispatcher is run by :class:`DispatchPool`, records are buffered and
+    passed to the sink within the loop thread through the loop `trigger`.
+    :class:`Server` sets it up, but only thread pool executors are supported.
+
+    :param encoding: Encoding of received messages.
+    :type encoding: str
+
+    :param sink: Callable that accepts list of wrapped records of the same
+                 type. If omitted :meth:`sink` method is used.
+    :type sink: callable
+
+    :param batch_size: Overrides :attr:`batch_size`.
+    :type batch_size: int
+
+    :param flush_interval: Overrides :attr:`flush_interval`.
+    :type flush_interval: float
+
+    :param trigger: Polling loop trigger.
+    :type trigger: :class:`~astm.asynclib.Trigger`
     """
-    def __init__(self, sock, dispatcher, timeout=None):
-        super(RequestHandler, self).__init__(sock, timeout=timeout)
-        self._chunks = []
-        host, port = sock.getpeername() if sock is not None else (None, None)
-        self.client_info = {'host': host, 'port': port}
-        self.dispatcher = dispatcher
-        self._is_transfer_state = False
-        self.terminator = 1
+
+    #: Number of records of the same type that forces batch flush.
+    batch_size = 100
+    #: Maximum number of seconds to keep records buffered. If :const:`None`
+    #: records are flushed by size or by terminator record only.
+    flush_interval = 1.0
+
+    def __init__(self, encoding=None, sink=None,
+                 batch_size=None, flush_interval=None, trigger=None):
+        super(BatchRecordsDispatcher, self).__init__(encoding)
+        if sink is not None:
+            self.sink = sink
+        if batch_size is not None:
+            self.batch_size = batch_size
+        if flush_interval is not None:
+            self.flush_interval = flush_interval
+        self.trigger = trigger
+        self._batches = {}
+        self._types = []
+        self._timer = None
+
+    def __call__(self, message):
+        terminated = False
+        for record in self._decode(message):
+            terminated = terminated or record[0] == 'L'
+            self.dispatch.get(record[0], self.on_unknown)(self.wrap(record))
+        if terminated:
+            self._call_in_loop(self._safe_flush, self.flush)
+
+    def _default_handler(self, record):
+        self._call_in_loop(self._buffer, record)
+
+    def _call_in_loop(self, func, *args):
+        if self.trigger is None:
+            func(*args)
+        else:
+            self.trigger.pull(func, *args)
+
+    def _buffer(self, record):
+        rtype = record[0]
+        batch = self._batches.get(rtype)
+        if batch is None:
+            batch = self._batches[rtype] = []
+            self._types.append(rtype)
+        batch.append(record)
+        if len(batch) >= self.batch_size:
+            self._safe_flush(self._flush_until, rtype)
+        else:
+            self._schedule_flush()
+
+    def _schedule_flush(self):
+        if (self._timer is None and self._batches
+                and self.flush_interval is not None):
+            self._timer = call_later(self.flush_interval, self._flush_timer)
+
+    def sink(self, records):
+        """Handles batch of records of the same type. Should be overridden
+        if `sink` argument is not specified.
+
+        :param records: List of wrapped records.
+        :type records: list
+        """
+        for record in records:
+            super(BatchRecordsDispatcher, self)._default_handler(record)
+
+    def flush(self):
+        """Passes all buffered records to the sink. If the sink fails, the
+        error is raised while failed and remaining batches are kept
+        buffered. Should be called within the loop thread."""
+        if self._timer is not None:
+            if not self._timer.cancelled:
+                self._timer.cancel()
+            self._timer = None
+        while self._types:
+            self._flush_batch(self._types[0])
+
+    def _flush_batch(self, rtype):
+        self.sink(self._batches[rtype])
+        del self._batches[rtype]
+        self._types.remove(rtype)
+
+    def _flush_until(self, rtype):
+        # batches of types received before go first to keep records order
+        while self._types:
+            head = self._types[0]
+            self._flush_batch(head)
+            if head == rtype:
+                break
+
+    def _flush_timer(self):
+        self._timer = None
+        self._safe_flush(self.flush)
+
+    def _safe_flush(self, func, *args):
+        try:
+            func(*args)
+        except Exception:
+            log.exception('Error occurred on records batch flushing.')
+            self._schedule_flush()
+
+
+class SessionNode(object):
+    """Node of the :class:`Session` tree.
+
+    :param record: Wrapped record.
+    """
+    __slots__ = ('record', 'children', 'comments')
+
+    def __init__(self, record):
+        #: Wrapped record of the node.
+        self.record = record
+        #: Child nodes: orders of patient and results of order.
+        self.children = []
+        #: Comment records related to the record.
+        self.comments = []
+
+    def __repr__(self):
+        return '<SessionNode %r>' % (self.record,)
+
+
+class Session(object):
+    """Tree of records received within single transmission session:
+    patients with their orders, orders with their results, each of them with
+    related comments::
+
+        for patient in session.patients:
+            for order in patient.children:
+                for result in order.children:
+                    print(result.record, result.comments)
+
+    Results could be found by specimen ID of their order and test code
+    without walking through the tree::
+
+        glucose = session.results('SPEC001', 'GLU')
+    """
+    __slots__ = ('header', 'terminator', 'comments', 'patients', 'extra',
+                 '_index')
+
+    def __init__(self, header=None):
+        #: Header record.
+        self.header = header
+        #: Terminator record.
+        self.terminator = None
+        #: Comment records related to the header.
+        self.comments = []
+        #: List of patient :class:`nodes <SessionNode>`.
+        self.patients = []
+        #: Records which have no place in the tree: scientific, manufacturer
+        #: information ones and records received out of order.
+        self.extra = []
+        self._index = {}
+
+    def results(self, specimen_id, test_code):
+        """Returns list of result records for specified specimen ID and
+        test code."""
+        return self._index.get((specimen_id, test_code), [])
+
+    def _add_result(self, specimen_id, test_code, record):
+        key = (specimen_id, test_code)
+        results = self._index.get(key)
+        if results is None:
+            results = self._index[key] = []
+        results.append(record)
+
+
+class SessionRecordsDispatcher(BaseRecordsDispatcher):
+    """Records dispatcher which builds :class:`Session` tree as records
+    arrive and passes it to :meth:`on_session` when the terminator record
+    is received, so there is no need to track records hierarchy by hand::
+
+        class Dispatcher(SessionRecordsDispatcher):
+
+            def on_session(self, session):
+                for patient in session.patients:
+                    ...
+
+    Since records are wrapped before they are placed into the tree, specimen
+    ID and test code extraction could be customized for used wrappers by
+    overriding :meth:`specimen_id` and :meth:`test_code` methods.
+    """
+
+    def __init__(self, encoding=None):
+        super(SessionRecordsDispatcher, self).__init__(encoding)
+        self.session = None
+        self._patient = None
+        self._order = None
+        self._last = None
+
+    def specimen_id(self, order):
+        """Returns specimen ID of the order record used as index key."""
+        return _first_component(_field(order, 2))
+
+    def test_code(self, result):
+        """Returns test code of the result record used as index key. It's
+        the manufacturer's local code, the fourth component of universal
+        test ID, if the field is a component."""
+        value = _field(result, 2)
+        if isinstance(value, (list, tuple, Component)):
+            if len(value) > 3:
+                return _field(value, 3)
+            return _first_component(value)
+        return value
+
+    def on_session(self, session):
+        """Handles completed session."""
+        log.warning('Session remains unprocessed: %d patients',
+                    len(session.patients))
+
+    def on_header(self, record):
+        if self.session is not None:
+            log.warning('Session was not terminated, dropping it')
+        self._reset()
+        self.session = Session(record)
+        self._last = self.session
+
+    def on_patient(self, record):
+        node = SessionNode(record)
+        self._session().patients.append(node)
+        self._patient = self._last = node
+        self._order = None
+
+    def on_order(self, record):
+        if self._patient is None:
+            return self._orphan(record)
+        node = SessionNode(record)
+        self._patient.children.append(node)
+        self._order = self._last = node
+
+    def on_result(self, record):
+        if self._order is None:
+            return self._orphan(record)
+        node = SessionNode(record)
+        self._order.children.append(node)
+        self._last = node
+        self.session._add_result(self.specimen_id(self._order.record),
+                                 self.test_code(record), record)
+
+    def on_comment(self, record):
+        if self._last is None:
+            return self._orphan(record)
+        self._last.comments.append(record)
+
+    def on_terminator(self, record):
+        session = self._session()
+        session.terminator = record
+        self._reset()
+        self.on_session(session)
+
+    def _default_handler(self, record):
+        self._session().extra.append(record)
+
+    def _orphan(self, record):
+        log.warning('Record is out of order: %s', record)
+        self._session().extra.append(record)
+
+    def _session(self):
+        if self.session is None:
+            self.session = Session()
+        return self.session
+
+    def _reset(self):
+        self.session = self._patient = self._order = self._last = None
+
+
+def _first_component(value):
+    if isinstance(value, (list, tuple, Component)):
+        return _field(value, 0) if value else None
+    return value
+
+
+def _field(record, index):
+    # mapping item access builds list of all values, while one is needed
+    if isinstance(record, Mapping):
+        return getattr(record, record._fields[index][0])
+    return record[index]
+
+
+class DispatchPool(object):
+    """Runs records dispatchers within :mod:`concurrent.futures` executor
+    instead of polling loop, so slow records handling of one connection
+    doesn't block others. Results are passed back to the loop thread via
+    :class:`~astm.asynclib.Trigger`.
+
+    Keep in mind, that dispatchers are pickled for process pool executor,
+    so any changes of their state wouldn't survive.
+
+    :param executor: :class:`concurrent.futures.Executor` instance or
+                     callable which creates it. In the last case executor
+                     is created on first use and recreated in forked
+                     process, so only this way is suitable for
+                     :meth:`Server.serve_workers`.
+
+    :param max_pending: Maximum number of tasks submitted to the executor.
+                        Others are waiting for their turn in the loop.
+    :type max_pending: int
+    """
+    def __init__(self, executor, max_pending=32, map=None):
+        if hasattr(executor, 'submit'):
+            self.executor, self.executor_factory = executor, None
+        else:
+            self.executor, self.executor_factory = None, executor
+        self.max_pending = max_pending
+        #: Number of tasks submitted to the executor.
+        self.pending = 0
+        self._waiting = deque()
+        self._trigger = Trigger(map)
+
+    @property
+    def trigger(self):
+        """:class:`~astm.asynclib.Trigger` of the polling loop."""
+        return self._trigger
+
+    def submit(self, callback, func, *args):
+        """Calls ``func(*args)`` within the executor. When it completes,
+        `callback` is called with the :class:`~concurrent.futures.Future`
+        within the loop thread."""
+        if self.pending >= self.max_pending:
+            self._waiting.append((callback, func, args))
+        else:
+            self._submit(callback, func, args)
+
+    def close(self):
+        """Closes the loop trigger. Executor that was passed as instance
+        should be shutdown separately."""
+        self._waiting.clear()
+        self._trigger.close()
+        if self.executor_factory is not None and self.executor is not None:
+            self.executor.shutdown(wait=False)
+            self.executor = None
+
+    def _after_fork(self):
+        # executor threads and trigger are not inherited by the child
+        self.executor = None
+        self.pending = 0
+        self._waiting.clear()
+        self._trigger.close()
+        self._trigger = Trigger(self._trigger._map)
+
+    def _submit(self, callback, func, args):
+        if self.executor is None:
+            self.executor = self.executor_factory()
+        self.pending += 1
+        future = self.executor.submit(func, *args)
+        future.add_done_callback(
+            lambda future: self._trigger.pull(self._done, callback, future))
+
+    def _done(self, callback, future):
+        self.pending -= 1
+        if self._waiting:
+            self._submit(*self._waiting.popleft())
+        callback(future)
+
+
+class RequestHandlerMixIn(object):
+    """Transport independent part of ASTM protocol request handler: transfer
+    state machine and message collecting and dispatching. Shared by
+    :class:`RequestHandler` and :class:`astm.aio.server.RequestHandler`."""
+
+    #: Records dispatcher instance.
+    dispatcher = None
+    #: Write-ahead journal instance.
+    journal = None
+    #: Wire trace instance.
+    trace = None
+
+    _is_transfer_state = False
 
     def on_enq(self):
         if not self._is_transfer_state:
             self._is_transfer_state = True
-            self.terminator = [CRLF, EOT]
             return ACK
         else:
             log.error('ENQ is not expected')
@@ -162,7 +594,6 @@ class RequestHandler(ASTMProtocol):
     def on_eot(self):
         if self._is_transfer_state:
             self._is_transfer_state = False
-            self.terminator = 1
         else:
             raise InvalidState('Server is not ready to accept EOT message.')
 
@@ -170,35 +601,159 @@ class RequestHandler(ASTMProtocol):
         if not self._is_transfer_state:
             self.discard_input_buffers()
             return NAK
-        else:
-            try:
-                self.handle_message(self._last_recv_data)
-                return ACK
-            except Exception:
-                log.exception('Error occurred on message handling.')
-                return NAK
+        try:
+            message = self.handle_message(self._last_recv_data)
+        except Exception:
+            log.exception('Error occurred on message handling.')
+            if self.trace is not None:
+                self.trace.log(self.addr)
+            return NAK
+        return self._message_handled(message)
 
     def handle_message(self, message):
+        """Dispatches the message once all its chunks are received. If
+        request handler has journal, the message is appended to it before.
+
+        :return: Dispatched message or :const:`None` for chunks.
+        """
+        message = self._collect_message(message)
+        if message is None:
+            return None
+        if self.journal is not None and not self.journal.append(message):
+            raise IOError('Unable to store message to journal')
+        if metrics.enabled:
+            started = metrics.timer()
+            self.dispatcher(message)
+            metrics.SERVER_DISPATCH_TIME.observe(metrics.timer() - started)
+        else:
+            self.dispatcher(message)
+        return message
+
+    def _collect_message(self, message):
+        """Returns complete message once all its chunks are received."""
         self.is_chunked_transfer = is_chunked_message(message)
         if self.is_chunked_transfer:
             self._chunks.append(message)
-        elif self._chunks:
+            if metrics.enabled:
+                metrics.SERVER_CHUNKS.inc()
+            return None
+        if self._chunks:
             self._chunks.append(message)
-            self.dispatcher(join(self._chunks))
+            message = join(self._chunks)
             self._chunks = []
-        else:
-            self.dispatcher(message)
+            if metrics.enabled:
+                metrics.SERVER_CHUNKS.inc()
+        if metrics.enabled:
+            metrics.SERVER_MESSAGES.inc()
+        return message
+
+    def _message_handled(self, message):
+        """Returns response on handled message."""
+        return ACK
 
     def discard_input_buffers(self):
         self._chunks = []
-        return super(RequestHandler, self).discard_input_buffers()
+        return super(RequestHandlerMixIn, self).discard_input_buffers()
 
     def on_timeout(self):
         """Closes connection on timeout."""
-        super(RequestHandler, self).on_timeout()
+        super(RequestHandlerMixIn, self).on_timeout()
         self.close()
 
 
+class RequestHandler(RequestHandlerMixIn, ASTMProtocol):
+    """ASTM protocol request handler.
+
+    :param sock: Socket object.
+
+    :param dispatcher: Request handler records dispatcher instance.
+    :type dispatcher: :class:`BaseRecordsDispatcher`
+
+    :param timeout: Number of seconds to wait for incoming data before
+                    connection closing.
+    :type timeout: int
+
+    :param pool: Runs dispatcher within executor if specified. Message is
+                 ACKed or NAKed once dispatcher completes, while next ones
+                 are waiting for their turn to preserve their order.
+    :type pool: :class:`DispatchPool`
+
+    :param journal: Stores received messages before they get dispatched.
+                    Message is ACKed once it is dispatched and committed.
+                    If message couldn't be stored it is NAKed.
+    :type journal: :class:`~astm.journal.Journal`
+
+    :param trace_size: Number of last transferred bytes to keep within
+                       :class:`~astm.trace.WireTrace`. The trace is logged
+                       when message handling fails.
+    :type trace_size: int
+    """
+    def __init__(self, sock, dispatcher, timeout=None, pool=None,
+                 journal=None, trace_size=None):
+        super(RequestHandler, self).__init__(sock, timeout=timeout,
+                                             trace_size=trace_size)
+        self._chunks = []
+        host, port = sock.getpeername() if sock is not None else (None, None)
+        self.client_info = {'host': host, 'port': port}
+        self.dispatcher = dispatcher
+        self.pool = pool
+        self.journal = journal
+        self._is_transfer_state = False
+        # messages awaiting for dispatching by the pool
+        self._queue = deque()
+
+    def on_message(self):
+        if self.pool is None or not self._is_transfer_state:
+            return super(RequestHandler, self).on_message()
+        self._queue.append(self._last_recv_data)
+        if len(self._queue) == 1:
+            self._dispatch_next()
+
+    def _message_handled(self, message):
+        if message is None or self.journal is None:
+            return ACK
+        self.journal.sync(self._message_stored)
+
+    def _dispatch_next(self):
+        while self._queue:
+            message = self._collect_message(self._queue[0])
+            if message is None:
+                self._queue.popleft()
+                self.push(ACK)
+            elif self.journal is not None and not self.journal.append(message):
+                self._queue.popleft()
+                self.push(NAK)
+            else:
+                self.pool.submit(self._message_done, self.dispatcher, message)
+                return
+
+    def _message_done(self, future):
+        if not self.connected:
+            self._queue.clear()
+            return
+        self._queue.popleft()
+        err = future.exception()
+        if err is not None:
+            log.error('Error occurred on message handling.', exc_info=err)
+            if self.trace is not None:
+                self.trace.log(self.addr)
+            self.push(NAK)
+        elif self.journal is not None:
+            self.journal.sync(self._message_stored)
+            return
+        else:
+            self.push(ACK)
+        self._dispatch_next()
+
+    def _message_stored(self, ok):
+        if not self.connected:
+            self._queue.clear()
+            return
+        self.push(ACK if ok else NAK)
+        if self.pool is not None:
+            self._dispatch_next()
+
+
 class Server(Dispatcher):
     """Asyncore driven ASTM server.
 
@@ -221,6 +776,39 @@ class Server(Dispatcher):
 
     :param encoding: :class:`Dispatcher <BaseRecordsDispatcher>`\'s encoding.
     :type encoding: str
+
+    :param backlog: Maximum number of queued connections.
+    :type backlog: int
+
+    :param executor: :class:`concurrent.futures.Executor` instance or
+                     callable which creates it to run dispatchers in. See
+                     :class:`DispatchPool` for details.
+
+    :param max_pending: Maximum number of messages submitted to `executor`.
+    :type max_pending: int
+
+    :param reuse_port: Sets :const:`SO_REUSEPORT` option for server socket,
+                       so each worker process started by
+                       :meth:`serve_workers` gets own listening socket and
+                       incoming connections are balanced between them by the
+                       kernel. Otherwise workers accept connections from the
+                       single listening socket inherited from the parent.
+    :type reuse_port: bool
+
+    :param journal: Write-ahead journal for received messages. Stored
+                    messages are replayed on server start, but the journal
+                    isn't cleared then: replayed records may still be
+                    buffered by the dispatcher. The application is
+                    responsible to call
+                    :meth:`~astm.journal.Journal.checkpoint` once dispatched
+                    data is persisted. See
+                    :class:`~astm.journal.Journal` for details.
+    :type journal: :class:`~astm.journal.Journal`
+
+    :param trace_size: Number of last transferred bytes which each request
+                       handler keeps to log them on error. See
+                       :class:`~astm.trace.WireTrace`.
+    :type trace_size: int
     """
 
     request = RequestHandler
@@ -228,12 +816,14 @@ class Server(Dispatcher):
 
     def __init__(self, host='localhost', port=15200,
                  request=None, dispatcher=None,
-                 timeout=None, encoding=None):
+                 timeout=None, encoding=None,
+                 backlog=5, reuse_port=False,
+                 executor=None, max_pending=32, journal=None,
+                 trace_size=None):
         super(Server, self).__init__()
-        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
-        self.set_reuse_addr()
-        self.bind((host, port))
-        self.listen(5)
+        self.backlog = backlog
+        self.reuse_port = reuse_port
+        self._listen((host, port))
         self.pool = []
         self.timeout = timeout
         self.encoding = encoding
@@ -241,16 +831,197 @@ class Server(Dispatcher):
             self.request = request
         if dispatcher is not None:
             self.dispatcher = dispatcher
+        self._workers = {}
+        self._stopping = False
+        self._restarting = False
+        self.dispatch_pool = None
+        if executor is not None:
+            self.dispatch_pool = DispatchPool(executor, max_pending)
+        self.journal = journal
+        self.trace_size = trace_size
+        if journal is not None:
+            count = journal.replay(self.dispatcher(self.encoding))
+            if count:
+                log.info('Replayed %d messages from journal %s',
+                         count, journal.path)
+
+    def _listen(self, address):
+        self.create_socket(socket.AF_INET, socket.SOCK_STREAM)
+        self.set_reuse_addr()
+        if self.reuse_port:
+            if not hasattr(socket, 'SO_REUSEPORT'):
+                raise RuntimeError('SO_REUSEPORT is not supported')
+            self.socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEPORT, 1)
+        self.bind(address)
+        self.listen(self.backlog)
+        # the real one in case of zero port
+        self.address = self.socket.getsockname()
 
     def handle_accept(self):
         pair = self.accept()
         if pair is None:
             return
         sock, addr = pair
-        self.request(sock, self.dispatcher(self.encoding), timeout=self.timeout)
+        kwargs = {'timeout': self.timeout}
+        dispatcher = self.dispatcher(self.encoding)
+        if self.dispatch_pool is not None:
+            kwargs['pool'] = self.dispatch_pool
+            if isinstance(dispatcher, BatchRecordsDispatcher):
+                dispatcher.trigger = self.dispatch_pool.trigger
+        if self.journal is not None:
+            kwargs['journal'] = self.journal
+        if self.trace_size:
+            kwargs['trace_size'] = self.trace_size
+        self.request(sock, dispatcher, **kwargs)
         super(Server, self).handle_accept()
 
     def serve_forever(self, *args, **kwargs):
         """Enters into the :func:`polling loop <asynclib.loop>` to let server
-        handle incoming requests."""
+        handle incoming requests. Arguments are passed to the loop as is, so
+        polling backend could be changed with `poller` argument::
+
+            server.serve_forever(poller=asynclib.SelectorPoller())
+        """
         loop(*args, **kwargs)
+
+    def serve_workers(self, workers=None, timeout=1.0, poller=None,
+                      shutdown_timeout=10.0):
+        """Forks `workers` processes, each handles incoming requests within
+        own :func:`polling loop <asynclib.loop>`, and supervises them until
+        :const:`SIGTERM` or :const:`SIGINT` signal is received.
+
+        Died workers are restarted. On :const:`SIGHUP` all workers are
+        gracefully restarted one by one: new worker is started before the old
+        one is asked to stop. Stopping worker closes the listening socket and
+        finishes active connections, but no longer than `shutdown_timeout`
+        seconds. Available on POSIX systems only.
+
+        :param workers: Number of worker processes. Equals to number of CPUs
+                        if omitted.
+        :type workers: int
+
+        :param timeout: Polling loop timeout of workers. Limits time of
+                        reaction on stop signal.
+        :type timeout: float
+
+        :param poller: Polling loop backend. Since workers are forked, it
+                       should be a callable that returns the backend, e.g.
+                       :class:`asynclib.SelectorPoller` class.
+
+        :param shutdown_timeout: Seconds to wait for workers to finish.
+        :type shutdown_timeout: float
+
+        Server `executor` should be passed as factory, so each worker creates
+        own one. Executor instance is rejected with :exc:`RuntimeError`,
+        since its threads don't survive the fork. Server `journal` is
+        rejected as well: checkpoint of one worker would clear messages
+        which are not yet persisted by the others.
+        """
+        if not hasattr(os, 'fork'):
+            raise RuntimeError('Worker processes require os.fork support')
+        if (self.dispatch_pool is not None
+                and self.dispatch_pool.executor_factory is None):
+            raise RuntimeError('Worker processes require executor factory'
+                               ' instead of executor instance')
+        if self.journal is not None:
+            raise RuntimeError('Worker processes could not share journal')
+        if workers is None:
+            import multiprocessing
+            workers = multiprocessing.cpu_count()
+        handlers = dict((signum, signal.signal(signum, self._handle_signal))
+                        for signum in (signal.SIGTERM, signal.SIGINT,
+                                       signal.SIGHUP))
+        try:
+            for _ in range(workers):
+                self._spawn_worker(timeout, poller)
+            self._supervise(timeout, poller, shutdown_timeout)
+        finally:
+            for signum, handler in handlers.items():
+                signal.signal(signum, handler)
+
+    def _handle_signal(self, signum, frame):
+        if signum == signal.SIGHUP:
+            self._restarting = True
+        else:
+            self._stopping = True
+
+    def _spawn_worker(self, timeout, poller):
+        if self.reuse_port and not self.accepting:
+            self._listen(self.address)
+        pid = os.fork()
+        if pid:
+            self._workers[pid] = None
+            if self.reuse_port:
+                # the socket is owned by the worker now
+                self.close()
+            return pid
+        code = 0
+        try:
+            self._run_worker(timeout, poller)
+        except BaseException:
+            log.exception('Worker %d failed', os.getpid())
+            code = 1
+        finally:
+            os._exit(code)
+
+    def _run_worker(self, timeout, poller):
+        self._workers = {}
+        self._stopping = False
+        signal.signal(signal.SIGTERM, self._handle_signal)
+        signal.signal(signal.SIGINT, signal.SIG_IGN)
+        signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        if self.dispatch_pool is not None:
+            self.dispatch_pool._after_fork()
+        if poller is not None:
+            poller = poller()
+        while self.accepting or self._has_connections():
+            if self._stopping and self.accepting:
+                self.close()
+            loop(timeout, count=1, poller=poller)
+
+    def _has_connections(self):
+        for channel in self._map.values():
+            if not isinstance(channel, Trigger):
+                return True
+        return False
+
+    def _supervise(self, timeout, poller, shutdown_timeout):
+        while self._workers:
+            while True:
+                try:
+                    pid, status = os.waitpid(-1, os.WNOHANG)
+                except OSError:
+                    break
+                if not pid:
+                    break
+                if pid not in self._workers:
+                    continue
+                if self._workers.pop(pid) is None and not self._stopping:
+                    log.warning('Worker %d died, starting new one', pid)
+                    self._spawn_worker(timeout, poller)
+            if self._restarting:
+                self._restarting = False
+                for pid, deadline in list(self._workers.items()):
+                    if deadline is None and not self._stopping:
+                        self._spawn_worker(timeout, poller)
+                        self._stop_worker(pid, shutdown_timeout)
+            now = time.time()
+            for pid, deadline in list(self._workers.items()):
+                if deadline is None:
+                    if self._stopping:
+                        self._stop_worker(pid, shutdown_timeout)
+                elif now > deadline:
+                    self._kill_worker(pid, signal.SIGKILL)
+            time.sleep(0.05)
+        close_all(ignore_all=True)
+
+    def _stop_worker(self, pid, shutdown_timeout):
+        # stopping workers have deadline and they are not restarted on exit
+        self._workers[pid] = time.time() + shutdown_timeout
+        self._kill_worker(pid, signal.SIGTERM)
+
+    def _kill_worker(self, pid, signum):
+        try:
+            os.kill(pid, signum)
+        except OSError:
+            pass
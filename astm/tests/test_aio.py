@@ -0,0 +1,156 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+import unittest
+from astm import codec, constants, records
+from astm.server import BaseRecordsDispatcher
+try:
+    import asyncio
+    from astm import aio
+except ImportError:
+    aio = None
+
+
+class DummyTransport(object):
+
+    def __init__(self):
+        self.outbox = []
+        self.closed = False
+
+    def write(self, data):
+        self.outbox.append(data)
+
+    def close(self):
+        self.closed = True
+
+    def is_closing(self):
+        return self.closed
+
+    def get_extra_info(self, name):
+        return ('127.0.0.1', 42) if name == 'peername' else None
+
+
+class Dispatcher(BaseRecordsDispatcher):
+
+    def __init__(self, encoding=None):
+        super(Dispatcher, self).__init__(encoding)
+        self.records = []
+
+    def _default_handler(self, record):
+        self.records.append(record)
+
+
+@unittest.skipIf(aio is None, 'asyncio is not available')
+class RequestHandlerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.dispatcher = Dispatcher()
+        self.handler = aio.RequestHandler(self.dispatcher, timeout=0.05)
+        self.transport = DummyTransport()
+        self.handler.connection_made(self.transport)
+
+    def tearDown(self):
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def test_client_info(self):
+        self.assertEqual(self.handler.client_info,
+                         {'host': '127.0.0.1', 'port': 42})
+
+    def test_session(self):
+        message = codec.encode_message(1, [['H'], ['L']], 'ascii')
+        self.handler.data_received(constants.ENQ + message[:5])
+        self.handler.data_received(message[5:] + constants.EOT)
+        self.assertEqual(self.transport.outbox, [constants.ACK, constants.ACK])
+        self.assertEqual(self.dispatcher.records, [['H'], ['L']])
+
+    def test_reject_message_out_of_session(self):
+        message = codec.encode_message(1, [['H']], 'ascii')
+        self.handler.data_received(message)
+        self.assertEqual(self.transport.outbox, [constants.NAK])
+
+    def test_close_on_error(self):
+        self.handler.data_received(constants.EOT)
+        self.assertTrue(self.transport.closed)
+
+    def test_close_on_timeout(self):
+        self.loop.run_until_complete(asyncio.sleep(0.1))
+        self.assertTrue(self.transport.closed)
+
+    def test_use_transport_loop(self):
+        loop = asyncio.new_event_loop()
+        self.addCleanup(loop.close)
+        transport = DummyTransport()
+        transport.get_loop = lambda: loop
+        handler = aio.RequestHandler(self.dispatcher, timeout=0.05)
+        handler.connection_made(transport)
+        handler.connection_lost(None)
+        self.assertTrue(handler._loop is loop)
+
+
+@unittest.skipIf(aio is None, 'asyncio is not available')
+class ClientServerTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.loop = asyncio.new_event_loop()
+        asyncio.set_event_loop(self.loop)
+        self.dispatcher = Dispatcher()
+        self.server = self.loop.run_until_complete(
+            aio.serve('127.0.0.1', 0, dispatcher=lambda e: self.dispatcher,
+                      timeout=5))
+        self.port = self.server.sockets[0].getsockname()[1]
+
+    def tearDown(self):
+        self.server.close()
+        self.loop.run_until_complete(self.server.wait_closed())
+        self.loop.close()
+        asyncio.set_event_loop(None)
+
+    def run_client(self, emitter, **kwargs):
+        client = self.loop.run_until_complete(
+            aio.connect(emitter, '127.0.0.1', self.port, **kwargs))
+        self.loop.run_until_complete(
+            asyncio.wait_for(client.wait_closed(), 5))
+        return client
+
+    def emitter(self):
+        for idx in range(2):
+            assert (yield records.HeaderRecord())
+            assert (yield records.PatientRecord(seq=idx + 1))
+            assert (yield records.TerminatorRecord())
+
+    def test_send_records(self):
+        self.run_client(self.emitter)
+        self.assertEqual([record[0] for record in self.dispatcher.records],
+                         list('HPLHPL'))
+
+    def test_send_chunked_records(self):
+        self.run_client(self.emitter, chunk_size=16)
+        self.assertEqual([record[0] for record in self.dispatcher.records],
+                         list('HPLHPL'))
+
+    def test_bulk_mode(self):
+        self.run_client(self.emitter, bulk_mode=True, chunk_size=32)
+        self.assertEqual([record[0] for record in self.dispatcher.records],
+                         list('HPLHPL'))
+
+    def test_emitter_failure(self):
+        def emitter():
+            yield records.HeaderRecord()
+            raise ValueError('boom')
+        client = self.loop.run_until_complete(
+            aio.connect(emitter, '127.0.0.1', self.port))
+        self.assertRaises(ValueError, self.loop.run_until_complete,
+                          asyncio.wait_for(client.wait_closed(), 5))
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -316,6 +316,196 @@ class DispatcherWithSendTests_UsePoll(DispatcherWithSendTests):
     usepoll = True
 
 
+def tcp_socketpair():
+    serv = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    try:
+        serv.bind((HOST, 0))
+        serv.listen(1)
+        a = socket.create_connection(serv.getsockname())
+        b, addr = serv.accept()
+    finally:
+        serv.close()
+    return a, b
+
+class pairdispatcher(asynclib.Dispatcher):
+
+    def __init__(self, sock, map):
+        super(pairdispatcher, self).__init__(sock, map)
+        self.received = []
+        self.out_buffer = b''
+        self.checks = 0
+
+    def handle_read(self):
+        self.received.append(self.recv(1024))
+
+    def handle_write(self):
+        self.out_buffer = self.out_buffer[self.send(self.out_buffer):]
+        self.update_interest()
+
+    def writable(self):
+        self.checks += 1
+        return bool(self.out_buffer)
+
+    def write(self, data):
+        self.out_buffer += data
+        self.update_interest()
+
+
+class SelectorPollerTests(unittest.TestCase):
+
+    def setUp(self):
+        if asynclib.selectors is None:
+            self.skipTest('selectors module is not available')
+        self.map = {}
+        self.poller = asynclib.SelectorPoller()
+        a, b = tcp_socketpair()
+        self.a = pairdispatcher(a, self.map)
+        self.b = pairdispatcher(b, self.map)
+
+    def tearDown(self):
+        asynclib.close_all(self.map)
+        self.poller.close()
+
+    def test_transfer(self):
+        self.a.write(b'foo')
+        asynclib.loop(0.01, self.map, [], 5, poller=self.poller)
+        self.assertEqual(self.b.received, [b'foo'])
+        self.assertEqual(self.a.out_buffer, b'')
+
+    def test_modify_interest_on_change(self):
+        self.poller(0.01, self.map)
+        registry = self.poller.selector.get_map()
+        read = asynclib.selectors.EVENT_READ
+        write = asynclib.selectors.EVENT_WRITE
+        self.assertEqual(registry[self.a._fileno].events, read)
+        self.a.write(b'foo')
+        self.poller(0.01, self.map)
+        self.assertEqual(registry[self.a._fileno].events, read | write)
+
+    def test_check_changed_channels_only(self):
+        self.poller(0.01, self.map)
+        self.assertEqual((self.a.checks, self.b.checks), (1, 1))
+        self.poller(0.01, self.map)
+        self.assertEqual((self.a.checks, self.b.checks), (1, 1))
+        self.a.write(b'foo')
+        self.poller(0.01, self.map)
+        self.assertEqual((self.a.checks, self.b.checks), (2, 1))
+
+    def test_register_new_channel(self):
+        self.poller(0.01, self.map)
+        a, b = tcp_socketpair()
+        c = pairdispatcher(a, self.map)
+        d = pairdispatcher(b, self.map)
+        c.write(b'foo')
+        asynclib.loop(0.01, self.map, [], 5, poller=self.poller)
+        self.assertEqual(d.received, [b'foo'])
+
+    def test_unregister_closed(self):
+        self.poller(0.01, self.map)
+        fileno = self.a._fileno
+        self.a.close()
+        self.poller(0.01, self.map)
+        self.assertTrue(fileno not in self.poller.selector.get_map())
+        self.assertEqual(len(self.poller.selector.get_map()), 1)
+
+
+class fakesocket(object):
+
+    def __init__(self, limit=None):
+        self.limit = limit
+        self.calls = []
+        self.data = b''
+
+    def _accept(self, data):
+        if self.limit is not None:
+            data = data[:self.limit - len(self.data)]
+        self.data += data
+        return len(data)
+
+    def send(self, data):
+        data = memoryview(data).tobytes()
+        self.calls.append([data])
+        return self._accept(data)
+
+    def sendmsg(self, buffers):
+        self.calls.append([memoryview(item).tobytes() for item in buffers])
+        return self._accept(b''.join(self.calls[-1]))
+
+
+class AsyncChatPushTests(unittest.TestCase):
+
+    def setUp(self):
+        self.map = {}
+        a, b = tcp_socketpair()
+        self.chat = asynclib.AsyncChat(a, map=self.map)
+        self.chat.send_buffer_size = 7
+        self.peer = pairdispatcher(b, self.map)
+
+    def tearDown(self):
+        asynclib.close_all(self.map)
+
+    def make_chat(self, sock):
+        chat = asynclib.AsyncChat()
+        chat.socket = sock
+        chat.addr = (HOST, 0)
+        chat.connected = True
+        return chat
+
+    @unittest.skipIf(not asynclib.HAS_SENDMSG, 'sendmsg is not available')
+    def test_gather_items(self):
+        sock = fakesocket()
+        chat = self.make_chat(sock)
+        chat.outbox.extend([b'foo', b'bar', b'baz'])
+        chat.flush()
+        self.assertEqual(sock.calls, [[b'foo', b'bar', b'baz']])
+        self.assertEqual(len(chat.outbox), 0)
+
+    def test_partial_send(self):
+        sock = fakesocket(limit=4)
+        chat = self.make_chat(sock)
+        chat.outbox.extend([b'foo', b'bar', b'baz'])
+        chat.flush()
+        self.assertEqual(sock.data, b'foob')
+        self.assertEqual(list(chat.outbox), [b'bar', b'baz'])
+        self.assertTrue(chat.writable())
+        sock.limit = None
+        chat.handle_write()
+        self.assertEqual(sock.data, b'foobarbaz')
+        self.assertEqual(len(chat.outbox), 0)
+        if asynclib.HAS_SENDMSG:
+            self.assertEqual(sock.calls[-1], [b'ar', b'baz'])
+
+    def test_adaptive_send_size(self):
+        sock = fakesocket()
+        chat = self.make_chat(sock)
+        chat.send_buffer_size = 4
+        chat.push(b'x' * 30)
+        self.assertEqual([len(call[0]) for call in sock.calls],
+                         [4, 8, 16, 2])
+        self.assertEqual(sock.data, b'x' * 30)
+        sock.limit = 33
+        chat.push(b'y' * 30)
+        self.assertEqual(chat._send_size, 4)
+        self.assertEqual(len(chat.outbox), 1)
+
+    def test_close_when_done(self):
+        sock = fakesocket()
+        chat = self.make_chat(sock)
+        chat.handle_close = lambda: setattr(chat, 'connected', False)
+        chat.outbox.extend([b'foo', None, b'bar'])
+        chat.flush()
+        self.assertEqual(sock.data, b'foo')
+        self.assertFalse(chat.connected)
+
+    def test_push_buffer_views(self):
+        buf = bytearray(b'foo bar baz ' * 10)
+        view = memoryview(buf)
+        self.chat.push(view[:60])
+        self.chat.push(view[60:])
+        asynclib.loop(0.01, self.map, [], 10)
+        self.assertEqual(b''.join(self.peer.received), bytes(buf))
+
+
 class CallLaterTests(unittest.TestCase):
     """Tests for CallLater class."""
 
@@ -388,9 +578,40 @@ class CallLaterTests(unittest.TestCase):
 
 
 
+class TimingWheelCallLaterTests(CallLaterTests):
+    """Tests for CallLater class with timing wheel as tasks container."""
+
+    def setUp(self):
+        asynclib.close_all()
+        self.tasks = asynclib._SCHEDULED_TASKS
+        asynclib.set_default_tasks(asynclib.TimingWheel(0.001, 16))
+
+    def tearDown(self):
+        asynclib.close_all()
+        asynclib._SCHEDULED_TASKS = self.tasks
+
+    def test_long_timeout(self):
+        l = []
+        asynclib.call_later(0.05, l.append, 0.05)
+        asynclib.call_later(0.001, l.append, 0.001).delay(0.03)
+        x = asynclib.call_later(0.01, l.append, 0.01)
+        self.scheduler(0.005)
+        self.assertEqual(l, [0.01, 0.001, 0.05])
+        self.assertEqual(len(asynclib._SCHEDULED_TASKS), 0)
+        self.assertRaises(AssertionError, x.cancel)
+
+    def test_close_all(self):
+        x = asynclib.call_later(1, lambda: 0)
+        asynclib.close_all()
+        self.assertTrue(x.cancelled)
+        self.assertEqual(len(asynclib._SCHEDULED_TASKS), 0)
+
+
 def test_main():
     tests = [HelperFunctionTests, DispatcherTests, DispatcherWithSendTests,
-             CallLaterTests, DispatcherWithSendTests_UsePoll]
+             CallLaterTests, DispatcherWithSendTests_UsePoll,
+             SelectorPollerTests, TimingWheelCallLaterTests,
+             AsyncChatPushTests]
 
     run_unittest(*tests)
 
@@ -0,0 +1,149 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+import os
+import shutil
+import sys
+import tempfile
+import unittest
+from io import BytesIO
+from astm import asynclib, benchmarks, codec
+from astm.benchmarks import corpus
+from astm.benchmarks.loopback import LatencyStats, run_loopback
+from astm.omnilab import server as omnilab
+
+
+class CorpusTestCase(unittest.TestCase):
+
+    def test_omnilab_session(self):
+        message = corpus.omnilab_session(patients=2, results=3)
+        seq, records, cs = codec.decode_message(message, 'latin-1')
+        self.assertEqual([record[0] for record in records],
+                         list('HPORRRCPORRRCL'))
+        for record in records:
+            omnilab.RecordsDispatcher().wrap(record)
+
+    def test_bulk_message(self):
+        message = corpus.bulk_message(10000)
+        self.assertTrue(len(message) >= 10000)
+        self.assertTrue(codec.verify_checksum(message))
+
+    def test_chunked_frames(self):
+        message = corpus.bulk_message(2000)
+        chunks = corpus.chunked_frames(message)
+        self.assertTrue(all(len(chunk) <= 247 for chunk in chunks))
+        self.assertEqual(codec.join(chunks), message)
+
+    def test_transcript(self):
+        data = corpus.transcript(sessions=2, patients=3, results=2,
+                                 chunk_size=64)
+        messages = list(codec.iter_decode_stream(BytesIO(data), 'latin-1'))
+        self.assertEqual(len(messages), 10)
+        self.assertEqual(messages[0][1][0][0], 'H')
+        self.assertEqual(messages[-1][1][0][0], 'L')
+
+
+class BenchmarksTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def results(self, **timings):
+        return {'meta': {}, 'benchmarks': dict(
+            (name, {'best': value, 'median': value})
+            for name, value in timings.items())}
+
+    def test_time_func(self):
+        calls = []
+        result = benchmarks.time_func(lambda: calls.append(1), repeat=3,
+                                      min_time=0.001)
+        self.assertEqual(result['repeat'], 3)
+        self.assertTrue(len(calls) > result['number'] * 3)
+        self.assertTrue(0 < result['best'] <= result['median'])
+
+    def test_all_benchmarks_run(self):
+        for name, factory in benchmarks.BENCHMARKS:
+            factory()()
+
+    def test_run_filtered(self):
+        seen = []
+        results = benchmarks.run(['checksum'], repeat=1, min_time=0.001,
+                                 callback=lambda name, res: seen.append(name))
+        self.assertEqual(list(results['benchmarks']), ['codec.make_checksum'])
+        self.assertEqual(seen, ['codec.make_checksum'])
+        self.assertTrue('python' in results['meta'])
+
+    def test_compare(self):
+        base = self.results(foo=1.0, bar=1.0, baz=1.0)
+        current = self.results(foo=1.05, bar=1.5, qux=1.0)
+        report = benchmarks.compare(base, current, threshold=0.1)
+        self.assertEqual([(item[0], item[4]) for item in report],
+                         [('bar', True), ('foo', False)])
+        self.assertAlmostEqual(report[0][3], 0.5)
+
+    def test_save_load(self):
+        path = os.path.join(self.tmpdir, 'base.json')
+        results = self.results(foo=1.0)
+        benchmarks.save(results, path)
+        self.assertEqual(benchmarks.load(path), results)
+
+    def test_compare_command(self):
+        base = os.path.join(self.tmpdir, 'base.json')
+        current = os.path.join(self.tmpdir, 'current.json')
+        benchmarks.save(self.results(foo=1.0), base)
+        benchmarks.save(self.results(foo=1.2), current)
+        stdout = sys.stdout
+        sys.stdout = open(os.devnull, 'w')
+        try:
+            self.assertEqual(benchmarks.main(['compare', base, current]), 1)
+            self.assertEqual(benchmarks.main(['compare', base, current,
+                                              '--threshold', '0.3']), 0)
+        finally:
+            sys.stdout.close()
+            sys.stdout = stdout
+
+
+class LoopbackTestCase(unittest.TestCase):
+
+    def test_latency_stats(self):
+        stats = LatencyStats()
+        self.assertEqual(stats.summary(), {'count': 0})
+        for value in range(1, 1001):
+            stats.add(value / 1e6)
+        summary = stats.summary()
+        self.assertEqual(summary['count'], 1000)
+        self.assertAlmostEqual(summary['p50'], 500e-6)
+        self.assertAlmostEqual(summary['p99'], 990e-6)
+        self.assertAlmostEqual(summary['p999'], 999e-6)
+        self.assertEqual(summary['histogram'][:3], [(1, 1), (2, 1), (4, 2)])
+        self.assertEqual(summary['histogram'][-1], (1024, 488))
+
+    def test_run_loopback(self):
+        channels = set(asynclib._SOCKET_MAP)
+        result = run_loopback(clients=2, sessions=2, patients=1, results=2,
+                              chunk_size=64, timeout=10)
+        # each record is sent by own message, long ones are chunked
+        self.assertEqual(result['records'], 28)
+        self.assertTrue(result['frames'] > 28)
+        self.assertEqual(result['ack']['count'], result['frames'])
+        self.assertEqual(result['enq']['count'], 6)
+        self.assertEqual(set(asynclib._SOCKET_MAP), channels)
+
+    def test_run_loopback_bulk_mode(self):
+        result = run_loopback(clients=1, sessions=3, patients=2, results=2,
+                              bulk_mode=True, timeout=10)
+        self.assertEqual(result['records'], 36)
+        self.assertEqual(result['frames'], 3)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,105 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+import os
+import tempfile
+import unittest
+from astm import bulk, codec
+from astm.constants import ACK, ENQ, EOT, NAK
+from astm.server import BaseRecordsDispatcher
+
+
+class CountingDispatcher(BaseRecordsDispatcher):
+
+    def _default_handler(self, record):
+        pass
+
+
+class BulkTestCase(unittest.TestCase):
+
+    def setUp(self):
+        fd, self.path = tempfile.mkstemp()
+        self.expected = []
+        with os.fdopen(fd, 'wb') as f:
+            for idx in range(50):
+                records = [['H'], ['P', str(idx), 'x' * (idx % 7 * 10 + 1)],
+                           ['L']]
+                message = codec.encode_message(1, records, 'ascii')
+                f.write(ENQ + ACK)
+                for chunk in codec.split(message, 32):
+                    f.write(chunk + ACK)
+                f.write(EOT)
+                self.expected.append((1, records))
+
+    def tearDown(self):
+        os.remove(self.path)
+
+    def test_split_file(self):
+        size = os.path.getsize(self.path)
+        shards = bulk.split_file(self.path, 8)
+        self.assertTrue(1 < len(shards) <= 8)
+        self.assertEqual(shards[0][0], 0)
+        self.assertEqual(shards[-1][1], size)
+        for (_, stop), (start, _) in zip(shards, shards[1:]):
+            self.assertEqual(stop, start)
+        result = []
+        for start, stop in shards:
+            result.extend(bulk.decode_shard(self.path, start, stop, 'ascii'))
+        self.assertEqual(result, self.expected)
+
+    def test_skip_rejected_message_boundary(self):
+        with open(self.path, 'wb') as f:
+            for seq, records in self.expected:
+                message = codec.encode_message(seq, records, 'ascii')
+                f.write(message + NAK + message + ACK)
+        result = []
+        for start, stop in bulk.split_file(self.path, 16):
+            result.extend(bulk.decode_shard(self.path, start, stop, 'ascii'))
+        self.assertEqual(result, self.expected)
+
+    def test_split_file_without_boundaries(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'x' * 1000)
+        self.assertEqual(bulk.split_file(self.path, 4), [(0, 1000)])
+
+    def test_split_empty_file(self):
+        with open(self.path, 'wb'):
+            pass
+        self.assertEqual(bulk.split_file(self.path, 4), [(0, 0)])
+        self.assertEqual(list(bulk.iter_decode_file(self.path,
+                                                    processes=1)), [])
+
+    def test_single_process(self):
+        result = list(bulk.iter_decode_file(self.path, 'ascii',
+                                            processes=1, shards=10))
+        self.assertEqual(result, self.expected)
+
+    def test_worker_processes(self):
+        result = list(bulk.iter_decode_file(self.path, 'ascii',
+                                            processes=2, shards=10))
+        self.assertEqual(result, self.expected)
+
+    def test_shards_of_fixed_size(self):
+        origin = bulk.SHARD_SIZE
+        bulk.SHARD_SIZE = 256
+        try:
+            result = list(bulk.iter_decode_file(self.path, 'ascii',
+                                                processes=2))
+        finally:
+            bulk.SHARD_SIZE = origin
+        self.assertEqual(result, self.expected)
+
+    def test_dispatch_file(self):
+        count = bulk.dispatch_file(self.path, CountingDispatcher, 'ascii',
+                                   processes=2, shards=10)
+        self.assertEqual(count, 50)
+
+
+if __name__ == '__main__':
+    unittest.main()
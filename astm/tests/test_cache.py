@@ -0,0 +1,56 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+import unittest
+from astm.cache import LRUCache
+
+
+class LRUCacheTestCase(unittest.TestCase):
+
+    def test_get(self):
+        cache = LRUCache()
+        cache['foo'] = 'bar'
+        self.assertEqual(cache.get('foo'), 'bar')
+        self.assertEqual(cache.get('bar'), None)
+        self.assertEqual(cache.get('bar', 42), 42)
+
+    def test_evict_least_recently_used(self):
+        cache = LRUCache(3)
+        for key in 'abc':
+            cache[key] = key
+        cache.get('a')
+        cache['b'] = 'B'
+        cache['d'] = 'd'
+        self.assertEqual(len(cache), 3)
+        self.assertFalse('c' in cache)
+        cache['e'] = 'e'
+        self.assertFalse('a' in cache)
+        self.assertEqual(cache.get('b'), 'B')
+
+    def test_shrink(self):
+        cache = LRUCache(10)
+        for key in range(10):
+            cache[key] = key
+        cache.maxsize = 2
+        cache[10] = 10
+        self.assertEqual(len(cache), 2)
+        self.assertTrue(9 in cache)
+        self.assertTrue(10 in cache)
+
+    def test_clear(self):
+        cache = LRUCache(2)
+        cache['a'] = 1
+        cache.clear()
+        self.assertEqual(len(cache), 0)
+        cache['b'] = 2
+        self.assertEqual(cache.get('b'), 2)
+
+
+if __name__ == '__main__':
+    unittest.main()
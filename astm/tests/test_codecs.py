@@ -7,10 +7,13 @@
 # you should have received as part of this distribution.
 #
 
+import io
+import os
+import tempfile
 import unittest
 from astm import codec
 from astm.compat import u
-from astm.constants import STX, ETX, ETB, CR, LF, CRLF
+from astm.constants import STX, ETX, ETB, CR, LF, CRLF, ENQ, ACK, NAK, EOT
 
 def f(s, e='latin-1'):
     return u(s).format(STX=u(STX),
@@ -112,6 +115,155 @@ class DecodeRecordTestCase(unittest.TestCase):
         self.assertEqual(res, codec.decode_record(msg, 'utf8'))
 
 
+class FastDecodeRecordTestCase(unittest.TestCase):
+
+    def check(self, msg, encoding='ascii'):
+        res = codec.decode_record(msg, encoding)
+        self.assertEqual(res, codec.decode_record(msg, encoding, 'fast'))
+
+    def test_decode(self):
+        self.check(f('P|1|2776833|||ABC||||||||||||||||||||'))
+
+    def test_decode_with_components(self):
+        self.check(f('A|B^C^D^E|F'))
+        self.check(f('A^|^B|^'))
+
+    def test_decode_with_repeated_components(self):
+        self.check(f('A|B^C\\D^E|F'))
+        self.check(f('A|B\\C|D\\|\\'))
+        self.check(f('H|\\^&|||HOST^1.0.0|||||||P|E 1394-97|20091116104731'))
+
+    def test_decode_none_values_for_missed_ones(self):
+        self.check(f('A|||B'))
+        self.check(f('A|B^^C^D^^E|F'))
+        self.check(b'')
+
+    def test_decode_nonascii_chars_as_unicode(self):
+        self.check(f('привет|мир^!', 'utf8'), 'utf8')
+
+    def test_decode_message(self):
+        msg = codec.encode_message(1, [['A', [['B', 'C'], ['D']]]], 'ascii')
+        self.assertEqual(codec.decode(msg), codec.decode(msg, engine='fast'))
+
+    def test_fail_on_unknown_engine(self):
+        self.assertRaises(ValueError, codec.decode_record, b'A', 'ascii', 'foo')
+
+
+class LazyRecordTestCase(unittest.TestCase):
+
+    def check(self, msg, encoding='ascii'):
+        res = codec.decode_record(msg, encoding)
+        record = codec.decode_record(msg, encoding, 'lazy')
+        self.assertTrue(isinstance(record, codec.LazyRecord))
+        self.assertEqual(len(record), len(res))
+        self.assertEqual(record, res)
+        self.assertEqual(list(record), res)
+
+    def test_decode(self):
+        self.check(f('P|1|2776833|||ABC||||||||||||||||||||'))
+
+    def test_decode_with_components(self):
+        self.check(f('A|B^C^D^E|F'))
+        self.check(f('A^|^B|^'))
+
+    def test_decode_with_repeated_components(self):
+        self.check(f('A|B\\C|D\\|\\'))
+        self.check(f('H|\\^&|||HOST^1.0.0|||||||P|E 1394-97|20091116104731'))
+
+    def test_decode_none_values_for_missed_ones(self):
+        self.check(f('A|||B'))
+        self.check(f('A|B^^C^D^^E|F'))
+        self.check(b'')
+
+    def test_decode_nonascii_chars_as_unicode(self):
+        self.check(f('привет|мир^!', 'utf8'), 'utf8')
+
+    def test_decode_on_access(self):
+        record = codec.LazyRecord(f('R|1|^^^GLU|5.2|mmol/L'), 'ascii')
+        self.assertEqual(record[3], '5.2')
+        self.assertEqual(record._fields.count(codec._UNDECODED), 4)
+        self.assertEqual(record[-3], [None, None, None, 'GLU'])
+        self.assertEqual(record[:2], ['R', '1'])
+        self.assertRaises(IndexError, record.__getitem__, 5)
+
+    def test_decode_message(self):
+        msg = codec.encode_message(1, [['A', [['B', 'C'], ['D']]]], 'ascii')
+        self.assertEqual(codec.decode(msg), codec.decode(msg, engine='lazy'))
+
+
+class InternCacheTestCase(unittest.TestCase):
+
+    records = [f('H|\\^&|||HOST^1.0.0|||||||P|E 1394-97|20091116104731'),
+               f('R|1|^^^GLU|5.2|mmol/L||N||F'),
+               f('R|2|^^^GLU|5.2|mmol/L||N||F\\A|'),
+               f('C|1|L|very long comment text which is not cached|G'),
+               f('P|1|привет|мир^!', 'utf8')]
+
+    def setUp(self):
+        self.cache = codec.InternCache(size=64)
+        self.previous = codec.set_intern_cache(self.cache)
+
+    def tearDown(self):
+        codec.set_intern_cache(self.previous)
+
+    def test_same_result(self):
+        for engine in ('default', 'fast', 'lazy'):
+            for record in self.records:
+                encoding = 'utf8'
+                codec.set_intern_cache(None)
+                expected = codec.decode_record(record, encoding, engine)
+                codec.set_intern_cache(self.cache)
+                result = codec.decode_record(record, encoding, engine)
+                self.assertEqual(result, expected)
+
+    def test_reuse_values(self):
+        for engine in ('default', 'fast', 'lazy'):
+            first = codec.decode_record(self.records[1], 'ascii', engine)
+            second = codec.decode_record(self.records[2], 'ascii', engine)
+            self.assertTrue(first[0] is second[0])
+            self.assertTrue(first[2][3] is second[2][3])
+            self.assertTrue(first[4] is second[4])
+
+    def test_skip_long_values(self):
+        codec.decode_record(self.records[3], 'ascii', 'fast')
+        self.assertFalse(any(len(value) > self.cache.max_length
+                             for value in self.cache.values('ascii')))
+        self.assertTrue(self.cache.values('ascii'))
+
+    def test_values_by_encoding(self):
+        codec.decode_record(b'A', 'ascii')
+        codec.decode_record(b'A', 'utf8')
+        self.assertEqual(len(self.cache), 2)
+        self.cache.clear()
+        self.assertEqual(len(self.cache), 0)
+
+    def test_clear_policy(self):
+        cache = codec.InternCache(size=2)
+        for item in (b'a', b'b', b'c'):
+            cache.decode(item, 'ascii')
+        self.assertEqual(list(cache.values('ascii')), [b'c'])
+
+    def test_lru_policy(self):
+        cache = codec.InternCache(size=2, policy='lru')
+        for item in (b'a', b'b', b'a', b'c'):
+            cache.decode(item, 'ascii')
+        values = cache.values('ascii')
+        self.assertTrue(b'a' in values)
+        self.assertFalse(b'b' in values)
+        self.assertTrue(b'c' in values)
+        codec.set_intern_cache(cache)
+        self.assertEqual(codec.decode_record(self.records[1], 'ascii', 'fast'),
+                         ['R', '1', [None, None, None, 'GLU'], '5.2',
+                          'mmol/L', None, 'N', None, 'F'])
+
+    def test_unknown_policy(self):
+        self.assertRaises(ValueError, codec.InternCache, policy='foo')
+
+    def test_disabled_by_default(self):
+        codec.set_intern_cache(self.previous)
+        self.assertEqual(codec.get_intern_cache(), None)
+
+
 class EncodeTestCase(unittest.TestCase):
 
     def test_encode(self):
@@ -174,6 +326,49 @@ class EncodeTestCase(unittest.TestCase):
         self.assertEqual(res, list(codec.iter_encode(records, 'ascii')))
 
 
+class EncodeIntoTestCase(unittest.TestCase):
+
+    records = [['H', [['a', 'b'], ['c']], None, 'x'],
+               ['P', '1', 'abc' * 10],
+               ['L', '1']]
+
+    def frames(self, buf, offsets):
+        return [bytes(buf[start:stop]) for start, stop in offsets]
+
+    def test_encode(self):
+        buf = bytearray()
+        offsets = codec.encode_into(buf, self.records, 'ascii', seq=3)
+        self.assertEqual(self.frames(buf, offsets),
+                         [codec.encode_message(3, self.records, 'ascii')])
+
+    def test_encode_chunks(self):
+        for seq in (1, 6, 9):
+            for size in (8, 20, 64, 1000):
+                buf = bytearray()
+                offsets = codec.encode_into(buf, self.records, 'ascii',
+                                            seq, size)
+                self.assertEqual(self.frames(buf, offsets),
+                                 codec.encode(self.records, 'ascii',
+                                              size, seq))
+
+    def test_append_to_buffer(self):
+        buf = bytearray(b'foo')
+        offsets = codec.encode_into(buf, [['L']], 'ascii')
+        offsets += codec.encode_into(buf, [['H']], 'ascii', seq=2)
+        self.assertEqual(buf[:3], b'foo')
+        self.assertEqual(offsets[0][0], 3)
+        self.assertEqual(offsets[0][1], offsets[1][0])
+        self.assertEqual(len(buf), offsets[1][1])
+        for start, stop in offsets:
+            self.assertTrue(codec.verify_checksum(buf[start:stop]))
+
+    def test_encode_empty(self):
+        buf = bytearray()
+        offsets = codec.encode_into(buf, [], 'ascii')
+        self.assertEqual(self.frames(buf, offsets),
+                         [codec.encode_message(1, [], 'ascii')])
+
+
 class ChunkedEncodingTestCase(unittest.TestCase):
 
     def test_encode_chunky(self):
@@ -191,6 +386,22 @@ class ChunkedEncodingTestCase(unittest.TestCase):
         self.assertEqual(res[3], f('{STX}43|boo{CR}{ETX}33{CRLF}'))
         self.assertLessEqual(len(res[3]), 14)
 
+    def test_chunks_size_limit(self):
+        msg = codec.encode_message(1, [['A' * 30]], 'ascii')
+        for size in range(8, len(msg)):
+            chunks = list(codec.split(msg, size))
+            for chunk in chunks:
+                self.assertLessEqual(len(chunk), size)
+                codec.decode_message(chunk, 'ascii')
+            self.assertEqual(codec.join(chunks), msg)
+
+    def test_split_into_buffer(self):
+        msg = codec.encode_message(1, [['A' * 30], ['B' * 20]], 'ascii')
+        res = list(codec.split(msg, 14))
+        buffer = bytearray(14)
+        for idx, chunk in enumerate(codec.split(msg, 14, buffer)):
+            self.assertTrue(isinstance(chunk, memoryview))
+            self.assertEqual(chunk.tobytes(), res[idx])
 
     def test_decode_chunks(self):
         recs = [['foo', 1], ['bar', 24], ['baz', [1, 2, 3], 'boo']]
@@ -216,6 +427,50 @@ class ChunkedEncodingTestCase(unittest.TestCase):
         self.assertFalse(codec.is_chunked_message(msg))
 
 
+class FrameParserTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.parser = codec.FrameParser()
+
+    def test_control_tokens(self):
+        res = list(self.parser.feed(f('\x05\x06\x15\x04')))
+        self.assertEqual(res, [b'\x05', b'\x06', b'\x15', b'\x04'])
+
+    def test_message(self):
+        msg = f('{STX}1A|B|C|D{CR}{ETX}BF{CRLF}')
+        self.assertEqual(list(self.parser.feed(msg + b'\x04')),
+                         [msg, b'\x04'])
+        self.assertEqual(len(self.parser), 0)
+
+    def test_fragmented_message(self):
+        msg = f('{STX}1A|B|C|D{CR}{ETX}BF{CRLF}')
+        stream = b'\x05' + msg + msg + b'\x04'
+        res = []
+        for idx in range(len(stream)):
+            res.extend(self.parser.feed(stream[idx:idx + 1]))
+        self.assertEqual(res, [b'\x05', msg, msg, b'\x04'])
+
+    def test_wait_for_message_end(self):
+        msg = f('{STX}1A|B|C|D{CR}{ETX}BF{CR}')
+        self.assertEqual(list(self.parser.feed(msg)), [])
+        self.assertEqual(len(self.parser), len(msg))
+        self.assertEqual(list(self.parser.feed(f('{LF}'))), [msg + f('{LF}')])
+
+    def test_message_interrupted_by_eot(self):
+        res = list(self.parser.feed(f('{STX}1A|B\x04')))
+        self.assertEqual(res, [f('{STX}1A|B'), b'\x04'])
+
+    def test_unknown_data(self):
+        res = list(self.parser.feed(f('foo{STX}1A{CRLF}bar')))
+        self.assertEqual(res, [b'foo', f('{STX}1A{CRLF}'), b'bar'])
+
+    def test_clear(self):
+        self.parser.feed(f('{STX}1A|B'))
+        self.parser.clear()
+        self.assertEqual(len(self.parser), 0)
+        self.assertEqual(list(self.parser.feed(b'\x04')), [b'\x04'])
+
+
 class ChecksummTestCase(unittest.TestCase):
 
     def test_common(self):
@@ -229,6 +484,118 @@ class ChecksummTestCase(unittest.TestCase):
     def test_short(self):
         self.assertEqual(b'02', codec.make_checksum('\x02'))
 
+    def test_large(self):
+        msg = bytes(bytearray(range(256))) * 256 + b'\xff' * 7
+        self.assertEqual(b'F9', codec.make_checksum(msg))
+        self.assertEqual(sum(bytearray(msg)), codec.sum_bytes(msg))
+
+    def test_large_frame(self):
+        msg = codec.encode_message(1, [['R', '1', 'x' * 400]], 'latin-1')
+        self.assertTrue(len(msg) > 256)
+        value = sum(bytearray(msg[1:-4])) & 0xFF
+        self.assertEqual(msg[-4:-2], codec.CHECKSUM_TABLE[value])
+        self.assertTrue(codec.verify_checksum(msg))
+        self.assertTrue(codec.verify_checksum(memoryview(msg)))
+
+    def test_sum_buffers(self):
+        msg = b'x' * 1000
+        for data in (msg, bytearray(msg), memoryview(msg),
+                     memoryview(msg)[100:900]):
+            self.assertEqual(sum(bytearray(data)), codec.sum_bytes(data))
+
+    def test_table(self):
+        for value in range(256):
+            res = hex(value)[2:].upper().zfill(2).encode()
+            self.assertEqual(res, codec.CHECKSUM_TABLE[value])
+
+    def test_verify(self):
+        msg = f('{STX}1A|B|C|D{CR}{ETX}BF{CRLF}')
+        self.assertTrue(codec.verify_checksum(msg))
+        self.assertTrue(codec.verify_checksum(bytearray(msg)))
+        self.assertTrue(codec.verify_checksum(memoryview(msg)))
+        msg = f('{STX}1A|B|C|D{CR}{ETX}00{CRLF}')
+        self.assertFalse(codec.verify_checksum(msg))
+
+
+class DecodeStreamTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.records = [['H'], ['P', '1', 'x' * 40], ['L']]
+        message = codec.encode_message(2, self.records, 'ascii')
+        self.chunks = list(codec.split(message, 24))
+        self.stream = b''.join(
+            [ENQ, codec.encode_message(1, [['H'], ['L']], 'ascii'), ACK]
+            + self.chunks + [EOT])
+
+    def decode(self, data, **kwargs):
+        return list(codec.iter_decode_stream(io.BytesIO(data), 'ascii',
+                                             **kwargs))
+
+    def test_decode(self):
+        self.assertEqual(self.decode(self.stream, chunk_size=7),
+                         [(1, [['H'], ['L']]), (2, self.records)])
+
+    def test_decode_file(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        with os.fdopen(fd, 'wb') as f:
+            f.write(self.stream * 100)
+        result = list(codec.iter_decode_stream(path, 'ascii', chunk_size=50))
+        self.assertEqual(len(result), 200)
+        self.assertEqual(result[-1], (2, self.records))
+        with open(path, 'rb') as f:
+            result = list(codec.iter_decode_stream(f, 'ascii'))
+        self.assertEqual(len(result), 200)
+
+    def test_decode_empty_file(self):
+        fd, path = tempfile.mkstemp()
+        self.addCleanup(os.remove, path)
+        os.close(fd)
+        self.assertEqual(list(codec.iter_decode_stream(path)), [])
+
+    def test_drop_interrupted_chunks(self):
+        data = b''.join(self.chunks[:2] + [EOT] + self.chunks)
+        self.assertEqual(self.decode(data), [(2, self.records)])
+
+    def test_checksum_failure(self):
+        message = codec.encode_message(1, [['H']], 'ascii')
+        data = message[:-4] + b'00' + CRLF + self.stream
+        self.assertRaises(ValueError, self.decode, data)
+        self.assertEqual(len(self.decode(data, skip_invalid=True)), 2)
+
+    def test_frame_header_across_chunks(self):
+        for size in range(1, 30):
+            self.assertEqual(self.decode(self.stream, chunk_size=size),
+                             [(1, [['H'], ['L']]), (2, self.records)])
+
+    def test_invalid_frame_number(self):
+        body = b'XL|1' + CR + ETX
+        frame = STX + body + codec.make_checksum(body) + CRLF
+        data = self.chunks[0] + frame
+        self.assertRaises(ValueError, self.decode, data)
+        self.assertEqual(self.decode(data, skip_invalid=True), [])
+
+    def test_nak_retransmission(self):
+        message = codec.encode_message(1, [['H'], ['L']], 'ascii')
+        transcript = [ENQ, ACK, message, NAK, message, ACK]
+        for chunk in self.chunks:
+            transcript.extend([chunk, NAK, chunk, ACK])
+        transcript.append(EOT)
+        data = b''.join(transcript)
+        for size in (3, 7, 65536):
+            self.assertEqual(self.decode(data, chunk_size=size),
+                             [(1, [['H'], ['L']]), (2, self.records)])
+
+    def test_drop_rejected_frame(self):
+        message = codec.encode_message(1, [['H'], ['L']], 'ascii')
+        data = b''.join([message, NAK, EOT] + self.chunks + [NAK])
+        self.assertEqual(self.decode(data), [])
+
+    def test_lazy_engine(self):
+        result = self.decode(self.stream, engine='lazy')
+        self.assertTrue(isinstance(result[0][1][0], codec.LazyRecord))
+        self.assertEqual(result[1], (2, self.records))
+
 
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,220 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+import os
+import shutil
+import tempfile
+import time
+import unittest
+from astm import asynclib, codec, constants
+from astm.journal import Journal
+from astm.server import RequestHandler, Server
+from astm.tests.utils import DummyMixIn
+
+
+class DummyRequestHandler(DummyMixIn, RequestHandler):
+
+    def __init__(self, dispatcher, journal):
+        RequestHandler.__init__(self, None, dispatcher, journal=journal)
+        self.connected = True
+        self.outbox = []
+
+    def push(self, data):
+        self.outbox.append(data)
+
+
+class JournalTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'journal')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_append(self):
+        journal = Journal(self.path, commit_window=0)
+        results = []
+        journal.append(b'foo', results.append)
+        journal.append(b'bar\nbaz', results.append)
+        self.assertEqual(results, [True, True])
+        journal.close()
+        journal = Journal(self.path)
+        self.assertEqual(list(journal), [b'foo', b'bar\nbaz'])
+        self.assertEqual(len(journal), 2)
+        journal.close()
+
+    def test_group_commit(self):
+        journal = Journal(self.path, commit_window=0.01)
+        results = []
+        journal.append(b'foo', results.append)
+        journal.append(b'bar', results.append)
+        self.assertEqual(results, [])
+        time.sleep(0.02)
+        asynclib.scheduler()
+        self.assertEqual(results, [True, True])
+        journal.close()
+
+    def test_commit_on_max_batch(self):
+        journal = Journal(self.path, commit_window=10, max_batch=2)
+        results = []
+        journal.append(b'foo', results.append)
+        self.assertEqual(results, [])
+        journal.append(b'bar', results.append)
+        self.assertEqual(results, [True, True])
+        self.assertEqual(journal._timer, None)
+        journal.close()
+
+    def test_drop_broken_tail(self):
+        journal = Journal(self.path, commit_window=0)
+        journal.append(b'foo')
+        journal.append(b'bar')
+        journal.close()
+        size = os.path.getsize(self.path)
+        with open(self.path, 'r+b') as f:
+            f.truncate(size - 2)
+        journal = Journal(self.path, commit_window=0)
+        self.assertEqual(list(journal), [b'foo'])
+        journal.append(b'baz')
+        self.assertEqual(list(journal), [b'foo', b'baz'])
+        journal.close()
+
+    def test_drop_corrupted_entry(self):
+        journal = Journal(self.path, commit_window=0)
+        journal.append(b'foo')
+        journal.append(b'bar')
+        journal.close()
+        with open(self.path, 'r+b') as f:
+            f.seek(-3, os.SEEK_END)
+            f.write(b'X')
+        journal = Journal(self.path)
+        self.assertEqual(list(journal), [b'foo'])
+        journal.close()
+
+    def test_replay(self):
+        journal = Journal(self.path, commit_window=0)
+        journal.append(b'foo')
+        journal.append(b'bar')
+        dispatched = []
+        self.assertEqual(journal.replay(dispatched.append), 2)
+        self.assertEqual(dispatched, [b'foo', b'bar'])
+        journal.close()
+
+    def test_checkpoint(self):
+        journal = Journal(self.path, commit_window=0)
+        journal.append(b'foo')
+        journal.checkpoint()
+        self.assertEqual(list(journal), [])
+        journal.append(b'bar')
+        self.assertEqual(list(journal), [b'bar'])
+        journal.close()
+
+    def test_sync(self):
+        journal = Journal(self.path, commit_window=0.01)
+        results = []
+        journal.sync(results.append)
+        self.assertEqual(results, [True])
+        journal.append(b'foo')
+        journal.sync(results.append)
+        self.assertEqual(results, [True])
+        journal.commit()
+        self.assertEqual(results, [True, True])
+        journal.sync(results.append)
+        self.assertEqual(results, [True, True, True])
+        journal.close()
+
+    def test_keep_replayed_messages(self):
+        message = codec.encode_message(1, [['H'], ['P', '1']], 'ascii')
+        journal = Journal(self.path, commit_window=0)
+        journal.append(message)
+        server = Server('127.0.0.1', 0, journal=journal)
+        server.close()
+        self.assertEqual(list(journal), [message])
+        journal.close()
+
+    @unittest.skipIf(not hasattr(os, 'fork'), 'os.fork is not available')
+    def test_reject_workers(self):
+        journal = Journal(self.path, commit_window=0)
+        self.addCleanup(journal.close)
+        server = Server('127.0.0.1', 0, journal=journal)
+        self.addCleanup(server.close)
+        self.assertRaises(RuntimeError, server.serve_workers, 1)
+
+    def test_write_ahead(self):
+        journal = Journal(self.path, commit_window=0.01)
+        stored = []
+        req = DummyRequestHandler(lambda message: stored.extend(journal),
+                                  journal)
+        req.on_enq()
+        message = codec.encode_message(1, [['H'], ['L']], 'ascii')
+        req._last_recv_data = message
+        self.assertEqual(req.on_message(), None)
+        self.assertEqual(stored, [message])
+        journal.close()
+
+    def test_ack_after_commit(self):
+        journal = Journal(self.path, commit_window=0.01)
+        dispatched = []
+        req = DummyRequestHandler(dispatched.append, journal)
+        self.assertEqual(req.on_enq(), constants.ACK)
+        message = codec.encode_message(1, [['H'], ['L']], 'ascii')
+        req._last_recv_data = message
+        self.assertEqual(req.on_message(), None)
+        self.assertEqual(dispatched, [message])
+        self.assertEqual(req.outbox, [])
+        journal.commit()
+        self.assertEqual(req.outbox, [constants.ACK])
+        self.assertEqual(list(journal), [message])
+        journal.close()
+
+    def test_store_joined_chunks(self):
+        journal = Journal(self.path, commit_window=0)
+        req = DummyRequestHandler(lambda message: None, journal)
+        req.on_enq()
+        message = codec.encode([['H'], ['P', '1'], ['L']], 'ascii', size=16)
+        for chunk in message:
+            req._last_recv_data = chunk
+            resp = req.on_message()
+            if resp is not None:
+                req.outbox.append(resp)
+        self.assertEqual(req.outbox, [constants.ACK] * len(message))
+        self.assertEqual(list(journal), [codec.join(message)])
+        journal.close()
+
+    def test_nak_failed_message(self):
+        def dispatcher(message):
+            raise ValueError('boom')
+        journal = Journal(self.path, commit_window=0)
+        req = DummyRequestHandler(dispatcher, journal)
+        req.on_enq()
+        message = codec.encode_message(1, [['H']], 'ascii')
+        req._last_recv_data = message
+        self.assertEqual(req.on_message(), constants.NAK)
+        # message was stored ahead and would be replayed
+        self.assertEqual(list(journal), [message])
+        journal.close()
+
+    def test_nak_unstored_message(self):
+        dispatched = []
+        class BrokenFile(object):
+            def write(self, data):
+                raise IOError('No space left on device')
+        journal = Journal(self.path, commit_window=0)
+        origin, journal._file = journal._file, BrokenFile()
+        req = DummyRequestHandler(dispatched.append, journal)
+        req.on_enq()
+        req._last_recv_data = codec.encode_message(1, [['H']], 'ascii')
+        self.assertEqual(req.on_message(), constants.NAK)
+        self.assertEqual(dispatched, [])
+        journal._file = origin
+        journal.close()
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -7,11 +7,12 @@
 # you should have received as part of this distribution.
 #
 
+import copy
 import datetime
 import decimal
 import unittest
 import warnings
-from astm import mapping
+from astm import codec, mapping, records
 from astm.compat import u
 
 class FieldTestCase(unittest.TestCase):
@@ -185,6 +186,12 @@ class DateFieldTestCase(unittest.TestCase):
         obj.field = '20090213'
         self.assertRaises(ValueError, setattr, obj, 'field', '1234567')
 
+    def test_parse_fixed_width_value(self):
+        value = mapping.parse_datetime('20090213', '%Y%m%d')
+        self.assertEqual(value, self.date)
+        self.assertRaises(ValueError, mapping.parse_datetime,
+                          '20091313', '%Y%m%d')
+
 
 class TimeFieldTestCase(unittest.TestCase):
 
@@ -224,6 +231,11 @@ class TimeFieldTestCase(unittest.TestCase):
         obj.field = '111213'
         self.assertRaises(ValueError, setattr, obj, 'field', '314159')
 
+    def test_parse_fixed_width_value(self):
+        self.assertEqual(mapping.parse_time('233130'), self.time)
+        self.assertEqual(mapping.parse_time('233130.25'), self.time)
+        self.assertRaises(ValueError, mapping.parse_time, '243130')
+
 
 class DatetimeFieldTestCase(unittest.TestCase):
 
@@ -263,6 +275,82 @@ class DatetimeFieldTestCase(unittest.TestCase):
         obj.field = '20090213233130'
         self.assertRaises(ValueError, setattr, obj, 'field', '12345678901234')
 
+    def test_parse_fixed_width_value(self):
+        for value in ['20090213233130', '19991231000000', '20120229120000']:
+            self.assertEqual(
+                mapping.parse_datetime(value),
+                datetime.datetime.strptime(value, '%Y%m%d%H%M%S'))
+        self.assertRaises(ValueError, mapping.parse_datetime, '20090230000000')
+
+    def test_parse_with_custom_format(self):
+        class Dummy(mapping.Mapping):
+            field = mapping.DateTimeField()
+            field.format = '%Y-%m-%d %H:%M'
+        obj = Dummy(field='2009-02-13 23:31')
+        self.assertEqual(obj.field, datetime.datetime(2009, 2, 13, 23, 31))
+        self.assertEqual(obj._data['field'], '2009-02-13 23:31')
+
+    def test_format_value(self):
+        for value in [self.datetime, self.date,
+                      datetime.datetime(1901, 2, 3, 4, 5, 6)]:
+            self.assertEqual(
+                mapping.format_datetime(value, '%Y%m%d%H%M%S'),
+                value.strftime('%Y%m%d%H%M%S'))
+
+    def test_parsed_values_cache(self):
+        cache = mapping.datetime_cache
+        maxsize = cache.maxsize
+        try:
+            cache.clear()
+            cache.maxsize = 2
+            first = mapping.parse_datetime('20090213233130')
+            self.assertTrue(mapping.parse_datetime('20090213233130') is first)
+            mapping.parse_datetime('20090213233131')
+            mapping.parse_datetime('20090213233132')
+            self.assertEqual(len(cache), 2)
+            self.assertFalse(mapping.parse_datetime('20090213233130') is first)
+        finally:
+            cache.maxsize = maxsize
+
+
+class MemoizedFieldTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Field(mapping.Field):
+            calls = 0
+            def _get_value(self, value):
+                Field.calls += 1
+                return value.upper()
+        self.Field = Field
+        self.Dummy = mapping.Mapping.build(
+            Field(name='field', memoize=True, default='x'),
+            Field(name='plain')
+        )
+
+    def test_memoize(self):
+        obj = self.Dummy(field='foo', plain='bar')
+        self.assertEqual(obj.field, 'FOO')
+        self.assertEqual(obj.field, 'FOO')
+        self.assertEqual(self.Field.calls, 1)
+        obj.plain, obj.plain
+        self.assertEqual(self.Field.calls, 3)
+
+    def test_reset_on_change(self):
+        obj = self.Dummy(field='foo')
+        self.assertEqual(obj.field, 'FOO')
+        obj.field = 'bar'
+        self.assertEqual(obj.field, 'BAR')
+        del obj[0]
+        self.assertEqual(obj.field, 'x')
+
+    def test_memoize_datetime_field(self):
+        class Dummy(mapping.Mapping):
+            compact = True
+            field = mapping.DateTimeField(memoize=True)
+        obj = Dummy(field='20090213233130')
+        self.assertTrue(obj.field is obj.field)
+        self.assertEqual(obj.to_astm(), ['20090213233130'])
+
 
 class ConstantFieldTestCase(unittest.TestCase):
 
@@ -720,5 +808,163 @@ class MappingTestCase(unittest.TestCase):
         self.assertRaises(ValueError, setattr, obj, 'field', '-' * 11)
 
 
+
+class CompactMappingTestCase(unittest.TestCase):
+
+    def setUp(self):
+        class Compact(mapping.Record):
+            compact = True
+        self.Dummy = Compact.build(
+            mapping.Field(name='foo', default='bar'),
+            mapping.ComponentField(name='bar', mapping=mapping.Component.build(
+                mapping.IntegerField(name='a'),
+                mapping.IntegerField(name='b'),
+            )),
+            mapping.IntegerField(name='baz')
+        )
+
+    def test_no_instance_dict(self):
+        obj = self.Dummy()
+        self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertRaises(AttributeError, setattr, obj, 'boo', 42)
+
+    def test_positional_storage(self):
+        obj = self.Dummy('foo', [1, 2], 42)
+        self.assertTrue(isinstance(obj._data, mapping.CompactStorage))
+        self.assertEqual(list(obj._data)[::2], ['foo', '42'])
+
+    def test_mapping_api(self):
+        obj = self.Dummy('foo', [1, 2], 42)
+        self.assertEqual(obj.keys(), ['foo', 'bar', 'baz'])
+        self.assertEqual(obj.items()[2], ('baz', 42))
+        self.assertEqual(obj[0], 'foo')
+        self.assertEqual(len(obj), 3)
+        obj[2] = 24
+        self.assertEqual(obj.baz, 24)
+        del obj[2]
+        self.assertEqual(obj.baz, None)
+        self.assertEqual(obj.to_astm(), ['foo', ['1', '2'], None])
+
+    def test_inherited(self):
+        class Thing(self.Dummy):
+            boo = mapping.Field()
+        obj = Thing(boo='boo')
+        self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertEqual(obj.to_astm(), ['bar', [None, None], None, 'boo'])
+
+    def test_built(self):
+        Thing = self.Dummy.build(mapping.Field(name='boo'))
+        obj = Thing('boo')
+        self.assertFalse(hasattr(obj, '__dict__'))
+        self.assertEqual(obj.to_astm(), ['boo'])
+
+    def test_shared_fields(self):
+        Thing = self.Dummy.build(mapping.Field(name='boo'), self.Dummy.foo)
+        self.assertFalse(Thing.foo is self.Dummy.foo)
+        self.assertEqual(Thing('boo', 'foo').foo, 'foo')
+        self.assertEqual(self.Dummy('foo').foo, 'foo')
+        class Plain(self.Dummy):
+            compact = False
+        obj = Plain('foo', [1, 2], 42)
+        self.assertTrue(isinstance(obj._data, dict))
+        self.assertEqual(obj.baz, 42)
+        self.assertEqual(obj.to_astm(), ['foo', ['1', '2'], '42'])
+
+    def test_from_bytes(self):
+        obj = self.Dummy.from_bytes(b'foo|1^2|42')
+        self.assertEqual(obj, self.Dummy('foo', [1, 2], 42))
+        self.assertEqual(obj.to_bytes(), b'foo|1^2|42')
+
+    def test_copy(self):
+        obj = self.Dummy('foo', [1, 2], 42)
+        self.assertEqual(copy.deepcopy(obj), obj)
+
+
+class RecordCodecTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.Dummy = mapping.Record.build(
+            mapping.ConstantField(name='type', default='D'),
+            mapping.IntegerField(name='seq', default=1, required=True),
+            mapping.ComponentField(name='bar', mapping=mapping.Component.build(
+                mapping.IntegerField(name='a'),
+                mapping.TextField(name='b'),
+            )),
+            mapping.RepeatedComponentField(
+                mapping.Component.build(
+                    mapping.IntegerField(name='a'),
+                    mapping.IntegerField(name='b')
+                ),
+                name='numbers'
+            ),
+            mapping.TextField(name='comment')
+        )
+
+    def test_from_bytes(self):
+        obj = self.Dummy.from_bytes(b'D|2|1^foo|4^2\\2^3|bar')
+        self.assertEqual(obj, self.Dummy('D', 2, [1, 'foo'], [[4, 2], [2, 3]],
+                                         'bar'))
+        self.assertEqual(obj.bar.b, 'foo')
+        self.assertEqual(obj.numbers[1].b, 3)
+
+    def test_from_bytes_defaults(self):
+        obj = self.Dummy.from_bytes(b'D')
+        self.assertEqual(obj.to_astm(), self.Dummy().to_astm())
+
+    def test_from_bytes_validates_values(self):
+        self.assertRaises(ValueError, self.Dummy.from_bytes, b'X|1')
+        self.assertRaises(TypeError, self.Dummy.from_bytes, b'D|foo')
+        self.assertRaises(ValueError, self.Dummy.from_bytes, b'D|1||||foo')
+
+    def test_to_bytes(self):
+        obj = self.Dummy(seq=2, bar=[1], numbers=[[4, 2], [2]], comment='foo')
+        self.assertEqual(obj.to_bytes(), b'D|2|1|4^2\\2|foo')
+        self.assertEqual(obj.to_bytes(),
+                         codec.encode_record(obj.to_astm(), 'latin-1'))
+
+    def test_to_bytes_required_field(self):
+        obj = self.Dummy()
+        obj.seq = None
+        self.assertRaises(ValueError, obj.to_bytes)
+
+    def test_compiled_codec_cached_per_class(self):
+        class Thing(self.Dummy):
+            extra = mapping.TextField()
+        self.Dummy.from_bytes(b'D')
+        self.assertEqual(Thing.from_bytes(b'D|1||||foo').extra, 'foo')
+        self.assertTrue(self.Dummy._compiled() is self.Dummy._compiled())
+        self.assertFalse(self.Dummy._compiled() is Thing._compiled())
+
+    def test_from_lazy(self):
+        record = codec.LazyRecord(b'D|2|1^foo|4^2\\2^3|bar', 'latin-1')
+        obj = self.Dummy.from_lazy(record)
+        self.assertEqual(obj.comment, 'bar')
+        self.assertEqual(record._fields.count(codec._UNDECODED), 4)
+        self.assertEqual(obj, self.Dummy.from_bytes(record.raw))
+        self.assertEqual(obj.to_bytes(), record.raw)
+
+    def test_from_lazy_validates_on_access(self):
+        obj = self.Dummy.from_lazy(codec.LazyRecord(b'D|foo', 'latin-1'))
+        self.assertEqual(obj.type, 'D')
+        self.assertRaises(TypeError, getattr, obj, 'seq')
+        self.assertRaises(ValueError, self.Dummy.from_lazy,
+                          codec.LazyRecord(b'D|1||||foo', 'latin-1'))
+
+    def test_from_lazy_assignment(self):
+        obj = self.Dummy.from_lazy(codec.LazyRecord(b'D|2', 'latin-1'))
+        obj.seq = 3
+        self.assertEqual(obj.seq, 3)
+        self.assertEqual(obj.to_astm(), ['D', '3', [None, None], [], None])
+        self.assertEqual(copy.deepcopy(obj), obj)
+
+    def test_records_parity(self):
+        for cls in (records.HeaderRecord, records.PatientRecord,
+                    records.OrderRecord, records.ResultRecord,
+                    records.CommentRecord, records.TerminatorRecord):
+            data = codec.encode_record(cls().to_astm(), 'latin-1')
+            self.assertEqual(cls().to_bytes(), data)
+            self.assertEqual(cls.from_bytes(data).to_bytes(), data)
+
+
 if __name__ == '__main__':
     unittest.main()
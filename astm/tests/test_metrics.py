@@ -0,0 +1,166 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+import socket
+import unittest
+from astm import asynclib, codec, constants, metrics
+from astm.client import DEFAULT_RECORDS_FLOW_MAP, Emitter
+from astm.server import BaseRecordsDispatcher, RequestHandler
+from astm.tests.utils import DummyMixIn
+
+
+class Dispatcher(BaseRecordsDispatcher):
+
+    def _default_handler(self, record):
+        pass
+
+
+class DummyRequestHandler(DummyMixIn, RequestHandler):
+
+    def __init__(self):
+        RequestHandler.__init__(self, None, Dispatcher())
+        self.outbox = []
+
+    def push(self, data):
+        self.outbox.append(data)
+
+
+class Channel(asynclib.Dispatcher):
+
+    def __init__(self, sock):
+        asynclib.Dispatcher.__init__(self, sock)
+        self.addr = ('localhost', 15200)
+        self.received = b''
+
+    def writable(self):
+        return False
+
+    def handle_read(self):
+        self.received += self.recv(1024)
+
+
+class RegistryTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.registry = metrics.Registry()
+
+    def test_counter(self):
+        counter = self.registry.counter('foo_total', 'Foo.')
+        counter.inc()
+        counter.inc(2)
+        self.assertEqual(counter.value(), 3)
+        self.assertEqual(self.registry.snapshot(), {'foo_total': 3})
+
+    def test_labeled_counter(self):
+        counter = self.registry.counter('foo_total', 'Foo.', 'kind')
+        counter.inc(1, 'a')
+        counter.inc(1, 'b')
+        counter.inc(1, 'a')
+        self.assertEqual(counter.snapshot(), {'a': 2, 'b': 1})
+
+    def test_histogram(self):
+        histogram = self.registry.histogram('foo', 'Foo.', (1, 10))
+        for value in (0, 1, 5, 100):
+            histogram.observe(value)
+        self.assertEqual(histogram.snapshot(), {
+            'count': 4, 'sum': 106,
+            'buckets': [(1, 2), (10, 3), (float('inf'), 4)]})
+
+    def test_register_existed(self):
+        counter = self.registry.counter('foo', 'Foo.')
+        self.assertTrue(self.registry.counter('foo', 'Foo.') is counter)
+        self.assertRaises(ValueError, self.registry.histogram, 'foo', 'Foo.')
+
+    def test_reset(self):
+        self.registry.counter('foo', 'Foo.').inc()
+        self.registry.histogram('bar', 'Bar.').observe(1)
+        self.registry.reset()
+        self.assertEqual(self.registry['foo'].value(), 0)
+        self.assertEqual(self.registry['bar'].snapshot()['count'], 0)
+
+    def test_prometheus(self):
+        self.registry.counter('foo_total', 'Foo.', 'kind').inc(2, 'a"b')
+        self.registry.histogram('bar_seconds', 'Bar.', (0.5,)).observe(0.25)
+        self.assertEqual(self.registry.to_prometheus(), '\n'.join([
+            '# HELP bar_seconds Bar.',
+            '# TYPE bar_seconds histogram',
+            'bar_seconds_bucket{le="0.5"} 1',
+            'bar_seconds_bucket{le="+Inf"} 1',
+            'bar_seconds_sum 0.25',
+            'bar_seconds_count 1',
+            '# HELP foo_total Foo.',
+            '# TYPE foo_total counter',
+            'foo_total{kind="a\\"b"} 2',
+            '']))
+
+
+class InstrumentationTestCase(unittest.TestCase):
+
+    def setUp(self):
+        metrics.reset()
+        metrics.enable()
+
+    def tearDown(self):
+        metrics.disable()
+        metrics.reset()
+
+    def test_disabled(self):
+        metrics.disable()
+        req = DummyRequestHandler()
+        req.dispatch(constants.ENQ)
+        self.assertEqual(metrics.PROTOCOL_TOKENS.snapshot(), {})
+
+    def test_request_handler(self):
+        req = DummyRequestHandler()
+        req.dispatch(constants.ENQ)
+        records = [['H'], ['P', '1', 'x' * 40], ['L']]
+        chunks = codec.encode(records, 'ascii', size=32)
+        for chunk in chunks:
+            req.dispatch(chunk)
+        req.dispatch(codec.encode_message(1, records, 'ascii'))
+        req.dispatch(constants.EOT)
+        self.assertEqual(metrics.PROTOCOL_TOKENS.snapshot(),
+                         {'enq': 1, 'message': len(chunks) + 1, 'eot': 1})
+        self.assertEqual(metrics.SERVER_CHUNKS.value(), len(chunks))
+        self.assertEqual(metrics.SERVER_MESSAGES.value(), 2)
+        self.assertEqual(metrics.SERVER_DECODE_TIME.snapshot()['count'], 2)
+        self.assertEqual(metrics.SERVER_DISPATCH_TIME.snapshot()['count'], 2)
+
+    def test_emitter(self):
+        def emitter():
+            yield ['H']
+            yield ['P', '1', 'x' * 40]
+            yield ['L']
+        emitter = Emitter(emitter, DEFAULT_RECORDS_FLOW_MAP, 'ascii',
+                          chunk_size=32)
+        sent = [emitter.send(None)]
+        while sent[-1] != constants.EOT:
+            sent.append(emitter.send(True))
+        self.assertEqual(metrics.CLIENT_RECORDS.value(), 3)
+        self.assertEqual(metrics.CLIENT_ENCODE_TIME.snapshot()['count'], 3)
+        chunks = metrics.CLIENT_CHUNKS.snapshot()
+        self.assertEqual(chunks['count'], 3)
+        self.assertEqual(chunks['sum'], len(sent) - 1)
+
+    def test_poll(self):
+        left, right = socket.socketpair()
+        channel = Channel(right)
+        try:
+            left.send(b'foo')
+            asynclib.poll(0.1, {channel._fileno: channel})
+        finally:
+            channel.close()
+            left.close()
+        self.assertEqual(channel.received, b'foo')
+        self.assertEqual(metrics.LOOP_READY.snapshot()['sum'], 1)
+        self.assertEqual(metrics.LOOP_TIME.snapshot()['count'], 1)
+
+
+if __name__ == '__main__':
+    unittest.main()
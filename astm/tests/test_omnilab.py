@@ -73,6 +73,8 @@ class OmnilabTestCase(unittest.TestCase):
     def test_order_request(self):
         data = 'O|1|12120001||^^^NA^Sodium\^^^Cl^Clorum|R|20011023105715|20011023105715||||N||||S|||CHIM|AXM|Lab1|12120||||O|||||LAB2'
         order = omnilab.client.Order(*decode_record(data))
+        self.assertEqual(order, omnilab.client.Order.from_bytes(data.encode()))
+        self.assertEqual(order.to_bytes(), encode_record(order.to_astm()))
         self.assertEqual(order.type, 'O')
         self.assertEqual(order.seq, 1)
         self.assertEqual(order.sample_id, '12120001')
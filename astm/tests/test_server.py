@@ -8,11 +8,27 @@
 #
 
 import os
+import shutil
+import signal
+import socket
+import subprocess
 import sys
+import tempfile
+import threading
+import time
 import unittest
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
 from astm.exceptions import NotAccepted, InvalidState
-from astm.server import RequestHandler, BaseRecordsDispatcher
-from astm import codec, constants, records
+from astm.journal import Journal
+from astm.server import (
+    RequestHandler, BaseRecordsDispatcher, BatchRecordsDispatcher,
+    DispatchPool, Server, SessionRecordsDispatcher
+)
+from astm import asynclib, codec, constants, records
+from astm.omnilab import server as omnilab
 from astm.tests.utils import DummyMixIn, track_call
 
 
@@ -104,12 +120,147 @@ class RequestHandlerTestCase(unittest.TestCase):
         self.assertEqual(self.req.outbox[-1], constants.NAK)
         self.assertEqual(self.req._input_buffer, '')
 
+    def test_handle_fragmented_message(self):
+        message = codec.encode([records.HeaderRecord().to_astm()])[0]
+        stream = [constants.ENQ + message[:5], message[5:-1],
+                  message[-1:] + constants.EOT]
+        self.req.recv = lambda size: stream.pop(0)
+        while stream:
+            self.req.handle_read()
+        self.assertEqual(self.req.dummy_dispatcher_called_time, 3)
+        self.assertEqual(list(self.req.outbox), [constants.ACK, constants.ACK])
+        self.assertTrue(self.req.dispatcher.was_called)
+
     def test_close_on_timeout(self):
         self.req.close = track_call(self.req.close)
         self.req.on_timeout()
         self.assertTrue(self.req.close.was_called)
 
 
+@unittest.skipIf(ThreadPoolExecutor is None,
+                 'concurrent.futures is not available')
+class DispatchPoolTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.map = {}
+        self.executor = ThreadPoolExecutor(4)
+        self.pool = DispatchPool(self.executor, max_pending=2, map=self.map)
+        self.lock = threading.Lock()
+        self.running = 0
+        self.max_running = 0
+        self.dispatched = []
+
+    def tearDown(self):
+        self.pool.close()
+        self.executor.shutdown()
+
+    def dispatcher(self, message):
+        with self.lock:
+            self.running += 1
+            self.max_running = max(self.max_running, self.running)
+        seq, records, cs = codec.decode_message(message, 'ascii')
+        time.sleep(0.01 * (3 - seq))
+        with self.lock:
+            self.running -= 1
+            self.dispatched.append(records[0][0])
+
+    def make_handler(self):
+        req = DummyRequestHandler(self.dispatcher)
+        req.pool = self.pool
+        req.connected = True
+        req.on_enq()
+        return req
+
+    def receive(self, req, seq, record):
+        req._last_recv_data = codec.encode_message(seq, [record], 'ascii')
+        return req.on_message()
+
+    def run_loop(self, *handlers):
+        count = 200
+        while count and any(req._queue for req in handlers):
+            asynclib.loop(0.01, self.map, [], 1)
+            count -= 1
+
+    def test_preserve_order(self):
+        req = self.make_handler()
+        self.assertEqual(self.receive(req, 1, ['H']), None)
+        self.assertEqual(self.receive(req, 2, ['P']), None)
+        self.assertEqual(list(req.outbox), [])
+        self.run_loop(req)
+        self.assertEqual(list(req.outbox), [constants.ACK, constants.ACK])
+        self.assertEqual(self.dispatched, ['H', 'P'])
+
+    def test_bound_pending_tasks(self):
+        handlers = [self.make_handler() for _ in range(6)]
+        for req in handlers:
+            self.receive(req, 1, ['H'])
+        self.assertEqual(self.pool.pending, 2)
+        self.run_loop(*handlers)
+        self.assertEqual(self.max_running, 2)
+        self.assertEqual(self.dispatched, ['H'] * 6)
+        for req in handlers:
+            self.assertEqual(list(req.outbox), [constants.ACK])
+
+    def test_reject_on_dispatch_error(self):
+        req = self.make_handler()
+        self.receive(req, 1, ['H'])
+        req._queue.append(b'|foo')
+        self.run_loop(req)
+        self.assertEqual(list(req.outbox), [constants.ACK, constants.NAK])
+
+    def test_ack_chunks_immediately(self):
+        req = self.make_handler()
+        message = codec.encode_message(1, [['H', 'x' * 20]], 'ascii')
+        chunks = list(codec.split(message, 12))
+        for chunk in chunks[:-1]:
+            req._last_recv_data = chunk
+            req.on_message()
+        self.assertEqual(list(req.outbox), [constants.ACK] * (len(chunks) - 1))
+        req._last_recv_data = chunks[-1]
+        req.on_message()
+        self.run_loop(req)
+        self.assertEqual(self.dispatched, ['H'])
+
+    def test_skip_closed_connection(self):
+        req = self.make_handler()
+        self.receive(req, 1, ['H'])
+        req.connected = False
+        self.run_loop(req)
+        self.assertEqual(list(req.outbox), [])
+
+    def test_executor_factory(self):
+        executors = []
+        def factory():
+            executors.append(ThreadPoolExecutor(2))
+            return executors[-1]
+        pool = DispatchPool(factory, map=self.map)
+        self.assertEqual(pool.executor, None)
+        req = self.make_handler()
+        req.pool = pool
+        self.receive(req, 1, ['H'])
+        self.run_loop(req)
+        self.assertEqual(list(req.outbox), [constants.ACK])
+        self.assertEqual(len(executors), 1)
+        pool._after_fork()
+        self.assertEqual(pool.executor, None)
+        pool.close()
+        executors[0].shutdown()
+
+    def test_journal_before_ack(self):
+        tmpdir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmpdir)
+        journal = Journal(os.path.join(tmpdir, 'journal'), commit_window=0)
+        req = self.make_handler()
+        req.journal = journal
+        self.receive(req, 1, ['H'])
+        self.receive(req, 2, ['P'])
+        self.run_loop(req)
+        self.assertEqual(list(req.outbox), [constants.ACK, constants.ACK])
+        self.assertEqual([codec.decode_message(message, 'ascii')[1][0][0]
+                          for message in journal], ['H', 'P'])
+        journal.close()
+
+
 class RecordsDispatcherTestCase(unittest.TestCase):
 
     def setUp(self):
@@ -171,12 +322,300 @@ class RecordsDispatcherTestCase(unittest.TestCase):
         self.dispatcher(message)
         self.assertTrue(self.dispatcher.dispatch['H'].was_called)
 
+    def test_lazy_engine(self):
+        received = []
+        message = codec.encode_message(1, [['H'], ['R', '1', 'GLU']], 'ascii')
+        self.dispatcher.engine = 'lazy'
+        self.dispatcher.wrappers['R'] = records.ResultRecord
+        self.dispatcher.dispatch['H'] = received.append
+        self.dispatcher.dispatch['R'] = received.append
+        self.dispatcher(message)
+        self.assertTrue(isinstance(received[0], codec.LazyRecord))
+        self.assertEqual(received[0], ['H'])
+        self.assertTrue(isinstance(received[1], records.ResultRecord))
+        self.assertEqual(received[1].seq, 1)
+
     def test_provide_default_handler_for_unknown_message_type(self):
         message = codec.encode_message(1, ['FOO'], 'ascii')
         self.dispatcher(message)
         self.assertTrue(self.dispatcher.on_unknown.was_called)
 
 
+class BatchRecordsDispatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.batches = []
+        self.dispatcher = BatchRecordsDispatcher(
+            'ascii', sink=self.batches.append, batch_size=3)
+
+    def tearDown(self):
+        self.dispatcher.flush()
+
+    def receive(self, *records):
+        self.dispatcher(codec.encode_message(1, records, 'ascii'))
+
+    def test_flush_by_size(self):
+        self.receive(['H'], ['R', '1'], ['R', '2'])
+        self.assertEqual(self.batches, [])
+        self.receive(['R', '3'])
+        self.assertEqual(self.batches, [[['H']],
+                                        [['R', '1'], ['R', '2'], ['R', '3']]])
+
+    def test_flush_on_terminator(self):
+        self.receive(['H'], ['P', '1'], ['O', '1'], ['P', '2'])
+        self.receive(['L', '1'])
+        self.assertEqual(self.batches, [[['H']],
+                                        [['P', '1'], ['P', '2']],
+                                        [['O', '1']],
+                                        [['L', '1']]])
+
+    def test_flush_earlier_types_before_full_batch(self):
+        self.receive(['H'], ['P', '1'], ['O', '1'])
+        self.receive(['R', '1'], ['R', '2'], ['R', '3'])
+        self.assertEqual(self.batches, [[['H']],
+                                        [['P', '1']],
+                                        [['O', '1']],
+                                        [['R', '1'], ['R', '2'], ['R', '3']]])
+
+    def test_flush_on_overridden_terminator_handler(self):
+        terminators = []
+        class Dispatcher(BatchRecordsDispatcher):
+            def on_terminator(self, record):
+                terminators.append(record)
+        self.dispatcher = Dispatcher('ascii', sink=self.batches.append,
+                                     batch_size=3)
+        self.receive(['H'], ['P', '1'])
+        self.receive(['L', '1'])
+        self.assertEqual(terminators, [['L', '1']])
+        self.assertEqual(self.batches, [[['H']], [['P', '1']]])
+
+    def test_flush_by_time(self):
+        self.dispatcher.flush_interval = 0.01
+        self.receive(['H'])
+        time.sleep(0.02)
+        asynclib.scheduler()
+        self.assertEqual(self.batches, [[['H']]])
+
+    def test_wrap_records(self):
+        self.dispatcher.wrappers['H'] = records.HeaderRecord
+        self.receive(['H'], ['L'])
+        self.assertTrue(isinstance(self.batches[0][0], records.HeaderRecord))
+
+    def test_handlers_override(self):
+        self.dispatcher.dispatch['C'] = track_call(lambda record: None)
+        self.receive(['H'], ['C'], ['L'])
+        self.assertTrue(self.dispatcher.dispatch['C'].was_called)
+        self.assertEqual(self.batches, [[['H']], [['L']]])
+
+    def test_keep_batch_on_sink_failure(self):
+        def sink(records):
+            if not self.batches:
+                self.batches.append(None)
+                raise ValueError('boom')
+            self.batches.append(list(records))
+        self.dispatcher.sink = sink
+        self.dispatcher.flush_interval = 0.01
+        self.receive(['H'], ['P', '1'], ['L'])
+        self.assertEqual(self.batches, [None])
+        time.sleep(0.02)
+        asynclib.scheduler()
+        self.assertEqual(self.batches, [None, [['H']], [['P', '1']], [['L']]])
+
+    def test_flush_raises_on_sink_failure(self):
+        def sink(records):
+            raise ValueError('boom')
+        self.dispatcher.sink = sink
+        self.dispatcher.flush_interval = None
+        self.receive(['H'], ['P', '1'])
+        self.assertRaises(ValueError, self.dispatcher.flush)
+        self.dispatcher.sink = self.batches.append
+        self.dispatcher.flush()
+        self.assertEqual(self.batches, [[['H']], [['P', '1']]])
+
+    def test_buffer_within_loop_thread(self):
+        loop_map = {}
+        trigger = asynclib.Trigger(loop_map)
+        self.addCleanup(trigger.close)
+        threads = []
+        def sink(records):
+            threads.append(threading.current_thread())
+            self.batches.append(records)
+        self.dispatcher.sink = sink
+        self.dispatcher.trigger = trigger
+        thread = threading.Thread(target=self.receive,
+                                  args=(['H'], ['R', '1'], ['L']))
+        thread.start()
+        thread.join()
+        self.assertEqual(self.dispatcher._batches, {})
+        asynclib.loop(0.01, loop_map, [], 1)
+        self.assertEqual(self.batches, [[['H']], [['R', '1']], [['L']]])
+        self.assertEqual(set(threads), set([threading.current_thread()]))
+
+
+class SessionRecordsDispatcherTestCase(unittest.TestCase):
+
+    def setUp(self):
+        self.sessions = []
+        self.dispatcher = SessionRecordsDispatcher('ascii')
+        self.dispatcher.on_session = self.sessions.append
+
+    def receive(self, *records):
+        self.dispatcher(codec.encode_message(1, records, 'ascii'))
+
+    def test_build_tree(self):
+        self.receive(['H'], ['C', '1', 'I', 'header note'])
+        self.receive(['P', '1'], ['O', '1', 'S1'], ['R', '1', 'GLU'],
+                     ['C', '1', 'I', 'result note'], ['R', '2', 'HGB'])
+        self.receive(['P', '2'], ['C', '1', 'I', 'patient note'],
+                     ['O', '1', 'S2'], ['R', '1', 'GLU'])
+        self.assertEqual(self.sessions, [])
+        self.receive(['L', '1'])
+        self.assertEqual(len(self.sessions), 1)
+        session = self.sessions[0]
+        self.assertEqual(session.header, ['H'])
+        self.assertEqual(session.terminator, ['L', '1'])
+        self.assertEqual(session.comments, [['C', '1', 'I', 'header note']])
+        self.assertEqual(len(session.patients), 2)
+        p1, p2 = session.patients
+        self.assertEqual(p1.record, ['P', '1'])
+        self.assertEqual([o.record for o in p1.children], [['O', '1', 'S1']])
+        results = p1.children[0].children
+        self.assertEqual([r.record for r in results],
+                         [['R', '1', 'GLU'], ['R', '2', 'HGB']])
+        self.assertEqual(results[0].comments,
+                         [['C', '1', 'I', 'result note']])
+        self.assertEqual(p2.comments, [['C', '1', 'I', 'patient note']])
+
+    def test_results_index(self):
+        self.receive(['H'], ['P', '1'], ['O', '1', 'S1'], ['R', '1', 'GLU'],
+                     ['O', '2', 'S2'], ['R', '1', 'GLU'], ['L'])
+        session = self.sessions[0]
+        self.assertEqual(session.results('S1', 'GLU'), [['R', '1', 'GLU']])
+        self.assertEqual(session.results('S2', 'GLU'), [['R', '1', 'GLU']])
+        self.assertEqual(session.results('S1', 'HGB'), [])
+
+    def test_universal_test_id_code(self):
+        self.receive(['H'], ['P', '1'], ['O', '1', ['S1', 'RACK']],
+                     ['R', '1', [None, None, None, 'GLU']], ['L'])
+        session = self.sessions[0]
+        self.assertEqual(len(session.results('S1', 'GLU')), 1)
+
+    def test_wrapped_records_index(self):
+        self.dispatcher.wrappers['O'] = omnilab.Order
+        self.dispatcher.wrappers['R'] = omnilab.Result
+        self.receive(['H'], ['P', '1'], ['O', '1', 'S1'],
+                     ['R', '1', [None, None, None, 'GLU']], ['L'])
+        session = self.sessions[0]
+        results = session.results('S1', 'GLU')
+        self.assertEqual(len(results), 1)
+        self.assertTrue(isinstance(results[0], omnilab.Result))
+
+    def test_out_of_order_records(self):
+        self.receive(['H'], ['R', '1', 'GLU'], ['M', '1'], ['L'])
+        session = self.sessions[0]
+        self.assertEqual(session.patients, [])
+        self.assertEqual(session.extra, [['R', '1', 'GLU'], ['M', '1']])
+
+    def test_new_session_per_terminator(self):
+        self.receive(['H'], ['P', '1'], ['L'])
+        self.receive(['H'], ['P', '2'], ['L'])
+        self.assertEqual([s.patients[0].record for s in self.sessions],
+                         [['P', '1'], ['P', '2']])
+
+
+
+WORKERS_SCRIPT = """
+import sys
+from astm.server import Server
+try:
+    from concurrent.futures import ThreadPoolExecutor
+except ImportError:
+    ThreadPoolExecutor = None
+server = Server('127.0.0.1', 0, reuse_port=%r, backlog=64, executor=%s)
+sys.stdout.write('%%d\\n' %% server.address[1])
+sys.stdout.flush()
+server.serve_workers(2, timeout=0.1, shutdown_timeout=2)
+"""
+
+
+@unittest.skipIf(not hasattr(os, 'fork'), 'os.fork is not available')
+class ServerWorkersTestCase(unittest.TestCase):
+
+    def start(self, reuse_port=False, executor=None):
+        env = dict(os.environ)
+        path = os.path.dirname(os.path.dirname(os.path.dirname(
+            os.path.abspath(__file__))))
+        env['PYTHONPATH'] = os.pathsep.join(
+            [path] + env.get('PYTHONPATH', '').split(os.pathsep))
+        self.proc = subprocess.Popen(
+            [sys.executable, '-c', WORKERS_SCRIPT % (reuse_port, executor)],
+            stdout=subprocess.PIPE, env=env)
+        self.port = int(self.proc.stdout.readline())
+
+    def tearDown(self):
+        if self.proc is None:
+            return
+        if self.proc.poll() is None:
+            self.proc.kill()
+        self.proc.wait()
+        self.proc.stdout.close()
+
+    def check_session(self):
+        sock = socket.create_connection(('127.0.0.1', self.port), 5)
+        try:
+            sock.sendall(constants.ENQ)
+            self.assertEqual(sock.recv(1), constants.ACK)
+            sock.sendall(codec.encode_message(1, [['H'], ['L']], 'ascii'))
+            self.assertEqual(sock.recv(1), constants.ACK)
+            sock.sendall(constants.EOT)
+        finally:
+            sock.close()
+
+    def wait_exit(self, timeout=5):
+        deadline = time.time() + timeout
+        while self.proc.poll() is None and time.time() < deadline:
+            time.sleep(0.05)
+        return self.proc.poll()
+
+    def test_serve_restart_and_stop(self):
+        self.start()
+        for _ in range(4):
+            self.check_session()
+        self.proc.send_signal(signal.SIGHUP)
+        time.sleep(0.3)
+        for _ in range(4):
+            self.check_session()
+        self.proc.send_signal(signal.SIGTERM)
+        self.assertEqual(self.wait_exit(), 0)
+
+    @unittest.skipIf(ThreadPoolExecutor is None,
+                     'concurrent.futures is not available')
+    def test_executor_factory(self):
+        self.start(executor='lambda: ThreadPoolExecutor(2)')
+        for _ in range(4):
+            self.check_session()
+        self.proc.send_signal(signal.SIGTERM)
+        self.assertEqual(self.wait_exit(), 0)
+
+    @unittest.skipIf(ThreadPoolExecutor is None,
+                     'concurrent.futures is not available')
+    def test_reject_executor_instance(self):
+        self.proc = None
+        executor = ThreadPoolExecutor(1)
+        self.addCleanup(executor.shutdown)
+        server = Server('127.0.0.1', 0, executor=executor)
+        self.addCleanup(server.close)
+        self.assertRaises(RuntimeError, server.serve_workers, 1)
+
+    @unittest.skipIf(not hasattr(socket, 'SO_REUSEPORT'),
+                     'SO_REUSEPORT is not available')
+    def test_reuse_port(self):
+        self.start(True)
+        for _ in range(4):
+            self.check_session()
+        self.proc.send_signal(signal.SIGTERM)
+        self.assertEqual(self.wait_exit(), 0)
+
 
 if __name__ == '__main__':
     unittest.main()
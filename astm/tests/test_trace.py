@@ -0,0 +1,187 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+import logging
+import socket
+import unittest
+from astm import asynclib, codec, constants, trace
+from astm.server import BaseRecordsDispatcher, RequestHandler
+from astm.trace import WireTrace
+
+
+class LogCapture(logging.Handler):
+
+    def __init__(self, name):
+        logging.Handler.__init__(self)
+        self.records = []
+        self.logger = logging.getLogger(name)
+
+    def __enter__(self):
+        self.level = self.logger.level
+        self.logger.setLevel(logging.DEBUG)
+        self.logger.addHandler(self)
+        return self.records
+
+    def __exit__(self, *args):
+        self.logger.removeHandler(self)
+        self.logger.setLevel(self.level)
+
+    def emit(self, record):
+        self.records.append(record)
+
+
+class WireTraceTestCase(unittest.TestCase):
+
+    def test_ring_buffer(self):
+        wire = WireTrace(8)
+        wire.received(b'abc')
+        wire.sent(b'def')
+        wire.sent(b'')
+        self.assertEqual([(d, data) for ts, d, data in wire],
+                         [(trace.RECV, b'abc'), (trace.SENT, b'def')])
+        wire.received(b'ghi')
+        self.assertEqual([data for ts, d, data in wire], [b'def', b'ghi'])
+        wire.sent(b'0123456789')
+        self.assertEqual([data for ts, d, data in wire], [b'23456789'])
+        wire.clear()
+        self.assertEqual(len(wire), 0)
+
+    def test_dump(self):
+        wire = WireTrace()
+        wire.received(constants.ENQ)
+        wire.sent(memoryview(constants.ACK))
+        lines = wire.dump().splitlines()
+        self.assertEqual(len(lines), 2)
+        self.assertTrue(lines[0].endswith(">>> %r" % constants.ENQ))
+        self.assertTrue(lines[1].endswith("<<< %r" % constants.ACK))
+
+    def test_log(self):
+        wire = WireTrace()
+        with LogCapture('astm.trace') as records:
+            wire.log(('localhost', 15200))
+            self.assertEqual(records, [])
+            wire.received(constants.ENQ)
+            wire.log(('localhost', 15200))
+        self.assertEqual(len(records), 1)
+        self.assertTrue('[localhost:15200] Wire trace' in
+                        records[0].getMessage())
+
+
+class Channel(asynclib.Dispatcher):
+
+    def __init__(self, sock):
+        asynclib.Dispatcher.__init__(self, sock, map={})
+        self.addr = ('localhost', 15200)
+        self.trace = WireTrace()
+
+
+class ChannelTraceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        left, right = socket.socketpair()
+        self.left = Channel(left)
+        self.right = Channel(right)
+
+    def tearDown(self):
+        self.left.close()
+        self.right.close()
+
+    def test_trace_io(self):
+        self.left.send(b'foo')
+        self.assertEqual(self.right.recv(1024), b'foo')
+        self.assertEqual([(d, data) for ts, d, data in self.left.trace],
+                         [(trace.SENT, b'foo')])
+        self.assertEqual([(d, data) for ts, d, data in self.right.trace],
+                         [(trace.RECV, b'foo')])
+
+    @unittest.skipUnless(asynclib.HAS_SENDMSG, 'sendmsg is not available')
+    def test_trace_sendmsg(self):
+        self.left.sendmsg([b'foo', memoryview(b'bar')])
+        self.assertEqual([data for ts, d, data in self.left.trace],
+                         [b'foobar'])
+
+    def test_trace_partial_sendmsg(self):
+        class sock(object):
+            def sendmsg(self, buffers):
+                return 4
+        origin, self.left.socket = self.left.socket, sock()
+        try:
+            self.assertEqual(self.left.sendmsg([b'foo', memoryview(b'bar'),
+                                                b'baz']), 4)
+        finally:
+            self.left.socket = origin
+        self.assertEqual([data for ts, d, data in self.left.trace],
+                         [b'foob'])
+
+    def test_no_trace(self):
+        self.left.trace = None
+        self.left.send(b'foo')
+        self.assertEqual(self.right.recv(1024), b'foo')
+
+
+class Dispatcher(BaseRecordsDispatcher):
+
+    def on_patient(self, record):
+        raise ValueError('boom')
+
+
+class DummyRequestHandler(RequestHandler):
+
+    addr = ('localhost', 15200)
+
+    def __init__(self, **kwargs):
+        RequestHandler.__init__(self, None, Dispatcher(), **kwargs)
+        self.outbox = []
+
+    def push(self, data):
+        self.outbox.append(data)
+        self.trace.sent(data)
+
+
+class RequestHandlerTraceTestCase(unittest.TestCase):
+
+    def setUp(self):
+        logging.getLogger('astm.server').disabled = True
+
+    def tearDown(self):
+        logging.getLogger('astm.server').disabled = False
+
+    def test_log_trace_on_error(self):
+        req = DummyRequestHandler(trace_size=1024)
+        message = codec.encode_message(1, [['H'], ['P', '1']], 'ascii')
+        with LogCapture('astm.trace') as records:
+            for data in (constants.ENQ, message):
+                req.trace.received(data)
+                req.dispatch(data)
+        self.assertEqual(req.outbox, [constants.ACK, constants.NAK])
+        self.assertEqual(len(records), 1)
+        self.assertEqual(records[0].getMessage().splitlines()[1:],
+                         req.trace.dump().splitlines()[:3])
+
+    def test_no_trace_by_default(self):
+        self.assertEqual(RequestHandler(None, Dispatcher()).trace, None)
+
+
+class UnprocessedRecordsTestCase(unittest.TestCase):
+
+    def test_warn_once_per_type(self):
+        dispatcher = BaseRecordsDispatcher()
+        message = codec.encode_message(
+            1, [['H'], ['P', '1'], ['P', '2'], ['L']], 'ascii')
+        with LogCapture('astm.server') as records:
+            dispatcher(message)
+            dispatcher(message)
+        warnings = [record for record in records
+                    if record.levelno == logging.WARNING]
+        self.assertEqual(len(warnings), 3)
+        self.assertEqual(len(records) - len(warnings), 8)
+
+
+if __name__ == '__main__':
+    unittest.main()
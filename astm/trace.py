@@ -0,0 +1,106 @@
+# -*- coding: utf-8 -*-
+#
+# Copyright (C) 2013 Alexander Shorin
+# All rights reserved.
+#
+# This software is licensed as described in the file COPYING, which
+# you should have received as part of this distribution.
+#
+
+"""
+.. module:: astm.trace
+   :synopsis: Per connection trace of raw data on the wire.
+
+Channels of :mod:`astm.asynclib` don't log transferred data. Instead, each
+connection may keep the last bytes sent and received within
+:class:`WireTrace` ring buffer, which is dumped to the log when connection
+fails. Tracing is enabled by `trace_size` argument of
+:class:`~astm.server.Server` and :class:`~astm.client.Client`::
+
+    server = Server(trace_size=4096)
+"""
+
+import logging
+import time
+from collections import deque
+
+log = logging.getLogger(__name__)
+
+__all__ = ['WireTrace']
+
+#: Direction of received data.
+RECV = '>>>'
+#: Direction of sent data.
+SENT = '<<<'
+
+
+class WireTrace(object):
+    """Ring buffer of data chunks transferred by the connection. Oldest
+    chunks are dropped once total size of kept data exceeds `size` bytes.
+
+    :param size: Maximum number of bytes to keep.
+    :type size: int
+    """
+    def __init__(self, size=4096):
+        self.size = size
+        self._entries = deque()
+        self._total = 0
+
+    def __iter__(self):
+        """Iterates over ``(timestamp, direction, data)`` tuples in order of
+        data transfer."""
+        return iter(list(self._entries))
+
+    def __len__(self):
+        return len(self._entries)
+
+    def _add(self, direction, data):
+        if not data:
+            return
+        if len(data) > self.size:
+            data = data[-self.size:]
+        self._entries.append((time.time(), direction,
+                              memoryview(data).tobytes()))
+        self._total += len(data)
+        while self._total > self.size:
+            self._total -= len(self._entries.popleft()[2])
+
+    def received(self, data):
+        """Stores received `data`."""
+        self._add(RECV, data)
+
+    def sent(self, data):
+        """Stores sent `data`."""
+        self._add(SENT, data)
+
+    def clear(self):
+        """Drops stored data."""
+        self._entries.clear()
+        self._total = 0
+
+    def dump(self):
+        """Returns stored data as text, one chunk per line.
+
+        :rtype: str
+        """
+        return '\n'.join('%s %s %r' % (_format_time(ts), direction, data)
+                         for ts, direction, data in self._entries)
+
+    def log(self, peer=None, level=logging.ERROR):
+        """Writes stored data to the log.
+
+        :param peer: Remote address.
+        :type peer: tuple
+        """
+        if not self._entries or not log.isEnabledFor(level):
+            return
+        if peer:
+            log.log(level, '[%s:%s] Wire trace:\n%s', peer[0], peer[1],
+                    self.dump())
+        else:
+            log.log(level, 'Wire trace:\n%s', self.dump())
+
+
+def _format_time(value):
+    return '%s.%06d' % (time.strftime('%H:%M:%S', time.localtime(value)),
+                        value % 1 * 1e6)
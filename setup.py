@@ -8,6 +8,7 @@
 # you should have received as part of this distribution.
 #
 
+import sys
 from astm.version import __version__
 try:
     from setuptools import setup, find_packages
@@ -36,6 +37,12 @@ except ImportError:
                 packages.update(find_packages(dir, module_name))
         return packages
 
+packages = list(find_packages())
+if sys.version_info < (3, 5):
+    # asyncio support uses syntax which older Pythons fail to compile
+    packages = [name for name in packages
+                if name != 'astm.aio' and not name.startswith('astm.aio.')]
+
 setup(
     name = 'astm',
     version = __version__,
@@ -64,5 +71,5 @@ setup(
         'Topic :: Scientific/Engineering :: Medical Science Apps.'
     ],
 
-    packages = find_packages(),
+    packages = packages,
 )